@@ -0,0 +1,127 @@
+"""
+Admission control - bounded in-flight work and a bounded wait queue for /hackrx/run
+
+Each request is given a cost: 1 when its documents are already stored, more when it has
+to ingest new ones (download, parse and embed). Requests run while the in-flight cost fits
+ADMISSION_MAX_COST; the rest wait in a FIFO queue of at most ADMISSION_QUEUE_SIZE. When
+the queue is full, or a request waits longer than ADMISSION_MAX_WAIT_SECONDS, it is
+rejected at once with 429 and a Retry-After estimate instead of slowing everyone down.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+import metrics
+import tracing
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_COST = int(os.getenv("ADMISSION_MAX_COST", "8"))          # 0 disables admission control
+ADMISSION_INGEST_COST = int(os.getenv("ADMISSION_INGEST_COST", "3"))    # Extra cost per document to ingest
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "5"))
+
+class AdmissionController:
+    """
+    Cost-weighted semaphore with a bounded FIFO wait queue. Used from the event loop only.
+    """
+    def __init__(self, max_cost: int, queue_size: int, max_wait_seconds: float):
+        self.max_cost = max_cost
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.in_flight_cost = 0
+        self.average_seconds = 2.0  # Moving average of admitted request durations
+        self._waiters = deque()     # (cost, future) in arrival order
+
+    def estimate_cost(self, new_documents: int) -> int:
+        """Cost of a request that has to ingest new_documents (capped so it can always run alone)"""
+        return min(1 + new_documents * ADMISSION_INGEST_COST, max(self.max_cost, 1))
+
+    def queue_length(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog has likely drained"""
+        backlog = self.in_flight_cost + sum(cost for cost, _ in self._waiters)
+        return max(1, math.ceil(self.average_seconds * backlog / max(self.max_cost, 1)))
+
+    def _acquire(self, cost: int):
+        self.in_flight += 1
+        self.in_flight_cost += cost
+
+    def _release(self, cost: int, seconds: float):
+        self.in_flight -= 1
+        self.in_flight_cost -= cost
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * seconds
+        self._wake()
+
+    def _wake(self):
+        """Admit waiters from the head of the queue while they fit"""
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.done():  # Timed out or cancelled
+                self._waiters.popleft()
+            elif self.in_flight_cost + cost <= self.max_cost:
+                self._waiters.popleft()
+                self._acquire(cost)
+                future.set_result(True)
+            else:
+                return
+
+    def _shed(self, kind: str, reason: str):
+        retry_after = self.retry_after()
+        metrics.ADMISSIONS.inc(kind=kind, decision="shed")
+        logger.warning(f"🚦 Shedding {kind} request ({reason}); in-flight cost {self.in_flight_cost}/{self.max_cost}, "
+                       f"{len(self._waiters)} queued, retry after {retry_after}s")
+        raise HTTPException(status_code=429, detail=f"Service overloaded ({reason}), retry later",
+                            headers={"Retry-After": str(retry_after)})
+
+    @asynccontextmanager
+    async def admit(self, cost: int, kind: str):
+        """Hold cost units of capacity for the duration of the block, or raise 429"""
+        if self.max_cost <= 0:
+            yield
+            return
+
+        if not self._waiters and self.in_flight_cost + cost <= self.max_cost:
+            self._acquire(cost)
+        else:
+            if len(self._waiters) >= self.queue_size:
+                self._shed(kind, "queue full")
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((cost, future))
+            started = time.perf_counter()
+            with tracing.span("admission_wait", cost=cost):
+                try:
+                    await asyncio.wait_for(future, self.max_wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:  # Client went away
+                    if future.done() and not future.cancelled():
+                        self._release(cost, self.average_seconds)
+                    else:
+                        self._wake()
+                    raise
+                finally:
+                    metrics.QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, queue="admission")
+            if future.cancelled():
+                self._wake()  # It may have been blocking the head of the queue
+                self._shed(kind, "queue wait timed out")
+
+        metrics.ADMISSIONS.inc(kind=kind, decision="admitted")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(cost, time.perf_counter() - started)
+
+controller = AdmissionController(ADMISSION_MAX_COST, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_SECONDS)
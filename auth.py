@@ -1,3 +1,6 @@
+import os
+import hmac
+
 from fastapi import Request, HTTPException
 
 VALID_TOKEN = "72b507a14e702a622f69f0154ca1db7888ec2e8f14a34727fe63389e74207a7e"
@@ -6,3 +9,13 @@ def verify_token(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or auth_header != f"Bearer {VALID_TOKEN}":
         raise HTTPException(status_code=401, detail="Unauthorized")
+
+# Admin endpoints (profiling) need a separate token; they are disabled when it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def verify_admin_token(request: Request):
+    admin_header = request.headers.get("X-Admin-Token")
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not admin_header or not hmac.compare_digest(admin_header, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Unauthorized")
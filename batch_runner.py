@@ -0,0 +1,265 @@
+"""
+Offline batch mode - JSONL requests in, JSONL answers out
+
+Each input line is a RunRequest-shaped record ({"documents": [...], "questions": [...]},
+optionally with an "id"). Documents are de-duplicated across the whole file and ingested
+once, in parallel. The questions of a window of records are encoded in one call, searched
+in large batches scoped to their record's documents and answered on a bounded pool of LLM
+workers. Output lines are written in input order with per-record timings.
+
+The output file is the checkpoint: re-running with the same arguments skips the records
+already written, and documents already in the shared index are not embedded again.
+Records whose documents or answers failed are written with their errors and "failed": true
+but are not checkpointed: a re-run truncates the output at the first of them and redoes
+it, and the records after it.
+Query decomposition is not used in batch mode; questions are answered directly.
+
+Usage:
+    python batch_runner.py requests.jsonl answers.jsonl
+    python batch_runner.py requests.jsonl answers.jsonl --ingest-workers 4 --llm-workers 16 --window 200
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import concurrent.futures
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+import vector_store
+from main import RunRequest, ingest_document, answer_from_chunks, retrieval_top_k, SEARCH_MMR, SEARCH_MODE
+from utils import generate_document_id, PerformanceTracker
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """Parse the input file; invalid lines become records carrying an error"""
+    records = []
+    with open(path) as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = {"index": len(records)}
+            try:
+                raw = json.loads(line)
+                request = RunRequest(**raw)
+                record.update(id=raw.get("id"), documents=request.documents, questions=request.questions,
+                              doc_ids=[generate_document_id(url) for url in request.documents])
+                if request.decompose:
+                    logger.warning(f"Record {record['index']}: decomposition is not used in batch mode")
+            except (ValueError, TypeError, ValidationError) as e:
+                record["error"] = f"Invalid record on line {index + 1}: {e}"
+            records.append(record)
+    return records
+
+def completed_records(output_path: str) -> int:
+    """
+    Records checkpointed in the output file: the complete lines before the first partially
+    written or failed one. The file is truncated after them, in place
+    """
+    if not os.path.exists(output_path):
+        return 0
+    complete = end = 0
+    with open(output_path, "r+b") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                if json.loads(line).get("failed"):
+                    break
+            except ValueError:
+                break
+            complete += 1
+            end += len(line)
+        f.truncate(end)
+    return complete
+
+def ingest_all(records: List[Dict], workers: int) -> Dict[str, Dict]:
+    """Ingest every distinct document once, in parallel. Returns per-document results"""
+    urls = {}
+    for record in records:
+        for url, doc_id in zip(record.get("documents", []), record.get("doc_ids", [])):
+            urls.setdefault(doc_id, url)
+
+    def ingest(doc_id: str) -> Dict:
+        start = time.perf_counter()
+        try:
+            ok = ingest_document(urls[doc_id], doc_id)
+            error = None if ok else "ingestion failed"
+        except Exception as e:
+            ok, error = False, str(e)
+        return {"url": urls[doc_id], "ok": ok, "error": error, "seconds": time.perf_counter() - start}
+
+    logger.info(f"📚 Ingesting {len(urls)} distinct documents with {workers} workers")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-ingest") as pool:
+        return dict(zip(urls, pool.map(ingest, urls)))
+
+def ensure_loaded(doc_ids: List[str], documents: Dict[str, Dict]):
+    """Reload documents evicted from memory since ingestion (from the shared index when present)"""
+    for doc_id in doc_ids:
+        if documents[doc_id]["ok"] and not vector_store.touch_document(doc_id):
+            ingest_document(documents[doc_id]["url"], doc_id)
+
+def search_window(window: List[Dict], documents: Dict[str, Dict], batch_size: int) -> Dict[Tuple[int, int], list]:
+    """
+    Retrieve chunks for every question of a window of records: one encoder call for all of
+    them, then searches batching the questions that share a document set. Returns
+    (record index, question index) -> hits and sets each record's search_seconds (its
+    share of the encoding and of the batches it was in).
+    """
+    groups = {}
+    questions = []
+    for record in window:
+        if "error" not in record:
+            record["search_seconds"] = 0.0
+            for q, question in enumerate(record["questions"]):
+                groups.setdefault(frozenset(record["doc_ids"]), []).append((record, q, len(questions)))
+                questions.append(question)
+    if not questions:
+        return {}
+
+    query_matrix = None
+    if SEARCH_MODE != "lexical":
+        start = time.perf_counter()
+        query_matrix = vector_store.encode_uncached(questions)  # One-off texts: don't fill the query cache
+        share = (time.perf_counter() - start) / len(questions)
+        for items in groups.values():
+            for record, _, _ in items:
+                record["search_seconds"] += share
+
+    hits = {}
+    for doc_ids, items in groups.items():
+        ensure_loaded(list(doc_ids), documents)
+        for offset in range(0, len(items), batch_size):
+            batch = items[offset:offset + batch_size]
+            rows = [row for _, _, row in batch]
+            start = time.perf_counter()
+            results = vector_store.search_chunks_batch(
+                [questions[row] for row in rows], retrieval_top_k(None),
+                mmr=SEARCH_MMR, mode=SEARCH_MODE, document_ids=doc_ids,
+                query_matrix=query_matrix[rows] if query_matrix is not None else None,
+            )
+            share = (time.perf_counter() - start) / len(batch)
+            for (record, q, _), result in zip(batch, results):
+                hits[(record["index"], q)] = result
+                record["search_seconds"] += share
+    return hits
+
+def timed_answer(question: str, hits: list, tracker: PerformanceTracker) -> Tuple[Optional[str], float, Optional[str]]:
+    """(answer, seconds, error) - a failed generation has no answer and is not checkpointed"""
+    start = time.perf_counter()
+    try:
+        answer, error = answer_from_chunks(question, hits, tracker, raise_errors=True), None
+    except Exception as e:
+        logger.error(f"Error answering question '{question}': {e}")
+        answer, error = None, str(e)
+    return answer, time.perf_counter() - start, error
+
+def output_line(record: Dict, documents: Dict[str, Dict], answers: List[Tuple[Optional[str], float, Optional[str]]]) -> Dict:
+    """The output record, in the shape of a /hackrx/run response plus timings"""
+    if "error" in record:
+        return {"index": record["index"], "error": record["error"]}
+    document_results = [documents[doc_id] for doc_id in record["doc_ids"]]
+    line = {
+        "index": record["index"],
+        "id": record["id"],
+        "answers": [answer for answer, _, _ in answers],
+        "timings": {
+            "ingest_seconds": round(max((d["seconds"] for d in document_results), default=0.0), 3),
+            "search_seconds": round(record["search_seconds"], 4),
+            "answer_seconds": [round(seconds, 3) for _, seconds, _ in answers],
+            "total_seconds": round(time.perf_counter() - record["started"], 3),
+        },
+    }
+    errors = [f"{d['url']}: {d['error']}" for d in document_results if not d["ok"]]
+    if errors:
+        line["document_errors"] = errors
+    answer_errors = [{"question": q, "error": error} for q, (_, _, error) in enumerate(answers) if error is not None]
+    if answer_errors:
+        line["answer_errors"] = answer_errors
+    if errors or answer_errors:
+        line["failed"] = True  # Redone by the next run
+    return line
+
+def run_batch(input_path: str, output_path: str, ingest_workers: int = 4, llm_workers: int = 8,
+              window_size: int = 100, search_batch: int = 256) -> Dict[str, Any]:
+    """Answer every record of input_path into output_path (resuming it). Returns a summary"""
+    started = time.perf_counter()
+    records = load_records(input_path)
+    done = completed_records(output_path)
+    remaining = records[done:]
+    if done:
+        logger.info(f"⏩ Resuming after {done} completed records")
+
+    documents = ingest_all(remaining, ingest_workers)
+    ingest_seconds = time.perf_counter() - started
+
+    llm_pool = concurrent.futures.ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="batch-llm")
+    pending = []  # (record, [futures]) in input order, not yet written
+    written = failed = questions = 0
+
+    with open(output_path, "a") as output:
+        def write_ready(block: bool):
+            """Write finished records in order (all of them when block is set)"""
+            nonlocal written, failed
+            while pending and (block or all(future.done() for future in pending[0][1])):
+                record, futures = pending.pop(0)
+                answers = [future.result() for future in futures]
+                line = output_line(record, documents, answers)
+                output.write(json.dumps(line) + "\n")
+                written += 1
+                failed += int(line.get("failed", False))
+            output.flush()
+
+        for offset in range(0, len(remaining), window_size):
+            window = remaining[offset:offset + window_size]
+            for record in window:
+                record["started"] = time.perf_counter()
+            hits = search_window(window, documents, search_batch)
+            for record in window:
+                tracker = PerformanceTracker("batch_record")
+                futures = [
+                    llm_pool.submit(timed_answer, question, hits[(record["index"], q)], tracker)
+                    for q, question in enumerate(record.get("questions", [])) if "error" not in record
+                ]
+                questions += len(futures)
+                pending.append((record, futures))
+            write_ready(block=False)
+            logger.info(f"📝 {done + written}/{len(records)} records written")
+        write_ready(block=True)
+        os.fsync(output.fileno())
+    llm_pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "records": len(records),
+        "resumed_after": done,
+        "answered_records": written - failed,
+        "failed_records": failed,
+        "questions": questions,
+        "documents": len(documents),
+        "failed_documents": sum(1 for d in documents.values() if not d["ok"]),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "total_seconds": round(elapsed, 3),
+        "questions_per_second": round(questions / elapsed, 2) if elapsed else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of RunRequest records offline")
+    parser.add_argument("input", help="JSONL file, one {documents, questions[, id]} record per line")
+    parser.add_argument("output", help="JSONL answers in input order (also the resume checkpoint)")
+    parser.add_argument("--ingest-workers", type=int, default=4)
+    parser.add_argument("--llm-workers", type=int, default=8, help="concurrent answer generations")
+    parser.add_argument("--window", type=int, default=100, help="records searched together before answering")
+    parser.add_argument("--search-batch", type=int, default=256, help="questions per search batch (a window is encoded in one call)")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input, args.output, args.ingest_workers, args.llm_workers, args.window, args.search_batch)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Chunk text storage benchmark - lists of Python strings vs compact UTF-8 buffers
+
+Builds the same chunks in two layouts: the previous one (a list of str per document, plus
+the per-snapshot concatenated text list and (doc_id, position) tuple list used by search)
+and the current one (chunk_store.ChunkText per document, plus a document offsets array).
+Reports traced memory, objects tracked by the garbage collector, full-collection pause
+and top-k text materialization time for each. A final run stores the chunks through
+vector_store and measures its full-collection pause and search latency.
+
+Usage:
+    python -m benchmarks.chunk_text_benchmark
+    python -m benchmarks.chunk_text_benchmark --sizes 10000 100000 1000000 --output chunk_text.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from chunk_store import ChunkText
+from benchmarks.retrieval_benchmark import QUESTIONS
+from benchmarks.stubs import RandomEncoder, install_encoder, synthetic_chunks
+
+def build_lists(documents):
+    """Previous layout: per-document lists, concatenated text and location tuples"""
+    stored = {doc_id: chunks for doc_id, chunks in documents()}
+    all_chunks, all_locations = [], []
+    for doc_id, chunks in stored.items():
+        all_chunks.extend(chunks)
+        all_locations.extend((doc_id, position) for position in range(len(chunks)))
+    return stored, all_chunks, all_locations
+
+def build_compact(documents):
+    """Current layout: one ChunkText per document and a document offsets array"""
+    stored = {doc_id: ChunkText(chunks) for doc_id, chunks in documents()}
+    starts = np.zeros(len(stored) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in stored.values()], out=starts[1:])
+    return stored, list(stored), starts
+
+def gc_pause_ms(repeats: int) -> float:
+    """Median time of a full collection"""
+    pauses = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        gc.collect()
+        pauses.append((time.perf_counter() - start) * 1000)
+    return statistics.median(pauses)
+
+def measure(build, documents, top_k: int, repeats: int) -> dict:
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+    tracemalloc.start()
+    start = time.perf_counter()
+    layout = build(documents)
+    build_seconds = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Materialize the texts of top_k scattered hits, as a search does
+    total = sum(len(chunks) for chunks in layout[0].values())
+    hits = np.linspace(0, total - 1, top_k).astype(np.int64)
+    start = time.perf_counter()
+    for _ in range(1000):
+        if isinstance(layout[2], np.ndarray):
+            stored, doc_ids, starts = layout
+            documents = np.searchsorted(starts, hits, side="right") - 1
+            for document, position in zip(documents.tolist(), (hits - starts[documents]).tolist()):
+                stored[doc_ids[document]][position]
+        else:
+            _, all_chunks, all_locations = layout
+            for index in hits:
+                all_locations[index], all_chunks[index]
+    materialize_us = (time.perf_counter() - start) * 1000  # 1000 rounds: ms total = µs per round
+
+    result = {
+        "build_seconds": round(build_seconds, 3),
+        "traced_bytes": traced,
+        "traced_bytes_per_chunk": round(traced / total, 1),
+        "gc_tracked_objects": len(gc.get_objects()) - tracked_before,
+        "full_gc_pause_ms": round(gc_pause_ms(repeats), 2),
+        "top_k_materialize_us": round(materialize_us, 2),
+    }
+    del layout
+    gc.collect()
+    return result
+
+def store_run(size: int, args) -> dict:
+    """Chunks stored through vector_store: full-collection pause and search latency"""
+    import shared_index
+    import vector_store
+
+    shared_index.SHARED_INDEX_ENABLED = False
+    vector_store.DOCUMENT_STORE_BUDGET_MB = 0
+    vector_store.clear_all_cache()
+    install_encoder(RandomEncoder(seed=args.seed))
+    for d in range(0, size, args.chunks_per_document):
+        vector_store.store_embeddings(synthetic_chunks(args.chunks_per_document, words_per_chunk=args.words_per_chunk, seed=args.seed + d), f"doc-{d}")
+    vector_store.embeddings_cache.clear()  # Not part of the chunk store
+    vector_store.search_chunks_detailed("warm up", top_k=args.top_k)
+
+    latencies = []
+    for i in range(args.queries):
+        start = time.perf_counter()
+        vector_store.search_chunks_detailed(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", top_k=args.top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    gc.collect()
+    result = {
+        "chunks": size,
+        "gc_tracked_objects": len(gc.get_objects()),
+        "full_gc_pause_ms": round(gc_pause_ms(args.repeats), 2),
+        "search_p50_ms": round(statistics.median(latencies), 3),
+    }
+    vector_store.clear_all_cache()
+    gc.collect()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk text layouts: memory, GC pause, top-k materialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--chunks-per-document", type=int, default=200)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5, help="full collections timed per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runs = []
+    for size in args.sizes:
+        def documents():
+            for d in range(0, size, args.chunks_per_document):
+                count = min(args.chunks_per_document, size - d)
+                yield f"doc-{d}", synthetic_chunks(count, words_per_chunk=args.words_per_chunk, seed=args.seed + d)
+
+        run = {
+            "chunks": size,
+            "lists_of_str": measure(build_lists, documents, args.top_k, args.repeats),
+            "compact": measure(build_compact, documents, args.top_k, args.repeats),
+        }
+        run["memory_ratio"] = round(run["compact"]["traced_bytes"] / run["lists_of_str"]["traced_bytes"], 3)
+        run["gc_pause_ratio"] = round(run["compact"]["full_gc_pause_ms"] / max(run["lists_of_str"]["full_gc_pause_ms"], 1e-6), 3)
+        run["vector_store"] = store_run(size, args)
+        runs.append(run)
+        print(f"{size} chunks done", file=sys.stderr)
+
+    output = json.dumps({"config": vars(args), "runs": runs}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
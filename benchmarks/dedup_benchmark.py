@@ -0,0 +1,194 @@
+"""
+Cross-document deduplication benchmark - boilerplate shared between policies
+
+Builds documents whose chunks are partly drawn from a common pool of boilerplate clauses
+(definitions, exclusions, grievance text) and partly unique, stores them and reports the
+dedup ratio, vector memory saved, chunks sent to the encoder and search latency (whole
+corpus and scoped to a few documents). Passes when every hit is the chunk stored at its
+(doc_id, position), scoped searches stay in scope and a boilerplate clause searched for
+comes back once per scoped document that contains it.
+
+The corpus is then ingested again with the shared index on (in a temporary directory) and
+loaded by a fresh chunk table, as a newly started worker would: the memory-mapped documents
+must keep the same dedup, return the same hits, and boilerplate the index already holds
+must not be encoded again.
+
+Usage:
+    python -m benchmarks.dedup_benchmark
+    python -m benchmarks.dedup_benchmark --documents 200 --shared-fraction 0.7 --output dedup.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval_benchmark import QUESTIONS, percentile
+from benchmarks.stubs import HashingEncoder, install_encoder, synthetic_chunks
+
+class CountingEncoder(HashingEncoder):
+    """HashingEncoder that also counts the texts it encodes"""
+    def __init__(self):
+        super().__init__()
+        self.texts = 0
+
+    def encode(self, texts, **kwargs):
+        self.texts += len(texts)
+        return super().encode(texts, **kwargs)
+
+def build_corpus(args) -> dict:
+    """doc_id -> chunks, mixing shared boilerplate clauses with document-specific ones"""
+    rng = random.Random(args.seed)
+    boilerplate = [f"Standard wording. {chunk}" for chunk in synthetic_chunks(args.boilerplate, seed=args.seed + 10_000)]
+    corpus = {}
+    for d in range(args.documents):
+        own = [f"Policy {d}. {chunk}" for chunk in synthetic_chunks(args.chunks_per_document, seed=args.seed + d)]
+        shared = rng.sample(boilerplate, int(args.chunks_per_document * args.shared_fraction))
+        chunks = own[:args.chunks_per_document - len(shared)] + shared
+        rng.shuffle(chunks)
+        corpus[f"doc-{d}"] = chunks
+    return corpus
+
+def latency_ms(vector_store, queries, top_k: int, document_ids=None) -> dict:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        vector_store.search_chunks_detailed(query, top_k=top_k, document_ids=document_ids)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {"mean": statistics.mean(latencies), "p50": percentile(latencies, 50), "p95": percentile(latencies, 95)}
+
+def check_hits(vector_store, corpus: dict, queries, scope: set, top_k: int) -> list:
+    """Hit texts match their (doc_id, position), scopes hold, a shared clause comes back once per scoped document"""
+    failures = []
+    for query in queries:
+        for document_ids in (None, scope):
+            for hit in vector_store.search_chunks_detailed(query, top_k=top_k, document_ids=document_ids):
+                if corpus[hit["doc_id"]][hit["position"]] != hit["text"]:
+                    failures.append(f"hit text does not match {hit['doc_id']}#{hit['position']}")
+                if document_ids is not None and hit["doc_id"] not in document_ids:
+                    failures.append(f"hit from {hit['doc_id']} outside the scope")
+    shared = set(corpus["doc-0"]).intersection(*(corpus[doc_id] for doc_id in scope))
+    if shared:
+        clause = sorted(shared)[0]
+        hits = vector_store.search_chunks_detailed(clause, top_k=len(scope), document_ids=scope)
+        if {hit["doc_id"] for hit in hits} != scope or any(hit["text"] != clause for hit in hits):
+            failures.append(f"shared clause did not come back once per scoped document: {[hit['doc_id'] for hit in hits]}")
+    return failures
+
+def top_hits(vector_store, queries, top_k: int) -> list:
+    return [[(hit["doc_id"], hit["position"]) for hit in vector_store.search_chunks_detailed(query, top_k=top_k)]
+            for query in queries]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cross-document chunk deduplication")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--chunks-per-document", type=int, default=200)
+    parser.add_argument("--shared-fraction", type=float, default=0.6, help="share of each document's chunks drawn from boilerplate")
+    parser.add_argument("--boilerplate", type=int, default=300, help="distinct boilerplate clauses")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    import shared_index
+    import vector_store
+
+    shared_index.SHARED_INDEX_ENABLED = False  # vector_store is already imported (via retrieval_benchmark)
+    vector_store.DOCUMENT_STORE_BUDGET_MB = 0
+    encoder = CountingEncoder()
+    install_encoder(encoder)
+    corpus = build_corpus(args)
+
+    start = time.perf_counter()
+    for doc_id, chunks in corpus.items():
+        vector_store.store_embeddings(chunks, doc_id)
+    ingest_seconds = time.perf_counter() - start
+    stats = vector_store.get_dedup_stats()
+
+    queries = [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(args.queries)]
+    vector_store.search_chunks_detailed("warm up", top_k=args.top_k)
+    scope = {f"doc-{d}" for d in range(min(3, args.documents))}
+    latency = {
+        "all_documents": latency_ms(vector_store, queries, args.top_k),
+        "scoped_3_documents": latency_ms(vector_store, queries, args.top_k, scope),
+    }
+
+    # Consistency: hit texts, scope, and one hit per scoped document for a shared clause
+    failures = check_hits(vector_store, corpus, queries[:10], scope, args.top_k)
+    expected_hits = top_hits(vector_store, queries[:10], args.top_k)
+    encoded_texts = encoder.texts
+
+    # Same corpus through the shared index, then loaded by a fresh worker
+    with tempfile.TemporaryDirectory() as index_dir:
+        shared_index.SHARED_INDEX_ENABLED = True
+        shared_index.SHARED_INDEX_DIR = index_dir
+        vector_store.clear_all_cache()
+        encoder.texts = 0
+        for doc_id, chunks in corpus.items():
+            vector_store.store_embeddings(chunks, doc_id)
+        shared_encoded_texts = encoder.texts
+
+        vector_store.clear_all_cache()
+        vector_store.shared_index_seq = 0
+        encoder.texts = 0
+        vector_store.sync_shared_index(force=True)
+        mapped_stats = vector_store.get_dedup_stats()
+        mapped_latency = {
+            "all_documents": latency_ms(vector_store, queries, args.top_k),
+            "scoped_3_documents": latency_ms(vector_store, queries, args.top_k, scope),
+        }
+        failures += check_hits(vector_store, corpus, queries[:10], scope, args.top_k)
+        mapped_hits = top_hits(vector_store, queries[:10], args.top_k)
+
+        # Re-storing a document the fresh worker has never held reuses the index's vectors
+        encoder.texts = 0
+        vector_store.clear_all_cache()
+        vector_store.store_embeddings(corpus["doc-0"], "doc-0-copy")
+        reencoded_texts = encoder.texts
+        vector_store.clear_all_cache()
+        shared_index.SHARED_INDEX_ENABLED = False
+
+    total_chunks = sum(len(chunks) for chunks in corpus.values())
+    distinct_chunks = len({chunk for chunks in corpus.values() for chunk in chunks})
+    checks = {
+        "all_hits_consistent": not failures,
+        "vectors_deduplicated": stats["unique_vectors"] == distinct_chunks,
+        "encoder_skipped_interned_chunks": encoded_texts < total_chunks,
+        "shared_index_encoded_each_text_once": shared_encoded_texts == distinct_chunks,
+        "memory_mapped_vectors_deduplicated": mapped_stats["memory_mapped_chunks"] == total_chunks
+            and mapped_stats["memory_mapped_vectors"] == distinct_chunks,
+        "memory_mapped_hits_match": mapped_hits == expected_hits,
+        "shared_vectors_not_reencoded": reencoded_texts == 0,
+    }
+    results = {
+        "config": vars(args),
+        "ingest_seconds": ingest_seconds,
+        "chunks": total_chunks,
+        "encoded_texts": encoded_texts,
+        "deduplication": stats,
+        "search_latency_ms": latency,
+        "shared_index": {
+            "encoded_texts": shared_encoded_texts,
+            "fresh_worker_deduplication": mapped_stats,
+            "fresh_worker_search_latency_ms": mapped_latency,
+        },
+        "failures": failures[:20],
+        "checks": checks,
+        "passed": all(checks.values()),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if results["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
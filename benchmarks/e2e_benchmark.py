@@ -0,0 +1,206 @@
+"""
+End-to-end benchmark - the real FastAPI app over HTTP, fully offline
+
+Starts the app in-process under uvicorn, serves generated policy PDFs from a local HTTP
+server and replaces Gemini with a FakeProvider whose latency follows a configurable
+distribution. Reports cold (new document) and warm (cached document) p50/p95/p99
+latency, throughput at several concurrency levels and peak RSS as JSON.
+
+Latency specs: none | fixed:SECONDS | uniform:LOW,HIGH | lognormal:MEDIAN,SIGMA
+
+Usage:
+    python -m benchmarks.e2e_benchmark --stub-encoder
+    python -m benchmarks.e2e_benchmark --llm-latency lognormal:0.8,0.4 --concurrency 1 4 16 --output e2e.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import resource
+import tempfile
+import functools
+import statistics
+import threading
+import concurrent.futures
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.pdf_fixtures import write_policy_fixtures
+from benchmarks.retrieval_benchmark import QUESTIONS, percentile
+
+def latency_distribution(spec: str, seed: int = 0):
+    """Parse a latency spec into a callable returning seconds"""
+    rng = random.Random(seed)
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "none":
+        return lambda: 0.0
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec '{spec}'")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def start_fixture_server(directory: str) -> ThreadingHTTPServer:
+    """Serve the fixture directory on localhost"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, name="fixtures", daemon=True).start()
+    return server
+
+def start_app(app, port: int):
+    """Run the app under uvicorn in a background thread and wait until it accepts requests"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def summarize(latencies) -> dict:
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "count": len(latencies_ms),
+        "mean": statistics.mean(latencies_ms),
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of /hackrx/run")
+    parser.add_argument("--documents", type=int, default=4, help="distinct fixture PDFs")
+    parser.add_argument("--pages", type=int, default=20, help="pages per fixture PDF")
+    parser.add_argument("--questions", type=int, default=5, help="questions per request")
+    parser.add_argument("--cold-requests", type=int, default=8)
+    parser.add_argument("--warm-requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests-per-level", type=int, default=32)
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.4")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--stub-encoder", action="store_true", help="use the model-free hashing encoder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="e2e_bench_")
+    # Keep the run hermetic: a private shared index, and no slow-trace noise
+    os.environ["SHARED_INDEX_DIR"] = os.path.join(workdir, "index")
+    os.environ.setdefault("SLOW_REQUEST_SECONDS", "3600")
+
+    import doc_parser
+    import llm_client
+    import vector_store
+    import main as service
+    from auth import VALID_TOKEN
+    from logic_evaluator import split_sentences
+    from benchmarks.stubs import HashingEncoder, install_encoder
+
+    # Without the NLTK punkt data (no network), chunk on the regex sentence splitter
+    sentence_splitter = "nltk"
+    try:
+        doc_parser.sent_tokenize("One sentence. Another one.")
+    except LookupError:
+        doc_parser.sent_tokenize = split_sentences
+        sentence_splitter = "regex"
+
+    if args.stub_encoder:
+        install_encoder(HashingEncoder())
+    start = time.perf_counter()
+    vector_store.get_model()
+    model_load_seconds = time.perf_counter() - start
+
+    provider = llm_client.FakeProvider(
+        latency=latency_distribution(args.llm_latency, args.seed),
+        failure_rate=args.llm_failure_rate,
+        seed=args.seed,
+    )
+    llm_client.set_provider(provider)
+
+    fixture_dir = os.path.join(workdir, "fixtures")
+    names = write_policy_fixtures(fixture_dir, args.documents, args.pages)
+    fixtures = start_fixture_server(fixture_dir)
+    fixture_base = f"http://127.0.0.1:{fixtures.server_address[1]}"
+
+    port = free_port()
+    app_server = start_app(service.app, port)
+    url = f"http://127.0.0.1:{port}/hackrx/run"
+    headers = {"Authorization": f"Bearer {VALID_TOKEN}"}
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+
+    import requests
+    local = threading.local()
+
+    def call(document_url: str) -> float:
+        """Request latency in seconds, or None when admission control shed the request (429)"""
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        started = time.perf_counter()
+        response = session.post(url, json={"documents": [document_url], "questions": questions},
+                                headers=headers, timeout=300)
+        if response.status_code == 429:
+            return None
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    # Cold: every request names a document URL the service has never seen
+    cold = [call(f"{fixture_base}/{names[i % len(names)]}?cold={i}") for i in range(args.cold_requests)]
+
+    # Warm: the same cached document over and over
+    warm_url = f"{fixture_base}/{names[0]}?cold=0"
+    warm = [call(warm_url) for _ in range(args.warm_requests)]
+
+    throughput = []
+    for concurrency in args.concurrency:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            latencies = list(pool.map(lambda _: call(warm_url), range(args.requests_per_level)))
+            elapsed = time.perf_counter() - started
+        served = [latency for latency in latencies if latency is not None]
+        throughput.append({
+            "concurrency": concurrency,
+            "requests": args.requests_per_level,
+            "shed": len(latencies) - len(served),
+            "requests_per_second": len(served) / elapsed,
+            "latency_ms": summarize(served) if served else None,
+        })
+
+    app_server.should_exit = True
+    fixtures.shutdown()
+
+    results = {
+        "config": vars(args),
+        "encoder": "hashing-stub" if args.stub_encoder else "all-MiniLM-L6-v2",
+        "sentence_splitter": sentence_splitter,
+        "model_load_seconds": model_load_seconds,
+        "cold_latency_ms": summarize(cold),
+        "warm_latency_ms": summarize(warm),
+        "throughput": throughput,
+        "llm_calls": provider.calls,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # ru_maxrss is KiB on Linux
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
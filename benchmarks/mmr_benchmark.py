@@ -0,0 +1,91 @@
+"""
+MMR microbenchmark - diversity selection cost at large candidate pool sizes
+
+Uses random unit vectors, so no embedding model is loaded.
+
+Usage:
+    python -m benchmarks.mmr_benchmark
+    python -m benchmarks.mmr_benchmark --pools 100 1000 10000 --k 3 10 --output mmr.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_store import mmr_select, normalize_rows
+
+DIMENSIONS = 384  # all-MiniLM-L6-v2
+
+def near_duplicate_pool(rng: np.random.Generator, pool: int, dim: int):
+    """Candidate vectors in small clusters of near-duplicates, like overlapping chunks of one passage"""
+    centres = normalize_rows(rng.standard_normal((max(1, pool // 8), dim)))
+    rows = centres[rng.integers(0, len(centres), pool)] + 0.03 * rng.standard_normal((pool, dim))
+    matrix = normalize_rows(rows)
+    # The query sits near a few centres, so plain top-k is dominated by one passage's duplicates
+    query = normalize_rows(centres[:3].sum(axis=0) + 0.5 * centres[0])[0]
+    return matrix, matrix @ query
+
+def mean_pairwise_similarity(matrix: np.ndarray) -> float:
+    """Average off-diagonal cosine similarity of selected rows (lower = more diverse)"""
+    if len(matrix) < 2:
+        return 0.0
+    pairwise = matrix @ matrix.T
+    return float((pairwise.sum() - np.trace(pairwise)) / (len(matrix) * (len(matrix) - 1)))
+
+def bench(pool: int, k: int, repeats: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    matrix, scores = near_duplicate_pool(rng, pool, DIMENSIONS)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chosen = mmr_select(matrix, scores, k)
+        timings.append(time.perf_counter() - start)
+
+    plain = np.argsort(-scores)[:k]
+    return {
+        "pool": pool,
+        "k": k,
+        "latency_ms": {
+            "p50": statistics.median(timings) * 1000,
+            "min": min(timings) * 1000,
+            "max": max(timings) * 1000,
+        },
+        "mean_pairwise_similarity": {
+            "top_k": mean_pairwise_similarity(matrix[plain]),
+            "mmr": mean_pairwise_similarity(matrix[chosen]),
+        },
+        "mean_relevance": {
+            "top_k": float(scores[plain].mean()),
+            "mmr": float(scores[chosen].mean()),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MMR selection over candidate pools")
+    parser.add_argument("--pools", type=int, nargs="+", default=[20, 100, 1000, 5000, 10000])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "dimensions": DIMENSIONS,
+        "runs": [bench(pool, k, args.repeats, args.seed) for pool in args.pools for k in args.k],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
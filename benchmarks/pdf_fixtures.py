@@ -0,0 +1,97 @@
+"""
+Fixture PDFs for the offline benchmarks - generated on the fly, no PDF library needed
+"""
+import os
+import random
+from typing import List
+
+from benchmarks.stubs import INSURANCE_VOCABULARY
+
+LINES_PER_PAGE = 48
+CHARS_PER_LINE = 90
+
+CLAUSES = [
+    "A grace period of thirty days is allowed for payment of the renewal premium.",
+    "Pre-existing diseases are covered after a waiting period of thirty six months of continuous coverage.",
+    "Maternity expenses are covered after the insured person has been continuously covered for twenty four months.",
+    "The waiting period for cataract surgery is two years.",
+    "Medical expenses of an organ donor for harvesting the organ are covered.",
+    "A No Claim Discount of five percent on the base premium is offered on renewal.",
+    "Expenses of preventive health check-ups are reimbursed at the end of every block of two policy years.",
+    "A hospital means an institution with at least ten inpatient beds and qualified nursing staff round the clock.",
+    "AYUSH treatment is covered up to the sum insured in an AYUSH hospital.",
+    "For Plan A, room rent is limited to one percent and ICU charges to two percent of the sum insured.",
+]
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_text_pdf(path: str, pages: List[List[str]]):
+    """Write a minimal PDF with one Helvetica text line per entry, one page per list"""
+    objects = []  # (object number, body bytes)
+    page_numbers = []
+    next_number = 4  # 1 catalog, 2 page tree, 3 font
+
+    for lines in pages:
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = content.encode("latin-1", "replace")
+        content_number, page_number = next_number, next_number + 1
+        next_number += 2
+        objects.append((content_number, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        objects.append((page_number, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>"
+        ).encode()))
+        page_numbers.append(page_number)
+
+    kids = " ".join(f"{n} 0 R" for n in page_numbers)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode()),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number, body in objects:
+        offsets[number] = len(output)
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for number in range(1, len(objects) + 1):
+        output += b"%010d 00000 n \n" % offsets[number]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(bytes(output))
+
+def policy_pages(page_count: int, seed: int = 0) -> List[List[str]]:
+    """Policy-like pages: filler sentences from the insurance vocabulary with the known clauses mixed in"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(INSURANCE_VOCABULARY))]
+    text = []
+    for i in range(page_count * LINES_PER_PAGE * CHARS_PER_LINE // 80):
+        words = rng.choices(INSURANCE_VOCABULARY, weights=weights, k=rng.randint(8, 16))
+        text.append(" ".join(words).capitalize() + ".")
+        if i % 20 == 0:
+            text.append(CLAUSES[(i // 20) % len(CLAUSES)])
+
+    lines, current = [], ""
+    for word in " ".join(text).split():
+        if len(current) + len(word) + 1 > CHARS_PER_LINE:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    lines.append(current)
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)][:page_count]
+
+def write_policy_fixtures(directory: str, documents: int, pages: int) -> List[str]:
+    """Write policy_<n>.pdf fixtures, returning their file names"""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for n in range(documents):
+        name = f"policy_{n}.pdf"
+        write_text_pdf(os.path.join(directory, name), policy_pages(pages, seed=n))
+        names.append(name)
+    return names
@@ -0,0 +1,106 @@
+"""
+Relevance scoring batch check - structured scoring calls against a FakeProvider
+
+Scores a set of chunks with clause_matcher.score_chunks_with_llm while the shared LLM
+client talks to a FakeProvider with fixed latency. Passes when the provider sees one call
+per RELEVANCE_BATCH_SIZE chunks, no more than RELEVANCE_MAX_CONCURRENCY calls run at once,
+every chunk gets its score back, and the wall time stays close to a single call's latency
+(one call per wave of RELEVANCE_MAX_CONCURRENCY batches).
+
+Usage:
+    python -m benchmarks.relevance_batch_check
+    python -m benchmarks.relevance_batch_check --chunks 40 --latency 0.3 --output relevance_batch.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERY = "What is the waiting period for pre-existing diseases?"
+
+class ConcurrencyTracker:
+    """Wraps a provider and records how many generate calls are in flight at once"""
+    def __init__(self, provider):
+        self.provider = provider
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, *args, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return self.provider.generate(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def score_reply(prompt: str) -> str:
+    """One "<n>: <score>" line per chunk in the prompt; the score encodes the chunk's number"""
+    lines = []
+    for number, chunk in enumerate(prompt.split("[Chunk ")[1:], 1):
+        index = int(chunk.split("chunk-", 1)[1].split(" ", 1)[0])
+        lines.append(f"{number}: {(index % 100) / 100:.2f}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check batching, concurrency and latency of LLM relevance scoring")
+    parser.add_argument("--chunks", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake provider call")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed wall time over one call, as a fraction of it")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    import llm_client
+    import clause_matcher
+
+    provider = llm_client.FakeProvider(responder=score_reply, latency=args.latency)
+    tracker = ConcurrencyTracker(provider)
+    previous = llm_client.set_provider(tracker)
+    llm_client.get_client().hedging = False  # Duplicate calls would skew the call count
+    try:
+        chunks = [f"chunk-{i} covers clause {i} of the policy wording." for i in range(args.chunks)]
+        start = time.perf_counter()
+        scores = clause_matcher.score_chunks_with_llm(QUERY, chunks)
+        wall_seconds = time.perf_counter() - start
+    finally:
+        llm_client.set_provider(previous)
+
+    batch_size = clause_matcher.RELEVANCE_BATCH_SIZE
+    max_concurrency = clause_matcher.RELEVANCE_MAX_CONCURRENCY
+    expected_calls = math.ceil(args.chunks / batch_size)
+    waves = math.ceil(expected_calls / max_concurrency)
+    checks = {
+        "one_call_per_batch": provider.calls == expected_calls,
+        "concurrency_bounded": tracker.peak <= max_concurrency,
+        "all_chunks_scored": scores == [(i % 100) / 100 for i in range(args.chunks)],
+        "wall_time_close_to_calls": wall_seconds <= waves * args.latency * (1 + args.tolerance),
+    }
+    results = {
+        "config": vars(args),
+        "relevance_batch_size": batch_size,
+        "relevance_max_concurrency": max_concurrency,
+        "provider_calls": provider.calls,
+        "expected_calls": expected_calls,
+        "peak_concurrency": tracker.peak,
+        "wall_seconds": round(wall_seconds, 3),
+        "single_call_seconds": args.latency,
+        "checks": checks,
+        "passed": all(checks.values()),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if results["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
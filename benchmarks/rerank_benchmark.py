@@ -0,0 +1,141 @@
+"""
+Reranker benchmark - latency and ranking agreement on a fixture set
+
+Usage:
+    python -m benchmarks.rerank_benchmark                  # local cross-encoder vs retrieval order
+    python -m benchmarks.rerank_benchmark --llm            # also rank with Gemini and compare
+    python -m benchmarks.rerank_benchmark --output rerank.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from itertools import combinations
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clause_matcher
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rerank_fixtures.json")
+
+def load_fixtures(path: str = FIXTURES_PATH) -> List[Dict]:
+    """Load (query, candidate chunks, relevant indices) fixtures"""
+    with open(path) as f:
+        return json.load(f)
+
+def ranking_quality(ranking: List[int], relevant: List[int]) -> Dict[str, float]:
+    """Top-1 accuracy and reciprocal rank of the first relevant chunk"""
+    first_relevant = next((rank for rank, index in enumerate(ranking, 1) if index in relevant), None)
+    return {
+        "top1": 1.0 if ranking and ranking[0] in relevant else 0.0,
+        "reciprocal_rank": 1.0 / first_relevant if first_relevant else 0.0,
+    }
+
+def kendall_tau(ranking_a: List[int], ranking_b: List[int]) -> float:
+    """Kendall rank correlation between two full rankings of the same items"""
+    position_b = {index: rank for rank, index in enumerate(ranking_b)}
+    concordant = discordant = 0
+    for x, y in combinations(ranking_a, 2):
+        if position_b[x] < position_b[y]:
+            concordant += 1
+        else:
+            discordant += 1
+    pairs = concordant + discordant
+    return (concordant - discordant) / pairs if pairs else 1.0
+
+def run_reranker(name: str, rank: Callable[[str, List[str]], List[int]], fixtures: List[Dict], repeats: int) -> Dict:
+    """Time a reranker over every fixture and score its rankings against the labels"""
+    latencies = []
+    rankings = []
+    for fixture in fixtures:
+        start = time.perf_counter()
+        rankings.append(rank(fixture["query"], fixture["chunks"]))
+        latencies.append(time.perf_counter() - start)
+
+    # Repeat runs hit the score cache (for the local reranker) and show warm latency
+    warm_latencies = []
+    for _ in range(repeats):
+        for fixture in fixtures:
+            start = time.perf_counter()
+            rank(fixture["query"], fixture["chunks"])
+            warm_latencies.append(time.perf_counter() - start)
+
+    quality = [ranking_quality(r, f["relevant"]) for r, f in zip(rankings, fixtures)]
+    result = {
+        "name": name,
+        "cold_latency_ms": {
+            "mean": statistics.mean(latencies) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "top1_accuracy": statistics.mean(q["top1"] for q in quality),
+        "mrr": statistics.mean(q["reciprocal_rank"] for q in quality),
+        "rankings": rankings,
+    }
+    if warm_latencies:
+        result["warm_latency_ms"] = {
+            "mean": statistics.mean(warm_latencies) * 1000,
+            "max": max(warm_latencies) * 1000,
+        }
+    return result
+
+def as_indices(chunks: List[str], reranked: List[str]) -> List[int]:
+    """Map reranked chunk texts back to full index rankings"""
+    ranking = [chunks.index(chunk) for chunk in reranked]
+    return ranking + [i for i in range(len(chunks)) if i not in ranking]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local vs LLM chunk reranking")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--repeats", type=int, default=3, help="warm (cached) passes over the fixtures")
+    parser.add_argument("--llm", action="store_true", help="also benchmark the Gemini reranker")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+
+    # Load the model outside the timed region; cold numbers then reflect an empty score cache
+    start = time.perf_counter()
+    clause_matcher.get_cross_encoder()
+    model_load_seconds = time.perf_counter() - start
+    clause_matcher.rerank_score_cache.clear()
+
+    results = {
+        "fixtures": len(fixtures),
+        "model_load_seconds": model_load_seconds,
+        "rerankers": [
+            run_reranker("retrieval_order", lambda q, chunks: list(range(len(chunks))), fixtures, 0),
+            run_reranker(
+                "local_cross_encoder",
+                lambda q, chunks: as_indices(chunks, clause_matcher.rerank_chunks_locally(q, chunks, top_k=len(chunks))),
+                fixtures,
+                args.repeats,
+            ),
+        ],
+    }
+
+    if args.llm:
+        results["rerankers"].append(run_reranker(
+            "llm",
+            lambda q, chunks: as_indices(chunks, clause_matcher.rerank_chunks_with_llm(q, chunks, top_k=len(chunks))),
+            fixtures,
+            0,
+        ))
+        local, llm = results["rerankers"][1], results["rerankers"][2]
+        results["agreement_local_vs_llm"] = {
+            "top1": statistics.mean(1.0 if a[0] == b[0] else 0.0 for a, b in zip(local["rankings"], llm["rankings"])),
+            "kendall_tau": statistics.mean(kendall_tau(a, b) for a, b in zip(local["rankings"], llm["rankings"])),
+        }
+
+    results["score_cache"] = clause_matcher.get_rerank_cache_stats()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Retrieval mode benchmark - per-query latency of dense, lexical (BM25) and hybrid search
+
+Usage:
+    python -m benchmarks.retrieval_benchmark                       # real MiniLM encoder
+    python -m benchmarks.retrieval_benchmark --stub-encoder        # model-free hashing encoder
+    python -m benchmarks.retrieval_benchmark --chunks 1000 20000 --output retrieval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_store
+from benchmarks.stubs import HashingEncoder, install_encoder, synthetic_chunks
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "What is the waiting period for pre-existing diseases (PED) to be covered?",
+    "Does this policy cover maternity expenses, and what are the conditions?",
+    "What is the waiting period for cataract surgery?",
+    "Are the medical expenses for an organ donor covered under this policy?",
+    "What is the No Claim Discount (NCD) offered in this policy?",
+    "Is there a benefit for preventive health check-ups?",
+    "How does the policy define a 'hospital'?",
+    "What is the extent of coverage for AYUSH treatments?",
+    "Are there any sub-limits on room rent and ICU charges for Plan A?",
+]
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def build_corpus(chunk_count: int, documents: int):
+    """Store a synthetic corpus split evenly across documents"""
+    vector_store.clear_all_cache()
+    chunks = synthetic_chunks(chunk_count)
+    per_document = max(1, chunk_count // documents)
+    start = time.perf_counter()
+    for d in range(0, chunk_count, per_document):
+        vector_store.store_embeddings(chunks[d:d + per_document], f"doc-{d // per_document}")
+    return time.perf_counter() - start
+
+def bench_mode(mode: str, queries, top_k: int) -> dict:
+    """Time single-query searches in one mode with a cold query-embedding cache"""
+    vector_store.embeddings_cache.clear()
+    vector_store.search_chunks_detailed(queries[0], top_k, mode=mode)  # build the corpus concatenation
+    vector_store.embeddings_cache.clear()
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        vector_store.search_chunks_detailed(query, top_k, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    vector_store.embeddings_cache.clear()
+    start = time.perf_counter()
+    vector_store.search_chunks_batch(queries, top_k, mode=mode)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "latency_ms": {
+            "mean": statistics.mean(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+        },
+        "batch_queries_per_second": len(queries) / batch_seconds if batch_seconds else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dense, lexical and hybrid retrieval")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--stub-encoder", action="store_true", help="use the model-free hashing encoder")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.stub_encoder:
+        install_encoder(HashingEncoder())
+    vector_store.get_model()
+
+    queries = [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(args.queries)]
+    results = {"encoder": "hashing-stub" if args.stub_encoder else "all-MiniLM-L6-v2", "runs": []}
+    for chunk_count in args.chunks:
+        ingest_seconds = build_corpus(chunk_count, args.documents)
+        results["runs"].append({
+            "chunks": chunk_count,
+            "documents": args.documents,
+            "ingest_seconds": ingest_seconds,
+            "modes": [bench_mode(mode, queries, args.top_k) for mode in vector_store.SEARCH_MODES],
+        })
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Multi-worker shared index check - several worker processes ingest the same documents at once
+
+Each worker behaves like main.ingest_document: attach from the shared index if possible,
+otherwise embed and publish. Passes when every document was embedded by exactly one worker,
+and every worker (including one that never ingests) can search the whole corpus.
+
+Usage:
+    python -m benchmarks.shared_index_check
+    python -m benchmarks.shared_index_check --workers 8 --documents 12 --output shared_index.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERY = "waiting period for pre existing disease cover"
+
+def document_chunks(document: int, chunks_per_document: int):
+    from benchmarks.stubs import synthetic_chunks
+    return synthetic_chunks(chunks_per_document, seed=document)
+
+def worker(index_dir: str, worker_number: int, documents: int, chunks_per_document: int, ingest: bool, barrier, results):
+    os.environ["SHARED_INDEX"] = "true"
+    os.environ["SHARED_INDEX_DIR"] = index_dir
+    import vector_store
+    from benchmarks.stubs import HashingEncoder, install_encoder
+
+    encoder = HashingEncoder()
+    encoded_chunks = []
+    original_encode = encoder.encode
+    encoder.encode = lambda texts, **kwargs: (encoded_chunks.append(len(texts)), original_encode(texts, **kwargs))[1]
+    install_encoder(encoder)
+
+    barrier.wait()
+    start = time.perf_counter()
+    ingested, attached = [], []
+    if ingest:
+        # Rotate the order so workers contend for the same documents at the same time
+        for d in [(worker_number + i) % documents for i in range(documents)]:
+            doc_id = f"doc-{d}"
+            if vector_store.attach_shared_document(doc_id):
+                attached.append(doc_id)
+            else:
+                vector_store.store_embeddings(document_chunks(d, chunks_per_document), doc_id)
+                ingested.append(doc_id)
+    ingest_seconds = time.perf_counter() - start
+    encoded_document_chunks = sum(encoded_chunks)
+
+    barrier.wait()  # Everyone has finished ingesting
+    vector_store.sync_shared_index(force=True)
+    hits = vector_store.search_chunks_detailed(QUERY, top_k=5)
+    results.put({
+        "worker": worker_number,
+        "ingests": ingest,
+        "ingested": ingested,
+        "attached": attached,
+        "ingest_seconds": ingest_seconds,
+        "encoded_document_chunks": encoded_document_chunks,
+        "stored_documents": len(vector_store.documents_store),
+        "top_hits": [(hit["doc_id"], hit["position"]) for hit in hits],
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that workers share one on-disk index")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--documents", type=int, default=6)
+    parser.add_argument("--chunks-per-document", type=int, default=200)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers + 1)
+    queue = context.Queue()
+    with tempfile.TemporaryDirectory() as index_dir:
+        # The last worker never ingests: it must see the corpus purely through the shared index
+        processes = [
+            context.Process(target=worker, args=(index_dir, n, args.documents, args.chunks_per_document,
+                                                 n < args.workers, barrier, queue))
+            for n in range(args.workers + 1)
+        ]
+        for process in processes:
+            process.start()
+        workers = sorted((queue.get(timeout=300) for _ in processes), key=lambda r: r["worker"])
+        for process in processes:
+            process.join()
+
+    ingested = [doc_id for result in workers for doc_id in result["ingested"]]
+    expected = [f"doc-{d}" for d in range(args.documents)]
+    checks = {
+        "each_document_embedded_once": sorted(ingested) == sorted(expected),
+        "embedded_chunks_match_corpus": sum(r["encoded_document_chunks"] for r in workers)
+            == args.documents * args.chunks_per_document,
+        "every_worker_sees_all_documents": all(r["stored_documents"] == args.documents for r in workers),
+        "identical_search_results": len({json.dumps(r["top_hits"]) for r in workers}) == 1,
+    }
+    results = {"workers": workers, "checks": checks, "passed": all(checks.values())}
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if results["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Snapshot isolation stress check - concurrent ingestion and search in one process
+
+Writer threads ingest documents while reader threads search (dense, lexical and hybrid)
+as fast as they can. Passes when no search raised or logged an error, every hit's text is
+the chunk stored at its (doc_id, position), dense searches always returned top_k hits once
+a document was stored, each snapshot's corpus is internally consistent and readers never
+saw the index version go backwards. With --budget-mb the store also evicts concurrently.
+
+Usage:
+    python -m benchmarks.snapshot_stress_check
+    python -m benchmarks.snapshot_stress_check --writers 4 --readers 8 --documents 80 --budget-mb 4 --output stress.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval_benchmark import QUESTIONS
+
+MODES = ("dense", "lexical", "hybrid")
+
+class ErrorCounter(logging.Handler):
+    """Counts ERROR records - search failures are logged and swallowed, not raised"""
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent ingestion and search against index snapshots")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--chunks-per-document", type=int, default=150)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget-mb", type=float, default=0.0, help="document store budget (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    import shared_index
+    import vector_store
+    from benchmarks.stubs import HashingEncoder, install_encoder, synthetic_chunks
+
+    shared_index.SHARED_INDEX_ENABLED = False  # vector_store is already imported (via retrieval_benchmark)
+    vector_store.DOCUMENT_STORE_BUDGET_MB = args.budget_mb
+    install_encoder(HashingEncoder())
+    errors = ErrorCounter()
+    logging.getLogger("vector_store").addHandler(errors)
+
+    corpus = {f"doc-{d}": synthetic_chunks(args.chunks_per_document, seed=args.seed + d) for d in range(args.documents)}
+    pending = list(corpus)
+    pending_lock = threading.Lock()
+    writers_done = threading.Event()
+    failures = []
+    counts = {mode: 0 for mode in MODES}
+    counts_lock = threading.Lock()
+
+    def fail(message: str):
+        if len(failures) < 50:
+            failures.append(message)
+
+    def writer():
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                doc_id = pending.pop()
+            if not vector_store.store_embeddings(corpus[doc_id], doc_id):
+                fail(f"store_embeddings failed for {doc_id}")
+
+    def reader(number: int):
+        rng = random.Random(args.seed + number)
+        last_version = -1
+        while not writers_done.is_set():
+            current = vector_store.snapshot
+            if current.version < last_version:
+                fail(f"index version went back from {last_version} to {current.version}")
+            last_version = current.version
+
+            doc_ids, starts, rows, _ = current.corpus()
+            if not (starts[-1] == current.chunk_count == len(rows) and len(doc_ids) == len(current.documents)) \
+                    or (len(rows) and rows.max() >= len(current.vectors) + len(current.mapped)):
+                fail(f"inconsistent corpus in snapshot {current.version}")
+
+            mode = rng.choice(MODES)
+            query = rng.choice(QUESTIONS)
+            try:
+                hits = vector_store.search_chunks_detailed(query, top_k=args.top_k, mode=mode)
+            except Exception as e:
+                fail(f"{mode} search raised {e!r}")
+                continue
+            if mode == "dense" and current.documents and len(hits) != args.top_k:
+                fail(f"dense search returned {len(hits)} hits with documents stored")
+            for hit in hits:
+                if corpus[hit["doc_id"]][hit["position"]] != hit["text"]:
+                    fail(f"hit text does not match {hit['doc_id']}#{hit['position']}")
+            with counts_lock:
+                counts[mode] += 1
+
+    readers = [threading.Thread(target=reader, args=(n,), name=f"reader-{n}") for n in range(args.readers)]
+    writers = [threading.Thread(target=writer, name=f"writer-{n}") for n in range(args.writers)]
+    start = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    ingest_seconds = time.perf_counter() - start
+    time.sleep(0.2)  # A few searches against the final snapshot
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    stats = vector_store.get_document_store_stats()
+    stored = len(vector_store.documents_store)
+    checks = {
+        "no_search_errors": not errors.messages,
+        "all_hits_consistent": not failures,
+        "searches_ran_during_ingest": sum(counts.values()) > args.readers,
+        "all_documents_stored": stored + stats["evicted_documents"] == args.documents,
+    }
+    results = {
+        "config": vars(args),
+        "ingest_seconds": ingest_seconds,
+        "searches": counts,
+        "index_version": vector_store.snapshot.version,
+        "stored_documents": stored,
+        "evictions": stats["evictions"],
+        "errors": errors.messages[:20],
+        "failures": failures,
+        "checks": checks,
+        "passed": all(checks.values()),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if results["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
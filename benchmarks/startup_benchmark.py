@@ -0,0 +1,106 @@
+"""
+Startup benchmark - import time, time to first response and time to ready, in fresh processes
+
+Usage:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --stub-encoder --runs 5 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.e2e_benchmark import free_port
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["torch", "sentence_transformers", "nltk", "pdfplumber", "google.generativeai", "sklearn"]
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({{"seconds": time.perf_counter() - started,
+                  "heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+SERVER = """
+import sys, uvicorn
+if {stub}:
+    from benchmarks.stubs import HashingEncoder, install_encoder
+    install_encoder(HashingEncoder())
+import main
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+def measure_import() -> dict:
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def measure_ready(stub: bool, timeout: float) -> dict:
+    """Start the server and poll /health and /ready until ready (or timeout)"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVER.format(stub=stub, port=port)], cwd=REPO_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_response = ready = None
+    state = {}
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if first_response is None:
+                    requests.get(f"{base}/health", timeout=1)
+                    first_response = time.perf_counter() - started
+                response = requests.get(f"{base}/ready", timeout=1)
+                state = response.json()
+                if response.status_code == 200:
+                    ready = time.perf_counter() - started
+                    break
+                if state.get("error"):
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"first_response_seconds": first_response, "ready_seconds": ready, "server_state": state}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-ready of the service")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--stub-encoder", action="store_true", help="use the model-free hashing encoder")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    readiness = [measure_ready(args.stub_encoder, args.timeout) for _ in range(args.runs)]
+    ready_times = [r["ready_seconds"] for r in readiness if r["ready_seconds"] is not None]
+
+    results = {
+        "encoder": "hashing-stub" if args.stub_encoder else "all-MiniLM-L6-v2",
+        "import_seconds": {"median": statistics.median(i["seconds"] for i in imports),
+                           "runs": [i["seconds"] for i in imports]},
+        "heavy_modules_after_import": imports[0]["heavy_modules"],
+        "time_to_ready_seconds": {"median": statistics.median(ready_times) if ready_times else None,
+                                  "runs": [r["ready_seconds"] for r in readiness]},
+        "time_to_first_response_seconds": [r["first_response_seconds"] for r in readiness],
+        "last_server_state": readiness[-1]["server_state"],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
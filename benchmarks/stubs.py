@@ -0,0 +1,68 @@
+"""
+Model-free stand-ins used by the benchmarks
+"""
+import re
+import zlib
+import random
+from typing import List
+
+import numpy as np
+
+DIMENSIONS = 384  # all-MiniLM-L6-v2
+
+INSURANCE_VOCABULARY = """
+policy insured person sum premium grace period waiting pre existing disease cover coverage
+hospital hospitalisation day care treatment surgery cataract hernia maternity delivery newborn
+organ donor ambulance room rent icu charges plan a b c ayush ayurveda homeopathy unani siddha
+no claim discount ncd bonus renewal installment exclusion exclusions claim reimbursement cashless
+network provider tpa deductible co payment copay sub limit limit months years days thirty
+twenty four thirty six forty eight accident injury illness diagnosis physician medical expenses
+pre post domiciliary preventive health check up wellness benefit condition conditions definition
+""".split()
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words hashing encoder with the same interface as SentenceTransformer.encode.
+    Similar texts get similar vectors, so search results stay meaningful without a model.
+    """
+    def __init__(self, dimensions: int = DIMENSIONS):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.max_seq_length = 256
+
+    def encode(self, texts: List[str], batch_size: int = 64, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % self.dimensions] += 1.0
+        return vectors
+
+class RandomEncoder:
+    """Encoder returning random unit vectors - for pure storage/search scaling runs"""
+    def __init__(self, dimensions: int = DIMENSIONS, seed: int = 0):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.max_seq_length = 256
+        self._rng = np.random.default_rng(seed)
+
+    def encode(self, texts: List[str], batch_size: int = 64, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        self.calls += 1
+        vectors = self._rng.standard_normal((len(texts), self.dimensions)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def install_encoder(encoder) -> None:
+    """Make vector_store use a stub encoder instead of loading the sentence-transformers model"""
+    import vector_store
+
+    vector_store.model_cache = encoder
+
+def synthetic_chunks(count: int, words_per_chunk: int = 120, seed: int = 0) -> List[str]:
+    """Policy-like chunks drawn from a Zipf-weighted insurance vocabulary"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(INSURANCE_VOCABULARY))]
+    chunks = []
+    for i in range(count):
+        words = rng.choices(INSURANCE_VOCABULARY, weights=weights, k=words_per_chunk)
+        chunks.append(f"Clause {i}. " + " ".join(words) + ".")
+    return chunks
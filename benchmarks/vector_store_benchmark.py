@@ -0,0 +1,139 @@
+"""
+vector_store scaling benchmark - ingest, search and memory from 1k to 1M chunks
+
+Uses the random unit-vector encoder, so the numbers measure the store itself (hashing,
+caching, normalization, postings, similarity search) rather than the embedding model.
+The shared on-disk index is disabled unless --shared-index is given.
+
+Usage:
+    python -m benchmarks.vector_store_benchmark
+    python -m benchmarks.vector_store_benchmark --sizes 1000 10000 --modes dense hybrid --output vs.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import resource
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval_benchmark import QUESTIONS, percentile
+from benchmarks.stubs import DIMENSIONS, RandomEncoder, install_encoder, synthetic_chunks
+
+def current_rss_bytes() -> int:
+    """Resident set size right now (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def accounted_bytes(vector_store) -> dict:
+    """Bytes held by the store, by component"""
+    vectors = vector_store.snapshot.vector_bytes
+    postings = text = 0
+    for doc in vector_store.documents_store.values():
+        postings += doc["postings"].nbytes()
+        text += doc["chunks"].nbytes()
+    cache = sum(vector.nbytes for vector in vector_store.embeddings_cache.values())
+    return {"vectors": vectors, "postings": postings, "chunk_text": text, "embedding_cache": cache}
+
+def bench_size(vector_store, size: int, args) -> dict:
+    vector_store.clear_all_cache()
+    install_encoder(RandomEncoder(args.dimensions, seed=args.seed))
+    chunks = synthetic_chunks(size, words_per_chunk=args.words_per_chunk, seed=args.seed)
+    gc.collect()
+    rss_before = current_rss_bytes()
+
+    # Ingest in document-sized pieces, like the service does
+    start = time.perf_counter()
+    for offset in range(0, size, args.chunks_per_document):
+        vector_store.store_embeddings(chunks[offset:offset + args.chunks_per_document], f"doc-{offset}")
+    ingest_seconds = time.perf_counter() - start
+    del chunks
+
+    # The first search concatenates the corpus; later searches reuse it
+    start = time.perf_counter()
+    vector_store.search_chunks_detailed("warm up", top_k=args.top_k)
+    corpus_build_ms = (time.perf_counter() - start) * 1000
+
+    gc.collect()
+    rss_after = current_rss_bytes()
+    accounted = accounted_bytes(vector_store)
+
+    queries = [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(args.queries)]
+    modes = {}
+    for mode in args.modes:
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            vector_store.search_similar_chunks_super_fast(query, top_k=args.top_k, mode=mode)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        batch = [f"{query} [batch]" for query in queries]
+        started = time.perf_counter()
+        for offset in range(0, len(batch), args.batch_size):
+            vector_store.search_chunks_batch(batch[offset:offset + args.batch_size], top_k=args.top_k, mode=mode)
+        batch_seconds = time.perf_counter() - started
+
+        modes[mode] = {
+            "latency_ms": {
+                "mean": statistics.mean(latencies),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            },
+            "batch_queries_per_second": len(batch) / batch_seconds if batch_seconds else None,
+        }
+
+    return {
+        "chunks": size,
+        "documents": len(vector_store.documents_store),
+        "ingest_seconds": ingest_seconds,
+        "ingest_chunks_per_second": size / ingest_seconds if ingest_seconds else None,
+        "corpus_build_ms": corpus_build_ms,
+        "search": modes,
+        "memory": {
+            "rss_delta_bytes": rss_after - rss_before,
+            "rss_bytes_per_chunk": (rss_after - rss_before) / size,
+            "accounted_bytes": accounted,
+            "accounted_bytes_per_chunk": sum(accounted.values()) / size,
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector_store ingest/search/memory as the corpus grows")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--chunks-per-document", type=int, default=500)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--dimensions", type=int, default=DIMENSIONS)
+    parser.add_argument("--modes", nargs="+", default=["dense"], choices=["dense", "lexical", "hybrid"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shared-index", action="store_true", help="also publish documents to the on-disk index")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    import shared_index
+    import vector_store
+    shared_index.SHARED_INDEX_ENABLED = args.shared_index
+
+    results = {"encoder": "random-unit-vectors", "config": vars(args), "runs": []}
+    for size in args.sizes:
+        results["runs"].append(bench_size(vector_store, size, args))
+        print(f"{size} chunks done", file=sys.stderr)
+    results["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Chunk Store - compact storage of stored chunk texts
+"""
+from typing import Iterator, List
+
+import numpy as np
+
+class ChunkText:
+    """
+    A document's chunks as one UTF-8 buffer and an int64 offsets array: chunk i is
+    buffer[offsets[i]:offsets[i + 1]]. Holds two objects per document instead of one str
+    per chunk, neither of which the garbage collector traverses. Strings are decoded on
+    access, so searches only build them for the hits they return.
+    """
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self, chunks: List[str]):
+        text = "".join(chunks)
+        self.buffer = text.encode("utf-8")
+        if len(self.buffer) == len(text):  # ASCII: byte lengths are the character lengths
+            lengths = (len(chunk) for chunk in chunks)
+        else:
+            lengths = (len(chunk.encode("utf-8")) for chunk in chunks)
+        self.offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(lengths, dtype=np.int64, count=len(chunks)), out=self.offsets[1:])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(f"chunk position {position} out of range")
+        return self.buffer[self.offsets[position]:self.offsets[position + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        view = memoryview(self.buffer)
+        for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist()):
+            yield str(view[start:end], "utf-8")
+
+    def nbytes(self) -> int:
+        """Text bytes plus the offsets array"""
+        return len(self.buffer) + self.offsets.nbytes
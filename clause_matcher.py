@@ -1,13 +1,31 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
-from typing import List, Tuple
+import re
+import json
+import logging
+import threading
+from typing import List, Optional, Tuple
 
-load_dotenv()
+import numpy as np
 
-# Configure Google Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+import llm_client
+import metrics
+from utils import LRUCache, get_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Reranker selection: "llm" (Gemini ranking prompt) or "local" (CPU cross-encoder)
+RERANKER = os.getenv("RERANKER", "llm").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+# Cross-encoder scores keyed by (query hash, chunk hash)
+rerank_score_cache = LRUCache(maxsize=RERANK_CACHE_SIZE, name="rerank")
+cross_encoder_cache = None
+_cross_encoder_lock = threading.Lock()
+
+# Relevance scoring: chunks per structured LLM call, and how many calls may run at once
+RELEVANCE_BATCH_SIZE = int(os.getenv("RELEVANCE_BATCH_SIZE", "10"))
+RELEVANCE_MAX_CONCURRENCY = int(os.getenv("RELEVANCE_MAX_CONCURRENCY", "4"))
 
 def rerank_chunks_with_llm(query: str, chunks: List[str], top_k: int = 5) -> List[str]:
     """
@@ -18,8 +36,8 @@ def rerank_chunks_with_llm(query: str, chunks: List[str], top_k: int = 5) -> Lis
         return []
     
     try:
-        # If we have fewer chunks than top_k, return all of them
-        if len(chunks) <= top_k:
+        # A single chunk needs no ranking
+        if len(chunks) <= 1:
             return chunks
         
         # Create a prompt for the LLM to score relevance
@@ -43,157 +61,179 @@ For example: 3, 1, 7, 2, 5
 Ranking:
 """
         
-        response = gemini_model.generate_content(
+        response_text = llm_client.generate(
             rerank_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=100,
-                temperature=0.1,
-            )
+            max_output_tokens=100,
+            temperature=0.1,
         )
         
-        ranking_str = response.text.strip()
+        ranking_str = response_text.strip()
         
-        # Parse the ranking
-        try:
-            rankings = [int(x.strip()) - 1 for x in ranking_str.split(',')]  # Convert to 0-based index
-            # Validate rankings
-            rankings = [r for r in rankings if 0 <= r < len(chunks)]
-            
-            # Return top_k chunks in the ranked order
-            reranked_chunks = [chunks[i] for i in rankings[:top_k] if i < len(chunks)]
-            
-            # If we don't have enough from ranking, add remaining chunks
-            if len(reranked_chunks) < top_k:
-                used_indices = set(rankings[:top_k])
-                for i, chunk in enumerate(chunks):
-                    if i not in used_indices and len(reranked_chunks) < top_k:
-                        reranked_chunks.append(chunk)
-            
-            return reranked_chunks
-            
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing rankings: {e}")
-            # Fallback to original order
-            return chunks[:top_k]
+        # Parse the ranking ("3, 1, 7", one number per line, "Chunk 3 > Chunk 1", ...)
+        rankings = []
+        for number in re.findall(r"\d+", ranking_str):
+            index = int(number) - 1  # Convert to 0-based index
+            if 0 <= index < len(chunks) and index not in rankings:
+                rankings.append(index)
         
-        response = gemini_model.generate_content(
-            rerank_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=100,
-                temperature=0.1,
-            )
-        )
-        
-        ranking_str = response.text.strip()
-        
-        # Parse the ranking
-        try:
-            rankings = [int(x.strip()) - 1 for x in ranking_str.split(',')]  # Convert to 0-based index
-            # Validate rankings
-            rankings = [r for r in rankings if 0 <= r < len(chunks)]
-            
-            # Return top_k chunks in the ranked order
-            reranked_chunks = [chunks[i] for i in rankings[:top_k] if i < len(chunks)]
-            
-            # If we don't have enough from ranking, add remaining chunks
-            if len(reranked_chunks) < top_k:
-                used_indices = set(rankings[:top_k])
-                for i, chunk in enumerate(chunks):
-                    if i not in used_indices and len(reranked_chunks) < top_k:
-                        reranked_chunks.append(chunk)
-            
-            return reranked_chunks
-            
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing rankings: {e}")
-            # Fallback to original order
+        if not rankings:
+            print(f"Could not parse LLM ranking {ranking_str[:100]!r}, keeping retrieval order")
             return chunks[:top_k]
+        
+        # Return top_k chunks in the ranked order, topped up with unranked chunks in retrieval order
+        rankings += [i for i in range(len(chunks)) if i not in rankings]
+        return [chunks[i] for i in rankings[:top_k]]
             
     except Exception as e:
         print(f"Error in LLM reranking: {e}")
         # Fallback to original order
         return chunks[:top_k]
 
-def filter_relevant_chunks(query: str, chunks: List[str], relevance_threshold: float = 0.7) -> List[str]:
+def get_cross_encoder():
+    """Get cached cross-encoder model instance"""
+    global cross_encoder_cache
+    if cross_encoder_cache is None:
+        with _cross_encoder_lock:
+            if cross_encoder_cache is None:
+                from sentence_transformers import CrossEncoder
+                
+                logger.info(f"Loading cross-encoder reranker {RERANKER_MODEL}...")
+                cross_encoder_cache = CrossEncoder(RERANKER_MODEL, device='cpu', max_length=256)
+                logger.info("✅ Cross-encoder loaded and cached")
+    return cross_encoder_cache
+
+def score_chunks_locally(query: str, chunks: List[str]) -> np.ndarray:
     """
-    Filter chunks based on relevance to the query using LLM
+    Score (query, chunk) pairs with the CPU cross-encoder in one batch, reusing cached scores
+    """
+    query_hash = get_text_hash(query)
+    keys = [(query_hash, get_text_hash(chunk)) for chunk in chunks]
+    scores = np.empty(len(chunks), dtype=np.float32)
+    
+    missing = []
+    for i, key in enumerate(keys):
+        cached = rerank_score_cache.get(key)
+        if cached is None:
+            missing.append(i)
+        else:
+            scores[i] = cached
+    
+    if missing:
+        predicted = get_cross_encoder().predict(
+            [(query, chunks[i]) for i in missing], batch_size=32, show_progress_bar=False
+        )
+        for i, score in zip(missing, predicted):
+            scores[i] = float(score)
+            rerank_score_cache.put(keys[i], float(score))
+    
+    return scores
+
+def rerank_chunks_locally(query: str, chunks: List[str], top_k: int = 5) -> List[str]:
+    """
+    Re-rank retrieved chunks with a local cross-encoder instead of an LLM round trip
     """
     if not chunks:
         return []
     
     try:
-        relevant_chunks = []
+        scores = score_chunks_locally(query, chunks)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [chunks[i] for i in order]
         
-        for chunk in chunks:
-            relevance_prompt = f"""
-Rate the relevance of this text chunk to the given question on a scale of 0.0 to 1.0.
-- 1.0 = Directly answers the question or contains the exact information needed
-- 0.7-0.9 = Contains relevant information that helps answer the question
-- 0.4-0.6 = Somewhat related but not directly helpful
-- 0.0-0.3 = Not relevant to the question
+    except Exception as e:
+        print(f"Error in local reranking: {e}")
+        return chunks[:top_k]
 
-Question: "{query}"
+def rerank_chunks(query: str, chunks: List[str], top_k: int = 5, reranker: str = None) -> List[str]:
+    """
+    Re-rank chunks with the configured reranker ("llm" or "local")
+    """
+    reranker = (reranker or RERANKER).lower()
+    with metrics.stage("rerank"):
+        if reranker == "local":
+            return rerank_chunks_locally(query, chunks, top_k)
+        return rerank_chunks_with_llm(query, chunks, top_k)
 
-Text Chunk: "{chunk}"
+def get_rerank_cache_stats() -> dict:
+    """Get cross-encoder score cache statistics"""
+    stats = rerank_score_cache.stats()
+    stats["reranker"] = RERANKER
+    stats["model_loaded"] = cross_encoder_cache is not None
+    return stats
 
-Relevance Score (0.0 to 1.0):
-"""
-            
-            response = gemini_model.generate_content(
-                relevance_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=10,
-                    temperature=0.1,
-                )
-            )
-            
-            try:
-                score = float(response.text.strip())
-                if score >= relevance_threshold:
-                    relevant_chunks.append(chunk)
-            except ValueError:
-                # If we can't parse the score, include the chunk to be safe
-                relevant_chunks.append(chunk)
-        
-        return relevant_chunks
-        
-    except Exception as e:
-        print(f"Error in relevance filtering: {e}")
-        # Fallback to returning all chunks
-        return chunks
-
-def semantic_chunk_matching(query: str, chunks: List[str], max_chunks: int = 5) -> List[str]:
+def parse_relevance_scores(response_text: str, count: int) -> List[Optional[float]]:
     """
-    Main function that combines reranking and filtering for optimal chunk selection
+    Parse a list of relevance scores from an LLM reply. Accepts a JSON list or object,
+    "<n>: <score>" style lines, or a bare list of numbers. Percentages are scaled to 0-1.
+    Chunks without a parseable score get None.
     """
-    if not chunks:
-        return []
+    def to_score(value) -> Optional[float]:
+        try:
+            score = float(value)
+        except (TypeError, ValueError):
+            return None
+        if 1.0 < score <= 100.0:
+            score /= 100.0
+        return min(1.0, max(0.0, score))
     
-    # First, rerank the chunks
-    reranked_chunks = rerank_chunks_with_llm(query, chunks, top_k=min(10, len(chunks)))
+    scores: List[Optional[float]] = [None] * count
+    text = response_text.strip()
     
-    # Then filter for relevance
-    relevant_chunks = filter_relevant_chunks(query, reranked_chunks, relevance_threshold=0.6)
+    # JSON: [0.9, 0.2], {"1": 0.9}, or [{"chunk": 1, "score": 0.9}]
+    json_match = re.search(r"[\[{].*[\]}]", text, re.DOTALL)
+    if json_match:
+        try:
+            data = json.loads(json_match.group(0))
+            if isinstance(data, dict):
+                data = [{"chunk": k, "score": v} for k, v in data.items()]
+            if isinstance(data, list) and data and all(isinstance(x, dict) for x in data):
+                for item in data:
+                    index = item.get("chunk", item.get("id", item.get("index")))
+                    index = int(re.sub(r"\D", "", str(index)) or 0) - 1
+                    if 0 <= index < count:
+                        scores[index] = to_score(item.get("score", item.get("relevance")))
+                return scores
+            if isinstance(data, list) and len(data) == count:
+                return [to_score(x) for x in data]
+        except (ValueError, TypeError):
+            pass
     
-    # Return up to max_chunks
-    return relevant_chunks[:max_chunks]
-        print(f"Error in LLM reranking: {e}")
-        # Fallback to original order
-        return chunks[:top_k]
+    # Lines such as "1: 0.8", "[Chunk 2] - 0.35", "Chunk 3 = 90%"
+    labelled = re.findall(r"(?:chunk|\[)?\s*(\d+)\s*\]?\s*[:=\-\u2013)]\s*([01]?\.\d+|\d+(?:\.\d+)?)\s*%?", text, re.IGNORECASE)
+    if labelled:
+        for index, value in labelled:
+            index = int(index) - 1
+            if 0 <= index < count:
+                scores[index] = to_score(value)
+        return scores
+    
+    # Bare numbers in chunk order
+    numbers = re.findall(r"\d*\.?\d+", text)
+    if len(numbers) == count:
+        return [to_score(x) for x in numbers]
+    
+    print(f"Could not parse relevance scores from: {text[:100]!r}")
+    return scores
 
-def filter_relevant_chunks(query: str, chunks: List[str], relevance_threshold: float = 0.7) -> List[str]:
+def score_chunks_with_llm(query: str, chunks: List[str]) -> List[Optional[float]]:
     """
-    Filter chunks based on relevance to the query using LLM
+    Score the relevance of every chunk in one structured LLM call per batch.
+    Large candidate sets are split into batches that run concurrently.
     """
     if not chunks:
         return []
     
-    try:
-        relevant_chunks = []
+    batches = [list(range(start, min(start + RELEVANCE_BATCH_SIZE, len(chunks))))
+               for start in range(0, len(chunks), RELEVANCE_BATCH_SIZE)]
+    
+    prompts = []
+    for batch in batches:
+        chunk_text = ""
+        for number, index in enumerate(batch, 1):
+            chunk_text += f"\n[Chunk {number}]: {chunks[index]}\n"
         
-        for chunk in chunks:
-            relevance_prompt = f"""
-Rate the relevance of this text chunk to the given question on a scale of 0.0 to 1.0.
+        prompts.append(f"""
+Rate the relevance of each text chunk to the given question on a scale of 0.0 to 1.0.
 - 1.0 = Directly answers the question or contains the exact information needed
 - 0.7-0.9 = Contains relevant information that helps answer the question
 - 0.4-0.6 = Somewhat related but not directly helpful
@@ -201,28 +241,44 @@ Rate the relevance of this text chunk to the given question on a scale of 0.0 to
 
 Question: "{query}"
 
-Text Chunk: "{chunk}"
+Text Chunks:
+{chunk_text}
 
-Relevance Score (0.0 to 1.0):
-"""
-            
-            response = gemini_model.generate_content(
-                relevance_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=10,
-                    temperature=0.1,
-                )
-            )
-            
-            try:
-                score = float(response.text.strip())
-                if score >= relevance_threshold:
-                    relevant_chunks.append(chunk)
-            except ValueError:
-                # If we can't parse the score, include the chunk to be safe
-                relevant_chunks.append(chunk)
+Return one line per chunk in the form "<chunk number>: <score>", for example:
+1: 0.8
+2: 0.1
+
+Relevance Scores:
+""")
+    
+    responses = llm_client.generate_many(
+        prompts,
+        max_concurrency=RELEVANCE_MAX_CONCURRENCY,
+        max_output_tokens=10 * RELEVANCE_BATCH_SIZE,
+        temperature=0.1,
+    )
+    
+    scores: List[Optional[float]] = [None] * len(chunks)
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            print(f"Error scoring chunk batch: {response}")
+            continue
+        for index, score in zip(batch, parse_relevance_scores(response, len(batch))):
+            scores[index] = score
+    return scores
+
+def filter_relevant_chunks(query: str, chunks: List[str], relevance_threshold: float = 0.7) -> List[str]:
+    """
+    Filter chunks based on relevance to the query using LLM
+    """
+    if not chunks:
+        return []
+    
+    try:
+        scores = score_chunks_with_llm(query, chunks)
         
-        return relevant_chunks
+        # If we can't get a score for a chunk, include it to be safe
+        return [chunk for chunk, score in zip(chunks, scores) if score is None or score >= relevance_threshold]
         
     except Exception as e:
         print(f"Error in relevance filtering: {e}")
@@ -237,7 +293,7 @@ def semantic_chunk_matching(query: str, chunks: List[str], max_chunks: int = 5)
         return []
     
     # First, rerank the chunks
-    reranked_chunks = rerank_chunks_with_llm(query, chunks, top_k=min(10, len(chunks)))
+    reranked_chunks = rerank_chunks(query, chunks, top_k=min(10, len(chunks)))
     
     # Then filter for relevance
     relevant_chunks = filter_relevant_chunks(query, reranked_chunks, relevance_threshold=0.6)
@@ -253,11 +309,9 @@ def filter_relevant_chunks_legacy(question, chunks):
         prompt += f"Clause {i+1}: {chunk}\n\n"
     prompt += "Return only the clauses that directly help answer the question."
 
-    response = gemini_model.generate_content(
+    response_text = llm_client.generate(
         prompt,
-        generation_config=genai.types.GenerationConfig(
-            max_output_tokens=500,
-            temperature=0,
-        )
+        max_output_tokens=500,
+        temperature=0,
     )
-    return response.text
+    return response_text
@@ -0,0 +1,151 @@
+"""
+Context Packer - merge overlapping chunks and fill a token budget for answer prompts
+"""
+import os
+import re
+import logging
+import threading
+from typing import Any, Dict, List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+MAX_OVERLAP_CHARS = 300          # Chunking overlaps by up to 100 chars; leave headroom
+NEAR_DUPLICATE_JACCARD = 0.9     # Word-set similarity above which a sentence is a repeat
+CHARS_PER_TOKEN = 4              # Rough English average for Gemini's tokenizer
+
+# Cumulative packing statistics
+packing_stats = {"prompts": 0, "tokens_before": 0, "tokens_after": 0, "sources_merged": 0, "sentences_dropped": 0}
+_stats_lock = threading.Lock()
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the prompt token count of a text without a network round trip"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def chunk_text(chunk: Any) -> str:
+    """Get the text of a retrieved chunk given as a string, (text, score) tuple or search hit dict"""
+    if isinstance(chunk, dict):
+        return chunk["text"]
+    if isinstance(chunk, (tuple, list)):
+        return chunk[0]
+    return chunk
+
+def merge_overlap(left: str, right: str) -> str:
+    """Join two consecutive chunks, dropping the text the second repeats from the end of the first"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+
+def _word_set(sentence: str) -> frozenset:
+    return frozenset(re.findall(r"\w+", sentence.lower()))
+
+def _group_adjacent(chunks: List[Any]) -> List[List[Dict]]:
+    """
+    Group chunks that are adjacent in the same document; groups keep the relevance
+    order of their best-ranked member
+    """
+    hits = []
+    for rank, chunk in enumerate(chunks):
+        if isinstance(chunk, dict):
+            hits.append({"text": chunk["text"], "doc_id": chunk.get("doc_id"), "position": chunk.get("position"), "rank": rank})
+        else:
+            hits.append({"text": chunk_text(chunk), "doc_id": None, "position": None, "rank": rank})
+
+    groups = []
+    located = {}
+    for hit in hits:
+        if hit["doc_id"] is None or hit["position"] is None:
+            groups.append([hit])
+        else:
+            located.setdefault(hit["doc_id"], []).append(hit)
+
+    for doc_hits in located.values():
+        doc_hits.sort(key=lambda h: h["position"])
+        run = [doc_hits[0]]
+        for hit in doc_hits[1:]:
+            if hit["position"] - run[-1]["position"] <= 1:
+                if hit["position"] != run[-1]["position"]:
+                    run.append(hit)
+            else:
+                groups.append(run)
+                run = [hit]
+        groups.append(run)
+
+    groups.sort(key=lambda group: min(h["rank"] for h in group))
+    return groups
+
+def pack_context(chunks: List[Any], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Pack retrieved chunks (most relevant first) into numbered sources for an answer prompt.
+
+    Overlapping neighbours from the same document are merged into one source, repeated or
+    near-duplicate sentences are dropped, and sources are added in relevance order until the
+    token budget is spent. Source numbers follow relevance, so the best hit is always Source 1.
+    """
+    tokens_before = sum(estimate_tokens(chunk_text(chunk)) for chunk in chunks)
+    groups = _group_adjacent(chunks)
+
+    char_budget = token_budget * CHARS_PER_TOKEN
+    seen_exact = set()
+    seen_sets = []
+    sources = []
+    used_chars = 0
+    dropped = 0
+
+    for group in groups:
+        text = group[0]["text"]
+        for hit in group[1:]:
+            text = merge_overlap(text, hit["text"])
+
+        kept = []
+        for sentence in _sentences(text):
+            words = _word_set(sentence)
+            key = " ".join(sorted(words))
+            if key in seen_exact or any(
+                len(words & other) / len(words | other) >= NEAR_DUPLICATE_JACCARD
+                for other in seen_sets if words and other
+            ):
+                dropped += 1
+                continue
+
+            if used_chars + len(sentence) + 1 > char_budget and (kept or sources):
+                break
+            seen_exact.add(key)
+            seen_sets.append(words)
+            kept.append(sentence)
+            used_chars += len(sentence) + 1
+
+        if kept:
+            sources.append(" ".join(kept))
+        if used_chars >= char_budget:
+            break
+
+    tokens_after = sum(estimate_tokens(source) for source in sources)
+
+    merged = sum(len(group) - 1 for group in groups)
+    with _stats_lock:
+        packing_stats["prompts"] += 1
+        packing_stats["tokens_before"] += tokens_before
+        packing_stats["tokens_after"] += tokens_after
+        packing_stats["sources_merged"] += merged
+        packing_stats["sentences_dropped"] += dropped
+
+    logger.info(
+        f"📦 Packed {len(chunks)} chunks into {len(sources)} sources: "
+        f"~{tokens_before} -> ~{tokens_after} context tokens ({merged} merged, {dropped} duplicate sentences dropped)"
+    )
+    return {"sources": sources, "tokens_before": tokens_before, "tokens_after": tokens_after}
+
+def get_packing_stats() -> Dict[str, Any]:
+    """Get cumulative context packing statistics"""
+    with _stats_lock:
+        stats = dict(packing_stats)
+    if stats["tokens_before"]:
+        stats["token_reduction"] = round(1 - stats["tokens_after"] / stats["tokens_before"], 3)
+    return stats
@@ -1,16 +1,42 @@
 import requests
-import pdfplumber
 import os
 import hashlib
-from nltk.tokenize import sent_tokenize
-from typing import List, Tuple
-import nltk
+import threading
+from typing import List, Optional, Tuple
 
-# Download NLTK data if not present
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+import metrics
+import tracing
+
+# extract_and_chunk_text and process_document_url report failures as a single placeholder chunk
+EXTRACTION_FAILURES = ("Failed to process document from", "Error processing document:",
+                       "No text could be extracted", "No meaningful text could be extracted")
+
+# NLTK and pdfplumber are imported on first use, keeping them (and any punkt download) off the import path
+_punkt_ready = False
+_punkt_lock = threading.Lock()
+
+def ensure_sentence_tokenizer():
+    """
+    Make sure NLTK's punkt data is available, downloading it if not present
+    """
+    global _punkt_ready
+    if not _punkt_ready:
+        with _punkt_lock:
+            if not _punkt_ready:
+                import nltk
+                try:
+                    nltk.data.find('tokenizers/punkt')
+                except LookupError:
+                    nltk.download('punkt')
+                _punkt_ready = True
+
+def sent_tokenize(text: str) -> List[str]:
+    """
+    Split text into sentences with NLTK
+    """
+    ensure_sentence_tokenizer()
+    from nltk.tokenize import sent_tokenize as nltk_sent_tokenize
+    return nltk_sent_tokenize(text)
 
 def download_pdf(url: str, download_dir: str = "temp_docs") -> str:
     """
@@ -27,8 +53,10 @@ def download_pdf(url: str, download_dir: str = "temp_docs") -> str:
         filepath = os.path.join(download_dir, filename)
         
         # Download the file
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
+        with metrics.stage("download"):
+            response = requests.get(url, timeout=60)
+            response.raise_for_status()
+        metrics.DOWNLOAD_BYTES.inc(len(response.content))
         
         with open(filepath, "wb") as f:
             f.write(response.content)
@@ -45,20 +73,24 @@ def extract_and_chunk_text(pdf_path: str, chunk_size: int = 800, overlap: int =
     Extract text from PDF and split into meaningful chunks with overlap
     """
     try:
+        import pdfplumber
+        
         chunks = []
         
-        with pdfplumber.open(pdf_path) as pdf:
+        with metrics.stage("extract"), pdfplumber.open(pdf_path) as pdf:
             full_text = ""
             
             # Extract text from all pages
-            for page in pdf.pages:
-                page_text = page.extract_text()
+            for number, page in enumerate(pdf.pages, 1):
+                with tracing.span("page", number=number):
+                    page_text = page.extract_text()
                 if page_text:
                     full_text += page_text + "\n"
-            
-            if not full_text.strip():
-                return ["No text could be extracted from this document."]
-            
+        
+        if not full_text.strip():
+            return ["No text could be extracted from this document."]
+        
+        with metrics.stage("chunk"):
             # Clean the text
             full_text = clean_text(full_text)
             
@@ -139,6 +171,8 @@ def extract_document_metadata(pdf_path: str) -> dict:
     }
     
     try:
+        import pdfplumber
+        
         metadata["file_size"] = os.path.getsize(pdf_path)
         
         with pdfplumber.open(pdf_path) as pdf:
@@ -155,6 +189,19 @@ def extract_document_metadata(pdf_path: str) -> dict:
     
     return metadata
 
+def extraction_error(chunks: List[str], metadata: dict = None) -> Optional[str]:
+    """
+    The failure reported for a processed document (error metadata or a placeholder chunk),
+    or None when its chunks are real text that can be indexed
+    """
+    if metadata and metadata.get("error"):
+        return metadata["error"]
+    if not chunks:
+        return "No text could be extracted from this document."
+    if len(chunks) == 1 and chunks[0].startswith(EXTRACTION_FAILURES):
+        return chunks[0]
+    return None
+
 def process_document_url(url: str) -> Tuple[List[str], dict]:
     """
     Complete document processing pipeline: download, extract, chunk, and get metadata
@@ -0,0 +1,194 @@
+"""
+Bulk index builder - pre-build the shared index from local PDFs
+
+Extracts and chunks PDFs on a process pool, embeds the chunks of many documents together
+in large encoder batches and publishes each document to the shared index (SHARED_INDEX_DIR),
+where every worker loads it at startup instead of downloading and embedding it.
+
+Documents are keyed like the service keys URLs, so pass the URL clients will request:
+--base-url maps files under the directory to URLs, or a JSONL manifest lists
+{"path": ..., "url": ...} per line. Without either, the file:// URI of the PDF is used.
+Documents already in the index are skipped, so an interrupted build resumes where it stopped.
+
+Usage:
+    python index_builder.py policies/ --base-url https://example.com/policies/
+    python index_builder.py manifest.jsonl --workers 8 --batch-size 1024
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import shared_index
+import vector_store
+from doc_parser import extraction_error
+from utils import generate_document_id
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+def find_documents(source: str, base_url: str = None) -> List[Dict[str, str]]:
+    """(path, url, doc_id) of every PDF in a directory, or of every entry of a JSONL manifest"""
+    documents = []
+    if os.path.isdir(source):
+        for path in sorted(Path(source).rglob("*.pdf")):
+            relative = path.relative_to(source).as_posix()
+            url = base_url.rstrip("/") + "/" + relative if base_url else path.resolve().as_uri()
+            documents.append({"path": str(path), "url": url})
+    else:
+        manifest_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    path = os.path.join(manifest_dir, entry["path"])
+                    documents.append({"path": path, "url": entry.get("url") or Path(path).resolve().as_uri()})
+    for document in documents:
+        document["doc_id"] = generate_document_id(document["url"])
+    return documents
+
+def extract_document(path: str) -> Tuple[List[str], float]:
+    """Extract and chunk one PDF (runs in a worker process)"""
+    import doc_parser
+
+    start = time.perf_counter()
+    chunks = doc_parser.extract_and_chunk_text(path)
+    return chunks, time.perf_counter() - start
+
+class Progress:
+    """Documents, chunks and throughput, logged every PROGRESS_INTERVAL_SECONDS"""
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.documents = 0
+        self.chunks = 0
+        self.failed = 0
+
+    def update(self, documents: int = 0, chunks: int = 0, failed: int = 0, force: bool = False):
+        self.documents += documents
+        self.chunks += chunks
+        self.failed += failed
+        now = time.perf_counter()
+        if force or now - self.last_report >= PROGRESS_INTERVAL_SECONDS:
+            self.last_report = now
+            summary = self.summary()
+            remaining = self.total - self.documents - self.failed
+            eta = remaining / summary["documents_per_second"] if summary["documents_per_second"] else None
+            logger.info(f"🏗️ {self.documents + self.failed}/{self.total} documents ({self.failed} failed), "
+                        f"{self.chunks} chunks, {summary['documents_per_second']} docs/s, "
+                        f"{summary['chunks_per_second']} chunks/s" + (f", ETA {eta:.0f}s" if eta else ""))
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "documents": self.documents,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 2),
+            "documents_per_second": round(self.documents / elapsed, 2) if elapsed else None,
+            "chunks_per_second": round(self.chunks / elapsed, 1) if elapsed else None,
+        }
+
+def embed_and_publish(pending: List[Tuple[Dict, List[str]]], batch_size: int, index_dir: str):
+    """Encode the chunks of several documents in one call and publish each document"""
+    all_chunks = [chunk for _, chunks in pending for chunk in chunks]
+    embeddings = vector_store.normalize_rows(
+        vector_store.get_model().encode(all_chunks, batch_size=batch_size, show_progress_bar=False)
+    )
+    offset = 0
+    for document, chunks in pending:
+        shared_index.publish_document(document["doc_id"], chunks, embeddings[offset:offset + len(chunks)],
+                                      url=document["url"], index_dir=index_dir)
+        offset += len(chunks)
+
+def build_index(source: str, base_url: str = None, index_dir: str = None, workers: int = None,
+                batch_size: int = 512, rebuild: bool = False) -> Dict:
+    """Build (or resume building) the shared index from local PDFs. Returns a summary"""
+    index_dir = index_dir or shared_index.SHARED_INDEX_DIR
+    documents = find_documents(source, base_url)
+    ready = set() if rebuild else {entry["doc_id"] for entry in shared_index.ready_documents_since(0, index_dir)}
+    todo = [document for document in documents if document["doc_id"] not in ready]
+    logger.info(f"📂 {len(documents)} PDFs, {len(documents) - len(todo)} already indexed, {len(todo)} to build")
+
+    progress = Progress(len(todo))
+    failures = []
+    extract_seconds = 0.0
+    pending, pending_chunks = [], 0
+    workers = workers or os.cpu_count() or 1
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(todo)
+        running = {}
+
+        def submit_next():
+            document = next(queue, None)
+            if document is not None:
+                running[pool.submit(extract_document, document["path"])] = document
+
+        # Keep a bounded number of extractions in flight so parsed chunks don't pile up
+        for _ in range(workers * 2):
+            submit_next()
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                document = running.pop(future)
+                submit_next()
+                try:
+                    chunks, seconds = future.result()
+                    extract_seconds += seconds
+                except Exception as e:
+                    failures.append({"path": document["path"], "error": str(e)})
+                    logger.error(f"Failed to extract {document['path']}: {e}")
+                    progress.update(failed=1)
+                    continue
+                error = extraction_error(chunks)
+                if error:  # Placeholder chunks are never indexed
+                    failures.append({"path": document["path"], "error": error})
+                    progress.update(failed=1)
+                    continue
+                pending.append((document, chunks))
+                pending_chunks += len(chunks)
+                if pending_chunks >= batch_size:
+                    embed_and_publish(pending, batch_size, index_dir)
+                    progress.update(documents=len(pending), chunks=pending_chunks)
+                    pending, pending_chunks = [], 0
+        if pending:
+            embed_and_publish(pending, batch_size, index_dir)
+            progress.update(documents=len(pending), chunks=pending_chunks)
+    progress.update(force=True)
+
+    summary = progress.summary()
+    summary.update({
+        "index_dir": index_dir,
+        "found": len(documents),
+        "skipped_already_indexed": len(documents) - len(todo),
+        "extract_cpu_seconds": round(extract_seconds, 2),
+        "failures": failures,
+    })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared index from a directory or manifest of local PDFs")
+    parser.add_argument("source", help="directory of PDFs, or a JSONL manifest of {path, url}")
+    parser.add_argument("--base-url", help="URL prefix the service will be asked for (directory input)")
+    parser.add_argument("--index-dir", help=f"index directory (default SHARED_INDEX_DIR={shared_index.SHARED_INDEX_DIR})")
+    parser.add_argument("--workers", type=int, help="extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=512, help="chunks per encoder call")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed documents that are already indexed")
+    args = parser.parse_args()
+
+    summary = build_index(args.source, args.base_url, args.index_dir, args.workers, args.batch_size, args.rebuild)
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failures"] else 0)
+
+if __name__ == "__main__":
+    main()
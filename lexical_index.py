@@ -0,0 +1,96 @@
+"""
+Lexical Index - compact BM25 inverted index over stored chunks
+"""
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils import tokenize
+
+# BM25 parameters (Robertson/Sparck Jones defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+class DocumentPostings:
+    """
+    Inverted index for one document's chunks. All postings live in two flat int32 arrays
+    (chunk position, term frequency); each term maps to its [start, end) slice.
+    """
+    def __init__(self, chunks: List[str]):
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.chunk_lengths = np.zeros(len(chunks), dtype=np.int32)
+
+        for position, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.chunk_lengths[position] = sum(counts.values())
+            for term, frequency in counts.items():
+                term_postings.setdefault(term, []).append((position, frequency))
+
+        size = sum(len(postings) for postings in term_postings.values())
+        self.positions = np.empty(size, dtype=np.int32)
+        self.frequencies = np.empty(size, dtype=np.int32)
+        self.term_slices: Dict[str, Tuple[int, int]] = {}
+
+        offset = 0
+        for term, postings in term_postings.items():
+            end = offset + len(postings)
+            self.positions[offset:end] = [p for p, _ in postings]
+            self.frequencies[offset:end] = [f for _, f in postings]
+            self.term_slices[term] = (offset, end)
+            offset = end
+
+        self.total_length = int(self.chunk_lengths.sum())
+
+    def document_frequency(self, term: str) -> int:
+        """Number of this document's chunks containing the term"""
+        start, end = self.term_slices.get(term, (0, 0))
+        return end - start
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Chunk positions and term frequencies for a term"""
+        start, end = self.term_slices.get(term, (0, 0))
+        return self.positions[start:end], self.frequencies[start:end]
+
+    def nbytes(self) -> int:
+        """Approximate array memory of the postings"""
+        return self.positions.nbytes + self.frequencies.nbytes + self.chunk_lengths.nbytes
+
+def bm25_scores(query: str, documents: List[Tuple[int, DocumentPostings]], total_chunks: int) -> np.ndarray:
+    """
+    BM25 score of every chunk in the corpus for a query. documents pairs each document's
+    postings with the row offset of its first chunk in the corpus.
+    """
+    scores = np.zeros(total_chunks, dtype=np.float32)
+    if not documents or total_chunks == 0:
+        return scores
+
+    average_length = max(1.0, sum(p.total_length for _, p in documents) / total_chunks)
+    terms = set(tokenize(query))
+
+    for term in terms:
+        document_frequency = sum(p.document_frequency(term) for _, p in documents)
+        if document_frequency == 0:
+            continue
+        idf = np.log(1.0 + (total_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        for offset, postings in documents:
+            positions, frequencies = postings.postings(term)
+            if len(positions) == 0:
+                continue
+            lengths = postings.chunk_lengths[positions]
+            tf = frequencies.astype(np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / average_length)
+            scores[offset + positions] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+    return scores
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], total: int, k: int = RRF_K) -> np.ndarray:
+    """Fuse several rankings (arrays of row indices, best first) into one score per row"""
+    fused = np.zeros(total, dtype=np.float32)
+    for ranking in rankings:
+        fused[ranking] += 1.0 / (k + np.arange(1, len(ranking) + 1, dtype=np.float32))
+    return fused
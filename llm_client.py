@@ -0,0 +1,328 @@
+"""
+Shared LLM client - one Gemini connection with timeouts, retries and hedging
+"""
+import os
+import time
+import random
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Callable, List, Optional, Union
+
+from dotenv import load_dotenv
+
+import metrics
+import tracing
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tunables (overridable through the environment)
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "true").lower() == "true"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20       # Don't hedge until we have a meaningful latency history
+LATENCY_WINDOW = 200         # Number of recent call latencies kept for the percentile
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+
+# Provider errors that fail the same way on every attempt (google.api_core exception names,
+# matched by name so the Gemini SDK stays a lazy import)
+NON_RETRYABLE_ERRORS = {"PermissionDenied", "Unauthenticated", "InvalidArgument", "NotFound", "FailedPrecondition"}
+
+class LLMError(Exception):
+    """Raised when the LLM provider fails after all retries"""
+
+class LLMTimeoutError(LLMError):
+    """Raised when a call (or the overall deadline) runs out of time"""
+
+def is_retryable(error: Exception) -> bool:
+    """Whether another attempt could succeed where this one failed"""
+    if isinstance(error, (ValueError, TypeError)):  # e.g. response.text of a safety-blocked reply
+        return False
+    return type(error).__name__ not in NON_RETRYABLE_ERRORS
+
+class GeminiProvider:
+    """
+    Provider backed by Google Gemini
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self._genai = genai
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, max_output_tokens: int, temperature: float, timeout: float) -> str:
+        response = self._model.generate_content(
+            prompt,
+            generation_config=self._genai.types.GenerationConfig(
+                max_output_tokens=max_output_tokens,
+                temperature=temperature,
+            ),
+            request_options={"timeout": timeout},
+        )
+        return response.text
+
+class FakeProvider:
+    """
+    Local stand-in for Gemini with injected latency and failures - used by tests and benchmarks
+    """
+    def __init__(self,
+                 responder: Optional[Callable[[str], str]] = None,
+                 latency: Union[float, Callable[[], float]] = 0.0,
+                 failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.responder = responder
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.prompts: List[str] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, max_output_tokens: int, temperature: float, timeout: float) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+            fail = self._rng.random() < self.failure_rate
+
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise LLMError("Injected provider failure")
+        return self.responder(prompt) if self.responder else "This is a fake answer [Source 1]."
+
+class LLMClient:
+    """
+    Thread-safe LLM client with per-call timeouts, jittered retries within a deadline
+    and optional request hedging at the observed p95 latency
+    """
+    def __init__(self,
+                 provider=None,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 hedging: bool = HEDGING_ENABLED,
+                 max_workers: int = 8):
+        self._provider = provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0}
+
+    @property
+    def provider(self):
+        """Get the provider, creating the Gemini provider on first use"""
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    logger.info(f"Initialising Gemini provider ({DEFAULT_MODEL})")
+                    self._provider = GeminiProvider()
+        return self._provider
+
+    @provider.setter
+    def provider(self, provider):
+        with self._lock:
+            self._provider = provider
+            self._latencies.clear()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Observed p95 latency, or None while there isn't enough history to hedge"""
+        with self._lock:
+            if not self.hedging or len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE / 100))
+        return ordered[index]
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _timed_call(self, provider, prompt: str, max_output_tokens: int, temperature: float, timeout: float):
+        start = time.monotonic()
+        with metrics.stage("llm", prompt_chars=len(prompt), max_output_tokens=max_output_tokens):
+            text = provider.generate(prompt, max_output_tokens, temperature, timeout)
+        metrics.LLM_TOKENS.inc(len(prompt) // 4, direction="prompt")
+        metrics.LLM_TOKENS.inc(len(text or "") // 4, direction="completion")
+        return text, time.monotonic() - start
+
+    def _submit(self, *args) -> concurrent.futures.Future:
+        """Submit one provider call. The future's started event is set when a worker picks it up"""
+        started = threading.Event()
+        call = metrics.queued("llm", self._timed_call)
+
+        def run():
+            started.set()
+            return call(*args)
+
+        future = self._executor.submit(run)
+        future.started = started
+        return future
+
+    def _call_with_hedging(self, prompt: str, max_output_tokens: int, temperature: float, timeout: float,
+                           deadline: Optional[float] = None) -> str:
+        """
+        Run one logical attempt: fire the primary call and, if it is slower than the
+        observed p95, a duplicate. The first successful reply wins.
+
+        The timeout runs from when a worker starts the primary call, not while it waits in
+        the executor queue (bounded by deadline only). Calls still queued when the attempt
+        ends are cancelled.
+        """
+        args = (self.provider, prompt, max_output_tokens, temperature, timeout)
+        primary = self._submit(*args)
+        pending = {primary}
+        try:
+            queue_wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not primary.started.wait(queue_wait):
+                self._count("timeouts")
+                raise LLMTimeoutError("Deadline exceeded while the LLM call was queued")
+            end = time.monotonic() + timeout
+            if deadline is not None:
+                end = min(end, deadline)
+
+            hedge_after = self.hedge_delay()
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = concurrent.futures.wait(pending, timeout=hedge_after)
+                if not done:
+                    self._count("hedges")
+                    metrics.LLM_CALLS.inc(outcome="hedge")
+                    pending.add(self._submit(*args))
+
+            last_error = None
+            while pending:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        last_error = future.exception()
+                        continue
+                    text, elapsed = future.result()
+                    with self._lock:
+                        self._latencies.append(elapsed)
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return text
+
+            if last_error is not None and not pending:
+                raise last_error
+            self._count("timeouts")
+            raise LLMTimeoutError(f"LLM call timed out after {timeout:.2f}s")
+        finally:
+            for future in pending:
+                future.cancel()  # Only calls still queued; a running provider call cannot be interrupted
+
+    def generate(self,
+                 prompt: str,
+                 max_output_tokens: int = 800,
+                 temperature: float = 0.1,
+                 timeout: Optional[float] = None,
+                 deadline: Optional[float] = None) -> str:
+        """
+        Generate text for a prompt.
+
+        timeout is per attempt; deadline is an absolute time.monotonic() value that
+        bounds all attempts and backoff sleeps together.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            call_timeout = timeout or self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    metrics.LLM_CALLS.inc(outcome="timeout")
+                    raise LLMTimeoutError("Deadline exceeded before LLM call")
+                call_timeout = min(call_timeout, remaining)
+
+            try:
+                text = self._call_with_hedging(prompt, max_output_tokens, temperature, call_timeout, deadline)
+                metrics.LLM_CALLS.inc(outcome="success")
+                return text
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    metrics.LLM_CALLS.inc(outcome="timeout" if isinstance(e, LLMTimeoutError) else "error")
+                    raise
+                # Full jitter exponential backoff, but never sleep past the deadline
+                backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+                if deadline is not None and time.monotonic() + backoff >= deadline:
+                    self._count("errors")
+                    metrics.LLM_CALLS.inc(outcome="timeout" if isinstance(e, LLMTimeoutError) else "error")
+                    raise
+                logger.warning(f"LLM call failed ({e}), retry {attempt}/{self.max_retries} in {backoff:.2f}s")
+                self._count("retries")
+                metrics.LLM_CALLS.inc(outcome="retry")
+                time.sleep(backoff)
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[Union[str, Exception]]:
+        """
+        Generate several prompts with bounded concurrency. Results keep prompt order;
+        a failed prompt yields its exception instead of raising.
+        """
+        if len(prompts) <= 1 or max_concurrency <= 1:
+            results = []
+            for prompt in prompts:
+                try:
+                    results.append(self.generate(prompt, **kwargs))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        # A separate fan-out pool: generate() itself waits on the call executor
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_concurrency, len(prompts))) as pool:
+            futures = [pool.submit(tracing.bind(self.generate), prompt, **kwargs) for prompt in prompts]
+            return [future.exception() or future.result() for future in futures]
+
+    def get_stats(self) -> dict:
+        """Get call statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["latency_samples"] = len(self._latencies)
+        stats["hedge_delay"] = self.hedge_delay()
+        return stats
+
+# Shared client used by every pipeline module
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> LLMClient:
+    """Get the shared client instance"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+def set_provider(provider):
+    """Swap the provider of the shared client (e.g. a FakeProvider in tests), returning the old one"""
+    client = get_client()
+    previous = client._provider
+    client.provider = provider
+    return previous
+
+def generate(prompt: str, **kwargs) -> str:
+    """Generate text with the shared client"""
+    return get_client().generate(prompt, **kwargs)
+
+def generate_many(prompts: List[str], **kwargs) -> List[Union[str, Exception]]:
+    """Generate several prompts concurrently with the shared client"""
+    return get_client().generate_many(prompts, **kwargs)
@@ -1,26 +1,114 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
-from typing import List
+import re
+from typing import Any, List, Optional, Tuple
 
-load_dotenv()
+import numpy as np
 
-# Configure Google Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+import llm_client
+import metrics
+from context_packer import pack_context, chunk_text
+from utils import Deadline
+from vector_store import embed_text, encode_uncached, normalize_rows
 
-def generate_answer_with_citations(question: str, relevant_chunks: List[str]) -> str:
+# Budget thresholds (seconds remaining) for shedding LLM work
+SHORT_ANSWER_BUDGET = 8.0     # Below this, ask for a shorter answer
+MIN_LLM_BUDGET = 3.0          # Below this, skip the LLM and answer extractively
+SHORT_ANSWER_TOKENS = 300
+
+# Extractive fast path: answer from the best sentence when it is close enough to the question
+EXTRACTIVE_FASTPATH = os.getenv("EXTRACTIVE_FASTPATH", "false").lower() == "true"
+EXTRACTIVE_THRESHOLD = float(os.getenv("EXTRACTIVE_THRESHOLD", "0.7"))
+EXTRACTIVE_TOP_CHUNKS = 2
+
+def split_sentences(text: str) -> List[str]:
+    """Split a chunk into sentences"""
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) > 10]
+
+def extract_answer_span(question: str, relevant_chunks: List[Any], max_chunks: int = EXTRACTIVE_TOP_CHUNKS) -> Optional[Tuple[str, float]]:
+    """
+    Score every sentence of the top chunks against the question embedding in one batch.
+    Returns the best sentence with its [Source X] citation and its cosine similarity.
+    """
+    sentences = []
+    sources = []
+    for i, chunk in enumerate(relevant_chunks[:max_chunks], 1):
+        for sentence in split_sentences(chunk_text(chunk)):
+            sentences.append(sentence)
+            sources.append(i)
+    
+    if not sentences:
+        return None
+    
+    # The question vector is cached with the other queries; sentences are one-off and are not
+    question_vector = normalize_rows(embed_text([question])[0])[0]
+    scores = encode_uncached(sentences) @ question_vector
+    
+    best = int(np.argmax(scores))
+    return f"{sentences[best]} [Source {sources[best]}]", float(scores[best])
+
+def extractive_answer(question: str, relevant_chunks: List[Any]) -> str:
+    """
+    Answer without the LLM by quoting the sentence of the top chunks closest to the question
+    """
+    if not relevant_chunks:
+        return "I cannot find any relevant information in the provided document to answer this question."
+    
+    try:
+        span = extract_answer_span(question, relevant_chunks)
+        if span:
+            return span[0]
+    except Exception as e:
+        print(f"Error scoring sentences for extractive answer: {e}")
+    
+    return f"{chunk_text(relevant_chunks[0]).strip()} [Source 1]"
+
+def answer_with_fast_path(question: str, relevant_chunks: List[Any], deadline: Optional[Deadline] = None,
+                          threshold: float = EXTRACTIVE_THRESHOLD, raise_errors: bool = False) -> str:
+    """
+    Answer extractively when one sentence clearly answers the question,
+    otherwise fall back to the LLM
+    """
+    if relevant_chunks:
+        try:
+            with metrics.stage("extractive"):
+                span = extract_answer_span(question, relevant_chunks)
+            if span and span[1] >= threshold:
+                print(f"Extractive fast path answered with confidence {span[1]:.2f}")
+                return span[0]
+        except Exception as e:
+            print(f"Error in extractive fast path: {e}")
+    
+    return generate_answer_with_citations(question, relevant_chunks, deadline, raise_errors=raise_errors)
+
+def generate_answer_with_citations(question: str, relevant_chunks: List[Any], deadline: Optional[Deadline] = None,
+                                   raise_errors: bool = False) -> str:
     """
     Step 5: Logic Evaluation
-    Generate a comprehensive answer based on relevant context chunks with proper citations
+    Generate a comprehensive answer based on relevant context chunks with proper citations.
+    Chunks may be plain strings or search hits from search_chunks_detailed (most relevant first).
+    With raise_errors=True a failed LLM call raises instead of becoming an apology or
+    extractive answer (batch mode records it as a failure).
     """
     if not relevant_chunks:
         return "I cannot find any relevant information in the provided document to answer this question."
     
-    # Prepare the context with numbered chunks for citation
+    # Shed LLM work when the request budget is running low
+    max_output_tokens = 800
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining < MIN_LLM_BUDGET:
+            deadline.degrade("extractive_answer")
+            return extractive_answer(question, relevant_chunks)
+        if remaining < SHORT_ANSWER_BUDGET:
+            deadline.degrade("short_answer")
+            max_output_tokens = SHORT_ANSWER_TOKENS
+    
+    # Prepare the context with numbered, de-duplicated sources for citation
+    with metrics.stage("pack_context"):
+        packed = pack_context(relevant_chunks)
     context_text = ""
-    for i, chunk in enumerate(relevant_chunks, 1):
-        context_text += f"[Source {i}]: {chunk}\n\n"
+    for i, source in enumerate(packed["sources"], 1):
+        context_text += f"[Source {i}]: {source}\n\n"
     
     prompt = f"""
 You are an expert document analyst. Based on the provided context from a document, answer the user's question accurately and thoroughly.
@@ -42,21 +130,29 @@ Answer:
 """
 
     try:
-        response = gemini_model.generate_content(
+        response_text = llm_client.generate(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=800,
-                temperature=0.1,
-            )
+            max_output_tokens=max_output_tokens,
+            temperature=0.1,
+            deadline=deadline.expires_at if deadline else None,
         )
         
-        return response.text.strip()
+        return response_text.strip()
         
+    except llm_client.LLMTimeoutError as e:
+        if raise_errors:
+            raise
+        print(f"Answer generation ran out of time: {e}")
+        if deadline is not None:
+            deadline.degrade("extractive_answer")
+        return extractive_answer(question, relevant_chunks)
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error generating answer: {e}")
         return f"I apologize, but I encountered an error while processing your question: {str(e)}"
 
-def synthesize_multiple_sources(question: str, sub_answers: List[str]) -> str:
+def synthesize_multiple_sources(question: str, sub_answers: List[str], deadline: Optional[Deadline] = None) -> str:
     """
     Combine answers from multiple sub-questions into a coherent response
     """
@@ -66,6 +162,10 @@ def synthesize_multiple_sources(question: str, sub_answers: List[str]) -> str:
     if len(sub_answers) == 1:
         return sub_answers[0]
     
+    if deadline is not None and deadline.remaining() < MIN_LLM_BUDGET:
+        deadline.degrade("skipped_synthesis")
+        return "\n\n".join(sub_answers)
+    
     synthesis_prompt = f"""
 You have answers to multiple related sub-questions for the main question: "{question}"
 
@@ -82,15 +182,14 @@ Synthesized Answer:
 """
 
     try:
-        response = gemini_model.generate_content(
+        response_text = llm_client.generate(
             synthesis_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=1000,
-                temperature=0.1,
-            )
+            max_output_tokens=1000,
+            temperature=0.1,
+            deadline=deadline.expires_at if deadline else None,
         )
         
-        return response.text.strip()
+        return response_text.strip()
         
     except Exception as e:
         print(f"Error synthesizing answers: {e}")
@@ -102,11 +201,9 @@ def generate_answer(question, context):
     """Legacy function - kept for backward compatibility"""
     prompt = f"""You are a legal assistant. Given the question:\n"{question}"\n\nAnd the relevant policy context:\n{context}\n\nAnswer the question precisely. If you can't find the answer, say "Not mentioned in document." Cite supporting sentences."""
     
-    response = gemini_model.generate_content(
+    response_text = llm_client.generate(
         prompt,
-        generation_config=genai.types.GenerationConfig(
-            max_output_tokens=500,
-            temperature=0.3,
-        )
+        max_output_tokens=500,
+        temperature=0.3,
     )
-    return response.text
+    return response_text
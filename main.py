@@ -1,27 +1,57 @@
 """
 SUPER FAST Version of main.py - Ultra-optimized FREE RAG service
 """
-from fastapi import FastAPI, HTTPException, Request, Depends
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager, contextmanager
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import asyncio
-import gc
+import concurrent.futures
+import functools
 import logging
+import os
+import threading
 from datetime import datetime
 
 # Import SUPER FAST modules
+import admission
 import doc_parser
-from vector_store import store_embeddings, search_similar_chunks, get_cache_stats, clear_all_cache
-from logic_evaluator import generate_answer_with_citations
-from auth import verify_token
-from utils import generate_document_id, PerformanceTracker, format_error_response
+import metrics
+import startup
+import tracing
+import vector_store
+from profiler import profiler
+from vector_store import (store_embeddings, search_chunks_detailed, search_chunks_batch, get_cache_stats, clear_all_cache,
+                          attach_shared_document, claim_document_for_reingest, release_document_claim,
+                          get_document_chunk_count)
+from shared_index import SHARED_INDEX_ENABLED, get_index_stats
+from logic_evaluator import generate_answer_with_citations, answer_with_fast_path, synthesize_multiple_sources, EXTRACTIVE_FASTPATH
+from query_parser import parse_and_decompose_query, get_query_cache_stats
+from auth import verify_token, verify_admin_token
+from context_packer import get_packing_stats
+from utils import generate_document_id, PerformanceTracker, Deadline, format_error_response
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+tracing.install_log_correlation()  # Prefix log lines with the request ID
+startup.mark_imported(_import_started)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up models in the background so the server accepts connections (and /health) immediately"""
+    if startup.WARMUP_ON_STARTUP:
+        asyncio.get_running_loop().run_in_executor(None, startup.warm_up)
+    else:
+        startup.mark_ready_without_warm_up()
+    yield
 
-app = FastAPI(title="SUPER FAST FREE RAG Service API", version="3.0.0")
+app = FastAPI(title="SUPER FAST FREE RAG Service API", version="3.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -35,9 +65,57 @@ app.add_middleware(
 # Cache for processed documents
 processed_documents = {}
 
+# Per-request time budget (the evaluation SLA is 30 s, keep headroom for transport)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+QUESTION_RESERVE_SECONDS = 6.0  # Budget held back from ingestion for answering questions
+LOW_BUDGET_SECONDS = 8.0        # Below this, retrieve fewer chunks per question
+DECOMPOSITION_MIN_BUDGET = 12.0 # Below this, answer questions directly instead of decomposing
+
+# Optional query decomposition mode
+QUERY_DECOMPOSITION = os.getenv("QUERY_DECOMPOSITION", "false").lower() == "true"
+
+# Pick diverse chunks (maximal marginal relevance) instead of near-duplicate neighbours
+SEARCH_MMR = os.getenv("SEARCH_MMR", "false").lower() == "true"
+
+# Retrieval mode: "dense" (embeddings), "lexical" (BM25, no encoder) or "hybrid" (both, RRF-fused)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "dense").lower()
+
+# Shared executor for question work across all requests
+QUESTION_WORKERS = int(os.getenv("QUESTION_WORKERS", "4"))
+question_executor = concurrent.futures.ThreadPoolExecutor(max_workers=QUESTION_WORKERS, thread_name_prefix="question")
+
+# Background ingestion shared across requests (doc_id -> Future)
+ingestion_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest")
+ingesting_documents = {}
+ingesting_lock = threading.Lock()
+
+# One ingestion or re-ingestion per document at a time in this worker (the shared index
+# claim only keeps other workers out). doc_id -> [lock, holders and waiters]
+document_locks = {}
+
+# Values read at scrape time
+metrics.Gauge("rag_stored_documents", "Documents held in this worker's vector store",
+              lambda: len(vector_store.documents_store))
+metrics.Gauge("rag_stored_chunks", "Chunks held in this worker's vector store",
+              lambda: sum(len(doc["chunks"]) for doc in list(vector_store.documents_store.values())))
+metrics.Gauge("rag_document_store_bytes", "Bytes held by stored documents (interned or memory-mapped vectors, chunk text, postings)",
+              lambda: vector_store.document_store_bytes)
+metrics.Gauge("rag_dedup_bytes_saved", "Vector bytes saved by sharing identical chunks across documents",
+              lambda: vector_store.get_dedup_stats()["bytes_saved"])
+metrics.Gauge("rag_ingestions_in_progress", "Documents currently being ingested by this worker",
+              lambda: len(ingesting_documents))
+metrics.Gauge("rag_admission_in_flight_cost", "Cost units of /hackrx/run requests currently admitted",
+              lambda: admission.controller.in_flight_cost)
+metrics.Gauge("rag_admission_queue_length", "/hackrx/run requests waiting for admission",
+              lambda: admission.controller.queue_length())
+
 class RunRequest(BaseModel):
     documents: List[str]
     questions: List[str]
+    decompose: Optional[bool] = None  # Answer via sub-questions (defaults to QUERY_DECOMPOSITION)
+
+class ReingestRequest(BaseModel):
+    documents: List[str]
 
 @app.get("/")
 async def root():
@@ -57,12 +135,119 @@ async def health_check():
         "storage": "Local Cache"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 until then"""
+    return JSONResponse(status_code=200 if startup.state["ready"] else 503, content=startup.state)
+
+@contextmanager
+def document_guard(doc_id: str):
+    """Serialize ingestion and re-ingestion of one document within this worker"""
+    with ingesting_lock:
+        entry = document_locks.setdefault(doc_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with ingesting_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del document_locks[doc_id]
+
+def ingest_document(doc_url: str, doc_id: str) -> bool:
+    """
+    Download, chunk and embed one document, recording it in the processed cache.
+    Documents another worker already ingested are loaded from the shared index instead.
+    """
+    with tracing.span("ingest_document", doc_id=doc_id, url=doc_url), document_guard(doc_id):
+        return _ingest_document(doc_url, doc_id)
+
+def _ingest_document(doc_url: str, doc_id: str) -> bool:
+    if attach_shared_document(doc_id, doc_url):
+        processed_documents[doc_id] = {
+            "url": doc_url,
+            "chunks": get_document_chunk_count(doc_id),
+            "processed_at": datetime.now().isoformat(),
+            "source": "shared_index"
+        }
+        logger.info(f"📀 Using SHARED document: {doc_id}")
+        return True
+    
+    logger.info(f"🚀 Processing NEW document: {doc_url}")
+    try:
+        chunks, metadata = doc_parser.process_document_url(doc_url)
+        # A failed download or extraction yields a placeholder chunk - never store or publish it
+        error = doc_parser.extraction_error(chunks, metadata)
+        if error:
+            raise ValueError(error)
+    except Exception:
+        release_document_claim(doc_id)
+        raise
+    
+    # Store using SUPER FAST local storage
+    success = store_embeddings(chunks, doc_id, url=doc_url)
+    if success:
+        processed_documents[doc_id] = {
+            "url": doc_url,
+            "chunks": len(chunks),
+            "processed_at": datetime.now().isoformat()
+        }
+        logger.info(f"✅ Cached document {doc_id} with {len(chunks)} chunks")
+    return success
+
+def reingest_document_url(doc_url: str, doc_id: str) -> dict:
+    """
+    Download a new version of a document and replace the stored one, re-embedding only
+    the chunks that changed. Queues behind any ingestion or re-ingestion of the document in
+    this worker, and holds the shared index claim throughout so it cannot race one in
+    another worker. A failed download or extraction leaves the stored version in place.
+    """
+    with tracing.span("reingest_document", doc_id=doc_id, url=doc_url), document_guard(doc_id):
+        if not claim_document_for_reingest(doc_id, doc_url):
+            return {"document_id": doc_id, "url": doc_url, "error": "Another worker is still ingesting this document"}
+        try:
+            chunks, metadata = doc_parser.process_document_url(doc_url)
+            error = doc_parser.extraction_error(chunks, metadata)
+            if error:
+                return {"document_id": doc_id, "url": doc_url, "error": error}
+            report = vector_store.reingest_document(doc_id, chunks, url=doc_url)
+        finally:
+            release_document_claim(doc_id)  # Publishing already ended it; this covers failures
+        
+        processed_documents[doc_id] = {
+            "url": doc_url,
+            "chunks": len(chunks),
+            "processed_at": datetime.now().isoformat(),
+            "reused_chunks": report["reused"]
+        }
+        return {"url": doc_url, **report}
+
+def start_ingestion(doc_url: str, doc_id: str) -> concurrent.futures.Future:
+    """
+    Start (or join) background ingestion of a document. Ingestion outlives the request
+    that started it, so a request that gives up waiting still warms the cache.
+    """
+    with ingesting_lock:
+        future = ingesting_documents.get(doc_id)
+        if future is None:
+            future = ingestion_executor.submit(metrics.queued("ingest", ingest_document), doc_url, doc_id)
+            ingesting_documents[doc_id] = future
+            
+            def _done(_):
+                with ingesting_lock:
+                    ingesting_documents.pop(doc_id, None)
+            future.add_done_callback(_done)
+    return future
+
 @app.post("/hackrx/run")
-async def run_pipeline(request: Request, body: RunRequest):
+async def run_pipeline(request: Request, body: RunRequest, response: Response):
     """
     SUPER FAST FREE RAG pipeline - ultra-optimized for speed
     """
-    with PerformanceTracker("super_fast_pipeline") as tracker:
+    request_id = request.headers.get("X-Request-ID") or tracing.new_request_id()
+    response.headers["X-Request-ID"] = request_id
+    with PerformanceTracker("super_fast_pipeline", request_id=request_id) as tracker:
         try:
             # Verify authentication
             verify_token(request)
@@ -71,57 +256,33 @@ async def run_pipeline(request: Request, body: RunRequest):
             if not body.documents or not body.questions:
                 raise HTTPException(status_code=400, detail="Both documents and questions are required")
             
+            deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+            
             # Track request
             tracker.add_metric("documents_count", len(body.documents))
             tracker.add_metric("questions_count", len(body.questions))
             
-            # Step 1: Process documents (with caching)
-            for doc_url in body.documents:
-                doc_id = generate_document_id(doc_url)
+            # Admission control: requests that must ingest new documents cost more than cached ones
+            new_documents = count_new_documents(body.documents)
+            kind = "ingest" if new_documents else "cached"
+            tracker.add_metric("admission_kind", kind)
+            async with admission.controller.admit(admission.controller.estimate_cost(new_documents), kind):
+                # Optional per-request profile (admin only): samples the threads working for this request
+                profile_session = None
+                if request.headers.get("X-Profile"):
+                    verify_admin_token(request)
+                    profile_session = profiler.start_session(request_id=request_id)
                 
-                if doc_id not in processed_documents:
-                    logger.info(f"🚀 Processing NEW document: {doc_url}")
-                    try:
-                        chunks, metadata = doc_parser.process_document_url(doc_url)
-                        
-                        # Store using SUPER FAST local storage
-                        success = store_embeddings(chunks, doc_id)
-                        if success:
-                            processed_documents[doc_id] = {
-                                "url": doc_url,
-                                "chunks": len(chunks),
-                                "processed_at": datetime.now().isoformat()
-                            }
-                            logger.info(f"✅ Cached document {doc_id} with {len(chunks)} chunks")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing document {doc_url}: {e}")
-                        continue
-                else:
-                    logger.info(f"⚡ Using CACHED document: {doc_id}")
+                try:
+                    result = await execute_pipeline(body, tracker, deadline)
+                finally:
+                    profiler.request_finished()
+                    if profile_session is not None:
+                        profiler.stop_session(profile_session)
             
-            # Process questions in parallel (for speed)
-            import concurrent.futures
-            
-            answers = []
-            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-                future_to_question = {
-                    executor.submit(process_question_super_fast, question, tracker): question 
-                    for question in body.questions
-                }
-                
-                for future in concurrent.futures.as_completed(future_to_question):
-                    question = future_to_question[future]
-                    try:
-                        answer = future.result()
-                        answers.append(answer)
-                    except Exception as e:
-                        logger.error(f"Error processing question '{question}': {e}")
-                        answers.append(f"Error processing question: {str(e)}")
-            
-            # Force garbage collection to free memory
-            gc.collect()
-            return {"answers": answers}
+            if profile_session is not None:
+                result["profile"] = profile_session.summary()
+            return result
             
         except HTTPException:
             raise
@@ -129,27 +290,183 @@ async def run_pipeline(request: Request, body: RunRequest):
             logger.error(f"Unexpected error in SUPER FAST pipeline: {e}")
             return format_error_response(f"Internal server error: {str(e)}")
 
-def process_question_super_fast(question: str, tracker: PerformanceTracker) -> str:
+def count_new_documents(document_urls: List[str]) -> int:
+    """Documents of a request that are neither stored in memory nor already being ingested"""
+    doc_ids = {generate_document_id(doc_url) for doc_url in document_urls}
+    return sum(
+        1 for doc_id in doc_ids
+        if not (doc_id in processed_documents and doc_id in vector_store.documents_store)
+        and doc_id not in ingesting_documents
+    )
+
+async def execute_pipeline(body: RunRequest, tracker: PerformanceTracker, deadline: Deadline) -> dict:
     """
-    Process a single question SUPER FAST - minimal operations
+    Ingest the request's documents and answer its questions within the deadline
     """
-    try:
-        # Direct vector search with fewer chunks
-        similar_chunks = search_similar_chunks(question, top_k=3)  # Reduced from 5 to 3
+    # Step 1: Process documents (with caching), in parallel and within budget
+    pending_ingestions = {}
+    for doc_url in body.documents:
+        doc_id = generate_document_id(doc_url)
         
+        # Documents evicted from memory go through ingestion again (the shared index reloads them)
+        if doc_id in processed_documents and vector_store.touch_document(doc_id):
+            logger.info(f"⚡ Using CACHED document: {doc_id}")
+        else:
+            pending_ingestions[doc_id] = (doc_url, start_ingestion(doc_url, doc_id))
+    
+    if pending_ingestions:
+        futures = [future for _, future in pending_ingestions.values()]
+        ingest_budget = deadline.remaining() - QUESTION_RESERVE_SECONDS
+        not_done = futures
+        if ingest_budget > 0:
+            _, not_done = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: concurrent.futures.wait(futures, timeout=ingest_budget)
+            )
+        if not_done:
+            deadline.degrade("ingestion_incomplete")
+            logger.warning(f"⏱️ {len(not_done)} document(s) still ingesting, answering with what is cached")
+        for doc_url, future in pending_ingestions.values():
+            if future.done() and future.exception() is not None:
+                logger.error(f"Error processing document {doc_url}: {future.exception()}")
+    
+    # Questions only search this request's documents, not everything the worker holds
+    document_ids = {generate_document_id(doc_url) for doc_url in body.documents}
+    
+    # Process questions in parallel (for speed), keeping answers in question order
+    decompose = QUERY_DECOMPOSITION if body.decompose is None else body.decompose
+    if decompose and deadline.remaining() < DECOMPOSITION_MIN_BUDGET:
+        deadline.degrade("skipped_decomposition")
+        decompose = False
+    
+    if decompose:
+        answers = await answer_with_decomposition(body.questions, tracker, deadline, document_ids)
+    else:
+        results = await asyncio.gather(
+            *[run_in_question_pool(process_question_super_fast, question, tracker, deadline, document_ids)
+              for question in body.questions],
+            return_exceptions=True,
+        )
+        answers = []
+        for question, result in zip(body.questions, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing question '{question}': {result}")
+                result = f"Error processing question: {str(result)}"
+            answers.append(result)
+    
+    result = {"answers": answers}
+    if deadline.degradations:
+        result["degradations"] = deadline.degradations
+        tracker.add_metric("degradations", deadline.degradations)
+    return result
+
+async def run_in_question_pool(func, *args):
+    """Run blocking question work on the shared executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(question_executor, metrics.queued("question", func), *args)
+
+def retrieval_top_k(deadline: Optional[Deadline]) -> int:
+    """Number of chunks to retrieve per question, fewer when the request budget is running low"""
+    if deadline is not None and deadline.remaining() < LOW_BUDGET_SECONDS:
+        deadline.degrade("fewer_chunks")
+        return 2
+    return 3
+
+def answer_from_chunks(question: str, similar_chunks: list, tracker: PerformanceTracker, deadline: Optional[Deadline] = None,
+                       raise_errors: bool = False) -> str:
+    """
+    Answer a question from its retrieved chunks. Errors become an apology answer unless
+    raise_errors is set
+    """
+    try:
         if not similar_chunks:
             return "I cannot find relevant information in the provided documents to answer this question."
         
         tracker.add_metric("chunks_used", len(similar_chunks))
         
-        # Direct answer generation
-        answer = generate_answer_with_citations(question, similar_chunks)
-        return answer
+        # Direct answer generation (extractive fast path first, when enabled)
+        with tracing.span("answer", chunks=len(similar_chunks)):
+            if EXTRACTIVE_FASTPATH:
+                return answer_with_fast_path(question, similar_chunks, deadline, raise_errors=raise_errors)
+            return generate_answer_with_citations(question, similar_chunks, deadline, raise_errors=raise_errors)
+        
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"Error answering question '{question}': {e}")
+        return f"I apologize, but I encountered an error: {str(e)}"
+
+def process_question_super_fast(question: str, tracker: PerformanceTracker, deadline: Optional[Deadline] = None,
+                                document_ids: Optional[set] = None) -> str:
+    """
+    Process a single question SUPER FAST - minimal operations. document_ids restricts
+    retrieval to those documents
+    """
+    try:
+        with tracing.span("question", question=question[:120]):
+            # Direct vector search with fewer chunks
+            similar_chunks = search_chunks_detailed(question, top_k=retrieval_top_k(deadline), mmr=SEARCH_MMR, mode=SEARCH_MODE,
+                                                    document_ids=document_ids)
+            return answer_from_chunks(question, similar_chunks, tracker, deadline)
         
     except Exception as e:
         logger.error(f"Error in process_question_super_fast: {e}")
         return f"I apologize, but I encountered an error: {str(e)}"
 
+async def answer_with_decomposition(questions: List[str], tracker: PerformanceTracker, deadline: Deadline,
+                                    document_ids: Optional[set] = None) -> List[str]:
+    """
+    Decomposition mode: split questions into sub-questions, retrieve for all of them in one
+    batched search, answer every sub-question concurrently and synthesize once per question.
+    Latency is bounded by the slowest sub-answer plus synthesis rather than their sum.
+    """
+    sub_question_lists = await asyncio.gather(
+        *[run_in_question_pool(parse_and_decompose_query, question) for question in questions]
+    )
+    flat = [(i, sub_question) for i, sub_questions in enumerate(sub_question_lists) for sub_question in sub_questions]
+    tracker.add_metric("sub_questions", len(flat))
+    
+    hits_per_sub_question = await run_in_question_pool(functools.partial(
+        search_chunks_batch, [sub_question for _, sub_question in flat], retrieval_top_k(deadline),
+        mmr=SEARCH_MMR, mode=SEARCH_MODE, document_ids=document_ids,
+    ))
+    
+    sub_answers = await asyncio.gather(
+        *[run_in_question_pool(answer_from_chunks, sub_question, hits, tracker, deadline)
+          for (_, sub_question), hits in zip(flat, hits_per_sub_question)]
+    )
+    
+    grouped_answers = [[] for _ in questions]
+    for (i, _), sub_answer in zip(flat, sub_answers):
+        grouped_answers[i].append(sub_answer)
+    
+    return list(await asyncio.gather(
+        *[run_in_question_pool(synthesize_multiple_sources, question, grouped_answers[i], deadline)
+          for i, question in enumerate(questions)]
+    ))
+
+@app.post("/reingest")
+async def reingest(request: Request, body: ReingestRequest):
+    """
+    Re-download documents that were republished and update them in place: unchanged
+    chunks keep their vectors, only new or amended chunks are embedded
+    """
+    verify_token(request)
+    loop = asyncio.get_running_loop()
+    # Every document is downloaded and (partly) embedded: admitted like a request ingesting them all
+    async with admission.controller.admit(admission.controller.estimate_cost(len(body.documents)), "ingest"):
+        results = await asyncio.gather(*[
+            loop.run_in_executor(ingestion_executor, metrics.queued("ingest", reingest_document_url), doc_url,
+                                 generate_document_id(doc_url))
+            for doc_url in body.documents
+        ], return_exceptions=True)
+    reports = []
+    for doc_url, result in zip(body.documents, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error re-ingesting document {doc_url}: {result}")
+            result = {"document_id": generate_document_id(doc_url), "url": doc_url, "error": str(result)}
+        reports.append(result)
+    return {"documents": reports}
+
 @app.get("/cache-status")
 async def cache_status():
     """Check cached documents and embeddings"""
@@ -158,9 +475,42 @@ async def cache_status():
         "processed_documents": len(processed_documents),
         "documents": processed_documents,
         "cache_stats": cache_stats,
+        "context_packing": get_packing_stats(),
+        "query_cache": get_query_cache_stats(),
+        "shared_index": get_index_stats() if SHARED_INDEX_ENABLED else None,
         "performance": "Subsequent requests will be lightning fast"
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency histograms, cache hits, LLM calls/tokens, queue waits"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/slow-requests")
+async def slow_requests(request: Request):
+    """Span trees of recent requests slower than SLOW_REQUEST_SECONDS (admin only: they hold questions and document URLs)"""
+    verify_admin_token(request)
+    return {"threshold_seconds": tracing.SLOW_REQUEST_SECONDS, "traces": tracing.get_slow_traces()}
+
+@app.post("/admin/profile")
+async def profile(request: Request, seconds: float = 10.0, requests: Optional[int] = None, format: str = "json"):
+    """
+    Sample every thread (event loop and executors) for the given number of seconds, or
+    until the next `requests` pipeline calls finish (seconds is then the upper bound).
+    format=collapsed returns folded stacks for flamegraph tools; json adds a summary.
+    """
+    verify_admin_token(request)
+    session = profiler.start_session(seconds=seconds, requests=requests)
+    try:
+        while not session.done.is_set():
+            await asyncio.sleep(0.05)
+    finally:
+        profiler.stop_session(session)
+    
+    if format == "collapsed":
+        return PlainTextResponse(session.collapsed())
+    return session.summary()
+
 @app.post("/clear-cache")
 async def clear_cache():
     """Clear all caches for testing"""
@@ -175,6 +525,5 @@ async def clear_cache():
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
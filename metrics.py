@@ -0,0 +1,215 @@
+"""
+Metrics - in-process counters and histograms exported in Prometheus text format
+
+Recording a sample is a dict lookup and a few additions under a lock, cheap enough to
+leave on in production. Scrape GET /metrics.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import tracing
+
+# Latency buckets in seconds: sub-millisecond cache hits up to minute-long cold ingestions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. cache hits or LLM tokens"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Gauge(_Metric):
+    """Point-in-time value, either set directly or read from a function at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception:
+                return []
+        else:
+            with self._lock:
+                value = self._value
+        return [f"{self.name} {value}"]
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds) in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[-1] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+# Pipeline metrics shared by all modules
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage (download, extract, chunk, encode, search, rerank, llm, ...)",
+    ["stage"],
+)
+OPERATION_SECONDS = Histogram(
+    "rag_operation_duration_seconds",
+    "Wall-clock time of operations tracked with PerformanceTracker (e.g. a whole /hackrx/run call)",
+    ["operation"],
+)
+OPERATION_ERRORS = Counter("rag_operation_errors_total", "Operations that ended with an exception", ["operation"])
+QUEUE_WAIT_SECONDS = Histogram(
+    "rag_queue_wait_seconds", "Time work waited in an executor queue before starting", ["queue"],
+)
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+LLM_CALLS = Counter("rag_llm_calls_total", "LLM provider calls by outcome", ["outcome"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Estimated LLM tokens (characters / 4) by direction", ["direction"])
+DEGRADATIONS = Counter("rag_degradations_total", "Work shed to stay within the request deadline", ["degradation"])
+DOWNLOAD_BYTES = Counter("rag_download_bytes_total", "Bytes of documents downloaded")
+DOCUMENT_EVICTIONS = Counter("rag_document_evictions_total", "Documents evicted from memory to stay within the document store budget")
+ADMISSIONS = Counter("rag_admissions_total", "/hackrx/run admission decisions by request kind (cached/ingest)", ["kind", "decision"])
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Time a pipeline stage: with metrics.stage("encode"): ...
+    Inside a traced request the stage is also recorded as a span (with the given attributes).
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span(name, **attributes):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    """Count cache hits and misses for one lookup (or one batch of lookups)"""
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+
+def queued(queue: str, func: Callable) -> Callable:
+    """
+    Wrap a callable about to be submitted to an executor so its queue wait is recorded
+    and it runs in the submitter's trace context
+    """
+    submitted = time.perf_counter()
+    func = tracing.bind(func)
+
+    def run(*args, **kwargs):
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - submitted, queue=queue)
+        return func(*args, **kwargs)
+    return run
+
+def render_metrics() -> str:
+    """All registered metrics in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,157 @@
+"""
+Profiler - on-demand sampling profiler for live hot-path capture
+
+A background thread samples every thread's Python stack (sys._current_frames) at a fixed
+interval while at least one session is active, and aggregates them in collapsed format
+("thread;outer (file);...;inner (file) count") ready for flamegraph.pl / speedscope.
+Sessions run for T seconds, for the next N pipeline requests, or for a single request
+(only threads working for that request ID, via tracing.thread_requests).
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import tracing
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_PROFILE_SECONDS = 120.0
+MAX_STACK_DEPTH = 64
+
+class ProfileSession:
+    """One profiling window and its aggregated stacks"""
+    def __init__(self, seconds: float = None, requests: int = None, request_id: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.request_id = request_id
+        self.remaining_requests = requests
+        self.started = time.monotonic()
+        self.expires_at = self.started + min(seconds or MAX_PROFILE_SECONDS, MAX_PROFILE_SECONDS)
+        self.finished = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def accepts(self, request_id: Optional[str]) -> bool:
+        """Whether a thread working for request_id (None if unbound) is sampled"""
+        return self.request_id is None or request_id == self.request_id
+
+    def finish(self):
+        if not self.done.is_set():
+            self.finished = time.monotonic()
+            self.done.set()
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed (folded) format, most frequent first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 20) -> Dict:
+        """Session statistics with the hottest leaf functions and the collapsed stacks"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        end = self.finished or time.monotonic()
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "duration_seconds": round(end - self.started, 3),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": self.samples,
+            "top_functions": [
+                {"function": name, "samples": count, "share": round(count / self.samples, 4) if self.samples else 0.0}
+                for name, count in leaves.most_common(top)
+            ],
+            "collapsed": self.collapsed(),
+        }
+
+def _thread_label(name: str) -> str:
+    """Group pool threads ("question_3" -> "question") so their stacks aggregate"""
+    return re.sub(r"_\d+$", "", name or "unknown")
+
+def _collapse(frame, thread_name: str) -> str:
+    frames: List[str] = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    frames.append(_thread_label(thread_name))
+    return ";".join(reversed(frames))
+
+class SamplingProfiler:
+    """Samples all threads while any session is active; idle (no thread) otherwise"""
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_session(self, seconds: float = None, requests: int = None, request_id: str = None) -> ProfileSession:
+        session = ProfileSession(seconds, requests, request_id)
+        with self._lock:
+            self.sessions.append(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        logger.info(f"🔬 Profiling session {session.id} started "
+                    f"(seconds={seconds}, requests={requests}, request_id={request_id})")
+        return session
+
+    def stop_session(self, session: ProfileSession) -> ProfileSession:
+        session.finish()
+        with self._lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+        return session
+
+    def request_finished(self):
+        """Count a completed pipeline request against "next N requests" sessions"""
+        with self._lock:
+            sessions = [s for s in self.sessions if s.remaining_requests is not None]
+        for session in sessions:
+            session.remaining_requests -= 1
+            if session.remaining_requests <= 0:
+                self.stop_session(session)
+
+    def active(self) -> List[Dict]:
+        with self._lock:
+            return [{"id": s.id, "request_id": s.request_id, "samples": s.samples,
+                     "remaining_requests": s.remaining_requests} for s in self.sessions]
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for session in [s for s in self.sessions if now >= s.expires_at]:
+                    session.finish()
+                    self.sessions.remove(session)
+                sessions = list(self.sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            self._sample(sessions, own)
+            time.sleep(self.interval)
+
+    def _sample(self, sessions: List[ProfileSession], own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            request_id = tracing.thread_requests.get(ident)
+            stack = None
+            for session in sessions:
+                if session.accepts(request_id):
+                    stack = stack or _collapse(frame, names.get(ident))
+                    session.stacks[stack] += 1
+                    session.samples += 1
+
+# Shared profiler instance
+profiler = SamplingProfiler()
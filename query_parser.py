@@ -1,23 +1,123 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
+import re
+from typing import List
 
-load_dotenv()
+import llm_client
+from utils import tokenize, LRUCache
+from vector_store import get_vocabulary
 
-# Configure Google Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+# The LLM is only an opt-in fallback; rule-based parsing answers by default
+QUERY_LLM_FALLBACK = os.getenv("QUERY_LLM_FALLBACK", "false").lower() == "true"
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
 
-def parse_and_decompose_query(question: str) -> list[str]:
+# Memoized decompositions and rewrites, keyed by normalized question. LLM results are kept
+# as they are; rule-based ones are stored with the vocabulary version they were built from
+query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, name="query")
+
+STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did doing have has had having
+what which who whom whose when where why how whether if then than that this these those
+of in on at to for from by with about as into over under within without between through
+and or but not no nor so also too very can could will would shall should may might must
+i me my we our you your he she it its they them their there here any some such each all
+policy please tell explain describe give list mention provided
+""".split())
+
+# Words that start a new, self-contained question after a conjunction
+QUESTION_STARTERS = r"(?:what|which|who|when|where|why|how|is|are|does|do|can|will|should|must)"
+CONJUNCTION_SPLIT = re.compile(rf",?\s+(?:and|as well as|also)\s+(?={QUESTION_STARTERS}\b)|;\s*", re.IGNORECASE)
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for use as a cache key"""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+def extract_keywords(query: str, max_terms: int = 12) -> List[str]:
+    """
+    Key search terms of a query: stopwords removed, terms known to the corpus preferred
+    and ranked by rarity, original order kept for the survivors
+    """
+    terms = []
+    previous = None
+    for term in tokenize(query):
+        if term in STOPWORDS or (len(term) == 1 and not term.isdigit()):
+            # Single letters only matter as labels of the previous term ("plan a")
+            if len(term) == 1 and terms and terms[-1] == previous:
+                terms[-1] = f"{previous} {term}"
+        elif term not in terms:
+            terms.append(term)
+        previous = term
+
+    vocabulary, _ = get_vocabulary()
+    if vocabulary:
+        frequency = lambda t: min(vocabulary.get(part, 0) for part in t.split())
+        known = [term for term in terms if frequency(term) > 0]
+        if known:
+            terms = known
+        keep = set(sorted(terms, key=frequency)[:max_terms])
+        terms = [term for term in terms if term in keep]
+
+    return terms[:max_terms]
+
+def split_question(question: str) -> List[str]:
+    """
+    Rule-based decomposition: split on question marks and on conjunctions or semicolons that
+    start a new question. Fragments that lost their subject borrow the first part's keywords.
+    """
+    parts = []
+    for sentence in re.split(r"(?<=\?)\s+", question.strip()):
+        parts.extend(p.strip(" ,") for p in CONJUNCTION_SPLIT.split(sentence) if p and p.strip(" ,"))
+
+    parts = [p if p.endswith("?") else f"{p.rstrip('.')}?" for p in parts if len(p.split()) >= 3]
+    if len(parts) <= 1:
+        return [question]
+
+    # "Does it cover maternity, and what are the conditions?" -> give the second part its topic
+    topic = extract_keywords(parts[0], max_terms=4)
+    resolved = [parts[0]]
+    for part in parts[1:]:
+        if len(extract_keywords(part)) < 2 and topic:
+            part = f"{part.rstrip('?')} ({' '.join(topic)})?"
+        resolved.append(part)
+    return resolved
+
+def cached_rule_result(kind: str, question: str, compute):
+    """
+    A rule-based result for a question, from the cache unless the corpus vocabulary (which
+    keyword extraction ranks terms by) changed since it was computed
+    """
+    _, vocabulary_version = get_vocabulary()
+    cache_key = (kind, normalize_question(question))
+    cached = query_cache.get(cache_key)
+    if cached is not None and cached[0] == vocabulary_version:
+        return cached[1]
+    result = compute()
+    query_cache.put(cache_key, (vocabulary_version, result))
+    return result
+
+def parse_and_decompose_query(question: str, use_llm: bool = None) -> list[str]:
+    """
+    Step 2: Query Parser
+    Break complex queries into sub-questions using local rules, optionally falling back to the LLM
+    """
+    use_llm = QUERY_LLM_FALLBACK if use_llm is None else use_llm
+    # Whether the LLM is asked depends only on the question, so its answer is cached by question alone
+    llm_key = ("decompose_llm", normalize_question(question))
+    if use_llm and len(question.split()) > 10:
+        cached = query_cache.get(llm_key)
+        if cached is not None:
+            return list(cached)
+
+    sub_questions = list(cached_rule_result("decompose", question, lambda: tuple(split_question(question))))
+    if len(sub_questions) == 1 and use_llm and len(question.split()) > 10:
+        sub_questions = decompose_query_with_llm(question)
+        query_cache.put(llm_key, tuple(sub_questions))
+    return sub_questions
+
+def decompose_query_with_llm(question: str) -> list[str]:
     """
-    Step 2: LLM Parser
     Uses LLM to analyze complex queries and potentially break them down into sub-questions
     """
     try:
-        # For simple questions, return as-is
-        if len(question.split()) <= 10:
-            return [question]
-        
         # For complex questions, decompose using LLM
         decomposition_prompt = f"""
 Analyze the following question and break it down into simpler, focused sub-questions if needed.
@@ -30,30 +130,45 @@ If the question is already simple enough, just return the original question.
 
 Sub-questions:
 """
-        
-        response = gemini_model.generate_content(
+
+        response_text = llm_client.generate(
             decomposition_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=300,
-                temperature=0.1,
-            )
+            max_output_tokens=300,
+            temperature=0.1,
         )
-        
-        sub_questions = response.text.strip().split('\n')
+
+        sub_questions = response_text.strip().split('\n')
         # Clean up the sub-questions
         sub_questions = [q.strip().lstrip('- ').lstrip('1234567890. ') for q in sub_questions if q.strip()]
-        
+
         return sub_questions if len(sub_questions) > 1 else [question]
-        
+
     except Exception as e:
         print(f"Error in query decomposition: {e}")
         # Fallback to original question
         return [question]
 
-def optimize_query_for_search(query: str) -> str:
+def optimize_query_for_search(query: str, use_llm: bool = None) -> str:
     """
     Optimize a query for better embedding search by extracting key terms
     """
+    use_llm = QUERY_LLM_FALLBACK if use_llm is None else use_llm
+    if use_llm:
+        llm_key = ("rewrite_llm", normalize_question(query))
+        optimized = query_cache.get(llm_key)
+        if optimized is None:
+            optimized = optimize_query_with_llm(query)
+            if optimized:  # Failures fall back to rules and are retried next time
+                query_cache.put(llm_key, optimized)
+        if optimized:
+            return optimized
+
+    return cached_rule_result("rewrite", query, lambda: " ".join(extract_keywords(query)) or query)
+
+def optimize_query_with_llm(query: str) -> str:
+    """
+    Rewrite a query for search with the LLM, returning None on failure
+    """
     try:
         optimization_prompt = f"""
 Extract the key search terms and concepts from this question to make it better for semantic search.
@@ -63,18 +178,19 @@ Original question: "{query}"
 
 Optimized search query:
 """
-        
-        response = gemini_model.generate_content(
+
+        response_text = llm_client.generate(
             optimization_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=100,
-                temperature=0.1,
-            )
+            max_output_tokens=100,
+            temperature=0.1,
         )
-        
-        optimized = response.text.strip()
-        return optimized if optimized else query
-        
+
+        return response_text.strip() or None
+
     except Exception as e:
         print(f"Error in query optimization: {e}")
-        return query
+        return None
+
+def get_query_cache_stats() -> dict:
+    """Get query preprocessing cache statistics"""
+    return query_cache.stats()
@@ -0,0 +1,319 @@
+"""
+Shared Index - on-disk document store shared by all uvicorn/gunicorn workers
+
+Vectors are stored once per distinct chunk text (keyed by content hash) in append-only
+.npy segment files that workers memory-map; a document is its chunk texts plus, for each
+chunk, the (segment, row) of its vector. A SQLite manifest records which documents are ready and which worker is ingesting what,
+so exactly one worker downloads and embeds a document while the others wait and attach.
+Each publish writes a new version of a document's files, so re-publishing (re-ingestion)
+never leaves a reader with chunks from one version and vectors from another.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import get_text_hash
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SHARED_INDEX_ENABLED = os.getenv("SHARED_INDEX", "true").lower() == "true"
+SHARED_INDEX_DIR = os.getenv("SHARED_INDEX_DIR", "index_data")
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "120"))  # Claims expire if a worker dies
+POLL_INTERVAL = 0.2
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def _paths(index_dir: str, doc_id: str, version: str = None) -> Tuple[str, str, str]:
+    """A document version's vector matrix (older indexes only), chunk texts and vector locations"""
+    name = f"{doc_id}.{version}" if version else doc_id  # Unversioned files from older indexes
+    return (os.path.join(index_dir, "vectors", f"{name}.npy"),
+            os.path.join(index_dir, "chunks", f"{name}.json"),
+            os.path.join(index_dir, "rows", f"{name}.npy"))
+
+def _segment_path(index_dir: str, segment: int) -> str:
+    return os.path.join(index_dir, "vectors", f"segment-{segment}.npy")
+
+@contextmanager
+def _connect(index_dir: str = None):
+    """Open the manifest database (created on first use)"""
+    index_dir = index_dir or SHARED_INDEX_DIR
+    os.makedirs(os.path.join(index_dir, "vectors"), exist_ok=True)
+    os.makedirs(os.path.join(index_dir, "chunks"), exist_ok=True)
+    os.makedirs(os.path.join(index_dir, "rows"), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(index_dir, "manifest.sqlite"), timeout=30, isolation_level=None)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL,
+                url TEXT,
+                chunks INTEGER,
+                dimensions INTEGER,
+                ready_seq INTEGER,
+                updated_at REAL,
+                version TEXT
+            )
+        """)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(documents)")}
+        if "version" not in columns:  # Manifest created before documents were versioned
+            connection.execute("ALTER TABLE documents ADD COLUMN version TEXT")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                segment INTEGER PRIMARY KEY AUTOINCREMENT,
+                rows INTEGER,
+                created_at REAL
+            )
+        """)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                hash TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                row INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        yield connection
+    finally:
+        connection.close()
+
+def claim_document(doc_id: str, url: str = None, index_dir: str = None, reingest: bool = False) -> str:
+    """
+    Try to become the ingesting worker for a document. Returns "ready" if it is already
+    in the index, "busy" if another worker holds a live claim, or "claimed" if this worker
+    should ingest it (and then publish_document or release_claim).
+
+    With reingest=True a ready document is claimed too: it stays ready, so other workers
+    keep serving the current version, but no other worker can re-ingest it until this one
+    publishes the new version or releases the claim.
+    """
+    now = time.time()
+    with _connect(index_dir) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT status, owner, lease_until FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if row and row[0] == "ready" and not reingest:
+                state = "ready"
+            elif row and row[2] is not None and row[2] > now:
+                state = "busy"  # Live claim, including one this worker already holds
+            elif row and row[0] == "ready":
+                connection.execute(
+                    "UPDATE documents SET owner = ?, lease_until = ?, updated_at = ? WHERE doc_id = ?",
+                    (WORKER_ID, now + INGEST_LEASE_SECONDS, now, doc_id),
+                )
+                state = "claimed"
+            else:
+                connection.execute(
+                    """INSERT INTO documents (doc_id, status, owner, lease_until, url, updated_at)
+                       VALUES (?, 'ingesting', ?, ?, ?, ?)
+                       ON CONFLICT(doc_id) DO UPDATE SET status = 'ingesting', owner = excluded.owner,
+                           lease_until = excluded.lease_until, url = COALESCE(excluded.url, url),
+                           updated_at = excluded.updated_at""",
+                    (doc_id, WORKER_ID, now + INGEST_LEASE_SECONDS, url, now),
+                )
+                state = "claimed"
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    return state
+
+def release_claim(doc_id: str, index_dir: str = None):
+    """Give up an ingestion claim (e.g. after a failure) so another worker can retry"""
+    with _connect(index_dir) as connection:
+        connection.execute(
+            "DELETE FROM documents WHERE doc_id = ? AND status = 'ingesting' AND owner = ?", (doc_id, WORKER_ID)
+        )
+        # A re-ingestion claim on a ready document: keep the document, drop the lease
+        connection.execute(
+            "UPDATE documents SET lease_until = NULL WHERE doc_id = ? AND status = 'ready' AND owner = ?", (doc_id, WORKER_ID)
+        )
+
+def _atomic_write(path: str, write):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        write(f)
+    os.replace(temporary, path)
+
+def _locate_vectors(connection, hashes: List[str]) -> Dict[str, Tuple[int, int]]:
+    """(segment, row) of the stored vector of each of the given text hashes the index holds"""
+    unique = list(dict.fromkeys(hashes))
+    found = {}
+    for i in range(0, len(unique), 500):  # Stay under SQLite's bound parameter limit
+        batch = unique[i:i + 500]
+        found.update((text_hash, (segment, row)) for text_hash, segment, row in connection.execute(
+            f"SELECT hash, segment, row FROM vectors WHERE hash IN ({','.join('?' * len(batch))})", batch
+        ))
+    return found
+
+def publish_document(doc_id: str, chunks: List[str], embeddings: np.ndarray, url: str = None, index_dir: str = None,
+                     hashes: List[str] = None) -> int:
+    """
+    Write a new version of a document, then point the manifest at it and mark it ready.
+    Only vectors of chunk texts the index has never stored are written (as a new segment);
+    the document's rows reference the stored ones. Files are written before the manifest
+    row flips, so readers never see a ready document with partial files. Returns the
+    document's ready sequence number.
+    """
+    index_dir = index_dir or SHARED_INDEX_DIR
+    with _connect(index_dir):
+        pass  # Make sure the directories exist
+    version = uuid.uuid4().hex[:12]
+    _, chunks_path, rows_path = _paths(index_dir, doc_id, version)
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    hashes = hashes if hashes is not None else [get_text_hash(chunk) for chunk in chunks]
+    _atomic_write(chunks_path, lambda f: f.write(json.dumps(chunks).encode("utf-8")))
+
+    with _connect(index_dir) as connection:
+        # Held while new vectors are written, so two workers never store the same text twice
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            locations = _locate_vectors(connection, hashes)
+            new = {}  # Text hash -> first chunk holding it, for texts the index has not stored
+            for i, text_hash in enumerate(hashes):
+                if text_hash not in locations:
+                    new.setdefault(text_hash, i)
+            if new:
+                segment = connection.execute(
+                    "INSERT INTO segments (rows, created_at) VALUES (?, ?)", (len(new), time.time())
+                ).lastrowid
+                segment_vectors = matrix[list(new.values())]
+                _atomic_write(_segment_path(index_dir, segment), lambda f: np.save(f, segment_vectors))
+                connection.executemany(
+                    "INSERT INTO vectors (hash, segment, row) VALUES (?, ?, ?)",
+                    [(text_hash, segment, row) for row, text_hash in enumerate(new)],
+                )
+                locations.update((text_hash, (segment, row)) for row, text_hash in enumerate(new))
+            rows = np.array([locations[text_hash] for text_hash in hashes], dtype=np.int64).reshape(len(hashes), 2)
+            _atomic_write(rows_path, lambda f: np.save(f, rows))
+
+            previous = connection.execute("SELECT status, version FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            (sequence,) = connection.execute("SELECT COALESCE(MAX(ready_seq), 0) + 1 FROM documents").fetchone()
+            connection.execute(
+                """INSERT INTO documents (doc_id, status, owner, url, chunks, dimensions, ready_seq, updated_at, version)
+                   VALUES (?, 'ready', ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(doc_id) DO UPDATE SET status = 'ready', owner = excluded.owner,
+                       lease_until = NULL, url = COALESCE(excluded.url, url), chunks = excluded.chunks,
+                       dimensions = excluded.dimensions, ready_seq = excluded.ready_seq,
+                       updated_at = excluded.updated_at, version = excluded.version""",
+                (doc_id, WORKER_ID, url, len(chunks), matrix.shape[1] if matrix.ndim == 2 else 0, sequence, time.time(), version),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    # The replaced version's files: workers that loaded them keep what they read until they reload.
+    # Segments are never removed, other documents may reference their rows
+    if previous and previous[0] == "ready":
+        for path in _paths(index_dir, doc_id, previous[1]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    logger.info(f"📀 Published document {doc_id} ({len(chunks)} chunks, {len(new)} new vectors) to shared index")
+    return sequence
+
+def load_document(doc_id: str, index_dir: str = None) -> Optional[Tuple[List[str], List[str], np.ndarray, int]]:
+    """
+    Load the current version of a ready document: chunk texts, the vector files they
+    reference, each chunk's (file index, row) within those files and the version's ready
+    sequence number. None if it is not ready.
+    """
+    index_dir = index_dir or SHARED_INDEX_DIR
+    for _ in range(3):
+        with _connect(index_dir) as connection:
+            row = connection.execute(
+                "SELECT version, ready_seq FROM documents WHERE doc_id = ? AND status = 'ready'", (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        vectors_path, chunks_path, rows_path = _paths(index_dir, doc_id, row[0])
+        try:
+            with open(chunks_path, "rb") as f:
+                chunks = json.loads(f.read().decode("utf-8"))
+            if os.path.exists(rows_path):
+                rows = np.load(rows_path)
+                segments, rows[:, 0] = np.unique(rows[:, 0], return_inverse=True)
+                paths = [_segment_path(index_dir, int(segment)) for segment in segments]
+            else:  # Published before vectors were stored by content hash: one matrix per document
+                if not os.path.exists(vectors_path):
+                    raise FileNotFoundError(vectors_path)
+                paths = [vectors_path]
+                rows = np.column_stack([np.zeros(len(chunks), dtype=np.int64), np.arange(len(chunks), dtype=np.int64)])
+            return chunks, paths, rows, row[1]
+        except FileNotFoundError:
+            continue  # Replaced by a newer version between reading the manifest and the files
+    return None
+
+def read_vectors(paths: List[str], rows: np.ndarray) -> np.ndarray:
+    """Copy the vectors at (file index, row) locations, as returned by load_document, into one matrix"""
+    vectors = None
+    for index, path in enumerate(paths):
+        matrix = np.load(path, mmap_mode="r")
+        if vectors is None:
+            vectors = np.empty((len(rows), matrix.shape[1]), dtype=np.float32)
+        selected = np.flatnonzero(rows[:, 0] == index)
+        vectors[selected] = matrix[rows[selected, 1]]
+    return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+
+def lookup_vectors(hashes: List[str], index_dir: str = None) -> Dict[str, np.ndarray]:
+    """Stored vectors of any of the given text hashes, so they need not be embedded again"""
+    index_dir = index_dir or SHARED_INDEX_DIR
+    with _connect(index_dir) as connection:
+        locations = _locate_vectors(connection, hashes)
+    if not locations:
+        return {}
+    segments, files = np.unique([segment for segment, _ in locations.values()], return_inverse=True)
+    rows = np.column_stack([files, [row for _, row in locations.values()]]).astype(np.int64)
+    vectors = read_vectors([_segment_path(index_dir, int(segment)) for segment in segments], rows)
+    return dict(zip(locations, vectors))
+
+def document_status(doc_id: str, index_dir: str = None) -> Optional[str]:
+    """Manifest status of a document, or None if unknown"""
+    with _connect(index_dir) as connection:
+        row = connection.execute("SELECT status FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+    return row[0] if row else None
+
+def wait_until_ready(doc_id: str, timeout: float, index_dir: str = None) -> bool:
+    """Wait for another worker to finish ingesting a document"""
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        status = document_status(doc_id, index_dir)
+        if status == "ready":
+            return True
+        if status != "ingesting":
+            return False  # The other worker gave up
+        time.sleep(POLL_INTERVAL)
+    return False
+
+def ready_documents_since(sequence: int, index_dir: str = None) -> List[Dict]:
+    """Documents that became ready after the given sequence number, oldest first"""
+    with _connect(index_dir) as connection:
+        rows = connection.execute(
+            "SELECT doc_id, ready_seq, url, chunks FROM documents WHERE status = 'ready' AND ready_seq > ? ORDER BY ready_seq",
+            (sequence,),
+        ).fetchall()
+    return [{"doc_id": r[0], "ready_seq": r[1], "url": r[2], "chunks": r[3]} for r in rows]
+
+def get_index_stats(index_dir: str = None) -> Dict:
+    """Get manifest statistics"""
+    with _connect(index_dir) as connection:
+        counts = dict(connection.execute("SELECT status, COUNT(*) FROM documents GROUP BY status").fetchall())
+        (vectors,) = connection.execute("SELECT COUNT(*) FROM vectors").fetchone()
+        (segments,) = connection.execute("SELECT COUNT(*) FROM segments").fetchone()
+    return {"directory": index_dir or SHARED_INDEX_DIR, "worker": WORKER_ID, "documents": counts,
+            "unique_vectors": vectors, "segments": segments}
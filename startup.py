@@ -0,0 +1,73 @@
+"""
+Startup - background warm-up and readiness state
+
+Heavy dependencies (torch/sentence-transformers, NLTK data, the cross-encoder) are loaded
+here, off the import path, and exercised once with a dummy call so the first real request
+doesn't pay for them. /ready reports when this has finished; /health only says the process is up.
+"""
+import os
+import time
+import logging
+from typing import Any, Dict
+
+import vector_store
+import doc_parser
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# Replaced by mark_imported() with the time main.py started importing
+process_started = time.perf_counter()
+
+state: Dict[str, Any] = {
+    "ready": False,
+    "error": None,
+    "import_seconds": None,
+    "time_to_ready_seconds": None,
+    "steps": {},
+}
+
+def mark_imported(started: float):
+    """Record how long importing the app took (started = perf_counter() before its imports)"""
+    global process_started
+    process_started = started
+    state["import_seconds"] = round(time.perf_counter() - started, 3)
+
+def _step(name: str, func):
+    start = time.perf_counter()
+    result = func()
+    state["steps"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+def warm_up():
+    """
+    Load and exercise the embedding model, tokenizer data and (when configured) the
+    local reranker, then load documents already in the shared index. Blocking - run it
+    off the event loop.
+    """
+    try:
+        model = _step("load_model", vector_store.get_model)
+        _step("warm_encode", lambda: model.encode(["warm up"], batch_size=1, show_progress_bar=False))
+        _step("sentence_tokenizer", doc_parser.ensure_sentence_tokenizer)
+
+        import clause_matcher
+        if clause_matcher.RERANKER == "local":
+            encoder = _step("load_reranker", clause_matcher.get_cross_encoder)
+            _step("warm_rerank", lambda: encoder.predict([("warm up", "warm up")], show_progress_bar=False))
+
+        state["steps"]["shared_index_documents"] = vector_store.sync_shared_index(force=True)
+        state["ready"] = True
+        logger.info(f"✅ Service ready: {state['steps']}")
+    except Exception as e:
+        state["error"] = str(e)
+        logger.error(f"Warm-up failed: {e}")
+    finally:
+        state["time_to_ready_seconds"] = round(time.perf_counter() - process_started, 3)
+
+def mark_ready_without_warm_up():
+    """Readiness when warm-up is disabled (models then load on first use)"""
+    state["ready"] = True
+    state["time_to_ready_seconds"] = round(time.perf_counter() - process_started, 3)
@@ -0,0 +1,186 @@
+"""
+Tracing - per-request span trees with request IDs, propagated into worker threads
+
+A trace is opened per request (PerformanceTracker does this); every metrics.stage() and
+tracing.span() inside it becomes a child span. Work handed to executors keeps its place in
+the tree when submitted through bind(). Only traces slower than SLOW_REQUEST_SECONDS are
+dumped (as JSON) - everything else is dropped when the request finishes.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "15"))
+SLOW_TRACE_DIR = os.getenv("SLOW_TRACE_DIR", "")  # Also write slow traces here as <request_id>.json
+SLOW_TRACES_KEPT = 20
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+current_span_var: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+slow_traces = deque(maxlen=SLOW_TRACES_KEPT)  # Most recent slow traces, newest last
+thread_requests: Dict[int, str] = {}          # Thread ident -> request ID of the bound work it is running
+
+class Span:
+    """One timed operation in a trace"""
+    __slots__ = ("name", "attributes", "start", "end", "thread", "children", "error")
+
+    def __init__(self, name: str, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.children: List["Span"] = []
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin: float = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        span = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": self.thread,
+        }
+        if self.attributes:
+            span["attributes"] = self.attributes
+        if self.error:
+            span["error"] = self.error
+        if self.end is None:
+            span["unfinished"] = True
+        if self.children:
+            span["children"] = [child.to_dict(origin) for child in list(self.children)]
+        return span
+
+def new_request_id() -> str:
+    """Short random request ID"""
+    return uuid.uuid4().hex[:16]
+
+def get_request_id() -> str:
+    """Request ID of the current context ("-" outside a request)"""
+    return request_id_var.get()
+
+def current_span() -> Optional[Span]:
+    """Innermost open span of the current context, if a trace is active"""
+    return current_span_var.get()
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current span. A no-op when no trace is active."""
+    parent = current_span_var.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attributes)
+    parent.children.append(child)
+    token = current_span_var.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.end = time.perf_counter()
+        current_span_var.reset(token)
+
+@contextmanager
+def trace(name: str, request_id: str = None, **attributes):
+    """
+    Start a trace (or, inside an active trace, a child span). When the trace finishes
+    slower than SLOW_REQUEST_SECONDS its full span tree is dumped.
+    """
+    if current_span_var.get() is not None:
+        with span(name, **attributes) as child:
+            yield child
+        return
+
+    if request_id is None:
+        request_id = request_id_var.get() if request_id_var.get() != "-" else new_request_id()
+    request_token = request_id_var.set(request_id)
+    root = Span(name, attributes)
+    token = current_span_var.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = repr(e)
+        raise
+    finally:
+        root.end = time.perf_counter()
+        current_span_var.reset(token)
+        if root.duration >= SLOW_REQUEST_SECONDS:
+            record_slow_trace(root, request_id)
+        request_id_var.reset(request_token)
+
+def record_slow_trace(root: Span, request_id: str):
+    """Log (and optionally write) the span tree of a slow request"""
+    entry = {
+        "request_id": request_id,
+        "recorded_at": time.time(),
+        "duration_ms": round(root.duration * 1000, 3),
+        "trace": root.to_dict(),
+    }
+    slow_traces.append(entry)
+    dump = json.dumps(entry, default=str)
+    logger.warning(f"🐢 Slow request {request_id} took {root.duration:.2f}s: {dump}")
+    if SLOW_TRACE_DIR:
+        try:
+            os.makedirs(SLOW_TRACE_DIR, exist_ok=True)
+            with open(os.path.join(SLOW_TRACE_DIR, f"{request_id}.json"), "w") as f:
+                f.write(dump)
+        except OSError as e:
+            logger.error(f"Error writing slow trace {request_id}: {e}")
+
+def get_slow_traces() -> List[Dict[str, Any]]:
+    """Recently recorded slow traces, newest first"""
+    return list(reversed(slow_traces))
+
+def bind(func: Callable) -> Callable:
+    """
+    Capture the current context (request ID and open span) so func keeps its place in
+    the trace when it later runs on another thread. While it runs, the thread is listed
+    in thread_requests under the request ID (used by the profiler to attribute samples).
+    """
+    context = contextvars.copy_context()
+    request_id = request_id_var.get()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        ident = threading.get_ident()
+        previous = thread_requests.get(ident)
+        thread_requests[ident] = request_id
+        try:
+            return context.run(func, *args, **kwargs)
+        finally:
+            if previous is None:
+                thread_requests.pop(ident, None)
+            else:
+                thread_requests[ident] = previous
+    return run
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request ID to log records as %(request_id)s"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+def install_log_correlation(fmt: str = "%(levelname)s:%(name)s:[%(request_id)s] %(message)s"):
+    """Prefix every log line from the root handlers with the request ID"""
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+            handler.setFormatter(logging.Formatter(fmt))
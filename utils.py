@@ -1,7 +1,14 @@
+import re
 import time
 import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any
 import logging
+import functools
+
+import metrics
+import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,13 +20,21 @@ def generate_document_id(url: str) -> str:
     """
     return hashlib.md5(url.encode()).hexdigest()
 
+def get_text_hash(text: str) -> str:
+    """
+    Generate hash for text to use as cache key
+    """
+    return hashlib.md5(text.encode()).hexdigest()
+
 def measure_execution_time(func):
     """
-    Decorator to measure function execution time
+    Decorator to measure function execution time (recorded as a span in traced requests)
     """
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
-        result = func(*args, **kwargs)
+        with tracing.span(func.__name__):
+            result = func(*args, **kwargs)
         end_time = time.time()
         execution_time = end_time - start_time
         logger.info(f"{func.__name__} executed in {execution_time:.2f} seconds")
@@ -87,6 +102,12 @@ def sanitize_text(text: str) -> str:
     
     return text.strip()
 
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens used for lexical matching (keeps alphanumerics such as 'plan', 'a', 'ncd', '30')
+    """
+    return re.findall(r"[a-z0-9]+", text.lower())
+
 def format_error_response(error_message: str) -> Dict[str, List[str]]:
     """
     Format error message as a proper API response
@@ -103,25 +124,109 @@ def log_performance_metrics(metrics: Dict[str, Any]):
 
 class PerformanceTracker:
     """
-    Context manager for tracking performance metrics
+    Context manager for tracking performance metrics. Also opens a trace (or a child span
+    inside one), so everything the operation does is recorded as a span tree.
     """
-    def __init__(self, operation_name: str):
+    def __init__(self, operation_name: str, request_id: str = None):
         self.operation_name = operation_name
+        self.request_id = request_id
         self.start_time = None
         self.metrics = {}
+        self._trace = None
+        self._span = None
     
     def __enter__(self):
         self.start_time = time.time()
+        self._trace = tracing.trace(self.operation_name, request_id=self.request_id)
+        self._span = self._trace.__enter__()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         end_time = time.time()
         self.metrics['execution_time'] = end_time - self.start_time
         self.metrics['operation'] = self.operation_name
+        metrics.OPERATION_SECONDS.observe(self.metrics['execution_time'], operation=self.operation_name)
         if exc_type:
             self.metrics['error'] = str(exc_val)
+            metrics.OPERATION_ERRORS.inc(operation=self.operation_name)
         log_performance_metrics(self.metrics)
+        self._trace.__exit__(exc_type, exc_val, exc_tb)
     
     def add_metric(self, key: str, value: Any):
-        """Add a custom metric"""
+        """Add a custom metric (also attached to the operation's span)"""
         self.metrics[key] = value
+        if self._span is not None:
+            self._span.attributes[key] = value
+
+class Deadline:
+    """
+    Per-request time budget carried through the pipeline, recording any work that was shed
+    """
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+        self.degradations: List[str] = []
+        self._lock = threading.Lock()
+    
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def expired(self) -> bool:
+        """Whether the budget is used up"""
+        return self.remaining() <= 0
+    
+    def degrade(self, name: str):
+        """Record a degradation that was applied to stay within budget"""
+        with self._lock:
+            if name not in self.degradations:
+                self.degradations.append(name)
+                metrics.DEGRADATIONS.inc(degradation=name)
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with hit/miss counters (exported as metrics when named)
+    """
+    def __init__(self, maxsize: int = 1024, name: str = None):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default: Any = None) -> Any:
+        with self._lock:
+            hit = key in self._data
+            if hit:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = self._data[key]
+            else:
+                self.misses += 1
+                value = default
+        if self.name:
+            metrics.record_cache(self.name, hits=int(hit), misses=int(not hit))
+        return value
+    
+    def put(self, key, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def values(self) -> List[Any]:
+        with self._lock:
+            return list(self._data.values())
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
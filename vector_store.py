@@ -4,41 +4,378 @@ SUPER FAST Vector Store - Local storage with FREE embeddings
 import os
 import time
 import logging
-import hashlib
 import pickle
 import json
+import threading
+from collections import Counter
+from types import MappingProxyType
 from typing import List, Tuple, Dict
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+import metrics
+import tracing
+import shared_index
+from chunk_store import ChunkText
+from doc_parser import extraction_error
+from lexical_index import DocumentPostings, bm25_scores, reciprocal_rank_fusion
+from utils import tokenize, get_text_hash, LRUCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global caches
+class ChunkTable:
+    """
+    Interned chunk vectors: one row per distinct chunk text (keyed by content hash), shared
+    by every (doc_id, position) holding that text, with a reference count per row. Holds
+    the vectors of documents embedded by this worker when they are not in the shared index.
+    Rows are only appended past the ones published snapshots can see, and compaction
+    copies the live rows into a new buffer, so a snapshot's data[:count] view never
+    changes under a search. Mutated by writers only, holding _store_lock.
+    """
+    DTYPE = np.float32
+    KEY = "rows"  # Document field holding its chunks' rows in this table
+    
+    def __init__(self):
+        self.data = np.empty((0, 0), dtype=self.DTYPE)  # (capacity, width), rows [:count] written
+        self.count = 0
+        self.row_of = {}        # Text hash -> row
+        self.hashes = []        # Row -> text hash
+        self.refcounts = np.zeros(0, dtype=np.int64)
+        self.live = 0           # Rows referenced by at least one stored chunk
+    
+    @property
+    def row_bytes(self) -> int:
+        """Bytes of one chunk vector"""
+        return self.data.shape[1] * self.data.itemsize
+    
+    def view(self) -> np.ndarray:
+        """The rows written so far, as seen by the next snapshot"""
+        return self.data[:self.count]
+    
+    def vector(self, row: int) -> np.ndarray:
+        return self.data[row].copy()
+    
+    def lookup(self, hashes) -> Dict[str, np.ndarray]:
+        """Copies of the vectors already interned for any of the given text hashes"""
+        found = {}
+        for text_hash in hashes:
+            row = self.row_of.get(text_hash)
+            if row is not None:
+                found[text_hash] = self.vector(row)
+        return found
+    
+    def intern(self, hashes: List[str], values: np.ndarray) -> np.ndarray:
+        """
+        Rows of a document's chunks (values holds one row of data per chunk), appending the
+        texts not interned yet. References each row once per chunk
+        """
+        rows = np.empty(len(hashes), dtype=np.int64)
+        new = {}  # Text hash -> row, for texts interned by this call
+        for i, text_hash in enumerate(hashes):
+            row = self.row_of.get(text_hash, new.get(text_hash))
+            if row is None:
+                row = new[text_hash] = self.count + len(new)
+            rows[i] = row
+        if new:
+            self._reserve(self.count + len(new), values.shape[1])
+            first = {}
+            for i, text_hash in enumerate(hashes):
+                first.setdefault(text_hash, i)
+            self.data[self.count:self.count + len(new)] = values[[first[text_hash] for text_hash in new]]
+            self.hashes.extend(new)
+            self.row_of.update(new)
+            self.count += len(new)
+        unique = np.unique(rows)
+        self.live += int(np.count_nonzero(self.refcounts[unique] == 0))
+        np.add.at(self.refcounts, rows, 1)
+        return rows
+    
+    def release(self, rows: np.ndarray):
+        """Drop a document's references. Unreferenced rows stay (and can be revived) until compaction"""
+        np.subtract.at(self.refcounts, rows, 1)
+        self.live -= int(np.count_nonzero(self.refcounts[np.unique(rows)] == 0))
+    
+    def _reserve(self, rows: int, width: int):
+        """Grow the buffer (into a new array, leaving published views alone) to hold rows"""
+        if self.count and width != self.data.shape[1]:
+            raise ValueError(f"Embedding dimensions changed from {self.data.shape[1]} to {width}")
+        if rows <= len(self.data) and self.data.shape[1] == width:
+            return
+        capacity = max(rows, 2 * len(self.data), 1024)
+        data = np.empty((capacity, width), dtype=self.DTYPE)
+        refcounts = np.zeros(capacity, dtype=np.int64)
+        if self.count:
+            data[:self.count] = self.data[:self.count]
+            refcounts[:self.count] = self.refcounts[:self.count]
+        self.data, self.refcounts = data, refcounts
+    
+    def needs_compaction(self) -> bool:
+        dead = self.count - self.live
+        return dead >= CHUNK_TABLE_COMPACT_ROWS and dead > self.live
+    
+    def compact(self, documents: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Keep only referenced rows, in a new buffer. Returns the documents with their rows renumbered"""
+        keep = np.flatnonzero(self.refcounts[:self.count] > 0)
+        renumber = np.full(self.count, -1, dtype=np.int64)
+        renumber[keep] = np.arange(len(keep))
+        capacity = max(len(keep), 1024)
+        data = np.empty((capacity, self.data.shape[1]), dtype=self.DTYPE)
+        data[:len(keep)] = self.data[keep]
+        refcounts = np.zeros(capacity, dtype=np.int64)
+        refcounts[:len(keep)] = self.refcounts[keep]
+        logger.info(f"🧹 Compacted {type(self).__name__} from {self.count} to {len(keep)} rows")
+        self.data, self.refcounts, self.count, self.live = data, refcounts, len(keep), len(keep)
+        self.hashes = [self.hashes[row] for row in keep]
+        self.row_of = {text_hash: row for row, text_hash in enumerate(self.hashes)}
+        return {doc_id: dict(doc_data, **{self.KEY: renumber[doc_data[self.KEY]]}) if self.KEY in doc_data else doc_data
+                for doc_id, doc_data in documents.items()}
+
+class MappedChunkTable(ChunkTable):
+    """
+    Interned chunk vectors that live in the shared index's memory-mapped files. A row holds
+    the (block, offset) of its vector in one of the mapped files instead of the vector, so
+    documents loaded from the shared index reference one row per distinct chunk text while
+    every worker shares the files' pages. Files stay mapped for the table's lifetime.
+    """
+    DTYPE = np.int64
+    KEY = "mapped_rows"
+    
+    def __init__(self):
+        super().__init__()
+        self.blocks = []    # Memory-mapped vector files; only appended to
+        self.block_of = {}  # File path -> index in blocks
+    
+    @property
+    def row_bytes(self) -> int:
+        return self.blocks[0].shape[1] * self.blocks[0].itemsize if self.blocks else 0
+    
+    def vector(self, row: int) -> np.ndarray:
+        block, offset = self.data[row]
+        return np.array(self.blocks[block][offset], dtype=np.float32)
+    
+    def locate(self, paths: List[str], rows: np.ndarray) -> np.ndarray:
+        """(block, offset) of vectors given as (index into paths, row), mapping files not mapped yet"""
+        blocks = np.empty(len(paths), dtype=np.int64)
+        for i, path in enumerate(paths):
+            if path not in self.block_of:
+                self.block_of[path] = len(self.blocks)
+                self.blocks.append(np.load(path, mmap_mode="r"))
+            blocks[i] = self.block_of[path]
+        located = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        if len(located):
+            located[:, 0] = blocks[located[:, 0]]
+        return located
+
+class IndexSnapshot:
+    """
+    One immutable version of the in-memory index: the stored documents, the corpus
+    vocabulary, the interned chunk vector rows and (built on first search) the documents
+    concatenated into one corpus. Rows of documents loaded from the shared index point into
+    memory-mapped files, never copied into this worker's memory. Writers build the next
+    snapshot and swap it in; readers search whichever snapshot they grabbed, so ingestion
+    never changes an index under a running search.
+    """
+    def __init__(self, version: int, documents: Dict[str, Dict], vocabulary: Counter, vocabulary_version: int = 0,
+                 vectors: np.ndarray = None, mapped: np.ndarray = None, blocks: List[np.ndarray] = None,
+                 unique_rows: int = 0, mapped_unique_rows: int = 0):
+        self.version = version
+        self.documents = MappingProxyType(documents)
+        self.vocabulary = vocabulary  # Term -> number of stored chunks containing it
+        self.vocabulary_version = vocabulary_version  # Bumped only when the vocabulary changes
+        self.vectors = vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+        self.mapped = mapped if mapped is not None else np.empty((0, 2), dtype=np.int64)  # (block, offset) per mapped row
+        self.blocks = blocks if blocks is not None else []
+        # Vector rows still referenced by a stored chunk, in this worker's memory or memory-mapped
+        self.unique_rows = unique_rows + mapped_unique_rows
+        self.mapped_unique_rows = mapped_unique_rows
+        if self.vectors.size:
+            self.dimensions = self.vectors.shape[1]
+        else:
+            self.dimensions = self.blocks[0].shape[1] if self.blocks else 0
+        self.chunk_count = sum(len(doc["chunks"]) for doc in documents.values())
+        self.mapped_chunks = sum(len(doc["chunks"]) for doc in documents.values() if "mapped_rows" in doc)
+        self.vector_bytes = self.unique_rows * self.dimensions * np.dtype(np.float32).itemsize
+        self.bytes = sum(doc["private_bytes"] for doc in documents.values()) + self.vector_bytes
+        self._corpus = None
+        self._mapped_groups = None
+        self._corpus_lock = threading.Lock()
+    
+    def corpus(self):
+        """
+        Document IDs, each document's first corpus index (plus the total at the end), the
+        vector row of each corpus chunk (memory-mapped rows numbered after this worker's
+        own) and per-document postings (with their corpus offsets), across all documents
+        of this snapshot
+        """
+        corpus = self._corpus
+        if corpus is None:
+            with self._corpus_lock:  # Only until the first search of this version has built it
+                if self._corpus is None:
+                    self._mapped_groups = self._group_by_block(np.arange(len(self.mapped)))
+                    self._corpus = _concatenate_documents(self.documents, len(self.vectors))
+                corpus = self._corpus
+        return corpus
+    
+    def document_mask(self, document_ids) -> np.ndarray:
+        """Boolean mask over corpus chunks selecting the chunks of the given documents"""
+        doc_ids, starts, _, _ = self.corpus()
+        mask = np.zeros(starts[-1], dtype=bool)
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id in document_ids:
+                mask[starts[i]:starts[i + 1]] = True
+        return mask
+    
+    def locations(self, indices: np.ndarray) -> List[Tuple[str, int]]:
+        """(doc_id, position) of each of the given corpus chunks"""
+        doc_ids, starts, _, _ = self.corpus()
+        documents = np.searchsorted(starts, indices, side="right") - 1
+        positions = np.asarray(indices) - starts[documents]
+        return [(doc_ids[document], position) for document, position in zip(documents.tolist(), positions.tolist())]
+    
+    def _group_by_block(self, mapped_rows: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(mapped file, positions in mapped_rows, offsets in the file) for each file the rows point into"""
+        if not len(mapped_rows):
+            return []
+        located = self.mapped[mapped_rows]
+        order = np.argsort(located[:, 0], kind="stable")
+        bounds = np.flatnonzero(np.diff(located[order, 0])) + 1
+        return [(self.blocks[located[group[0], 0]], group, located[group, 1]) for group in np.split(order, bounds)]
+    
+    def score_rows(self, query_matrix: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """
+        (queries x rows) similarities against the given vector rows (sorted and unique, as
+        numbered by corpus()), or against every row. Each row is scored once, whether it
+        sits in this worker's buffer or in a memory-mapped file.
+        """
+        self.corpus()
+        private = len(self.vectors)
+        if rows is None:
+            private_rows, count, groups = None, private + len(self.mapped), self._mapped_groups
+        else:
+            split = int(np.searchsorted(rows, private))
+            private_rows, count = rows[:split], len(rows)
+            groups = self._group_by_block(rows[split:] - private)
+        scores = np.empty((len(query_matrix), count), dtype=np.float32)
+        scored = private if private_rows is None else len(private_rows)
+        if scored:
+            scores[:, :scored] = _score_block(query_matrix, self.vectors, private_rows)
+        for block, positions, offsets in groups:
+            scores[:, scored + positions] = _score_block(query_matrix, block, offsets)
+        return scores
+    
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Copies of the given vector rows (as numbered by corpus())"""
+        rows = np.asarray(rows, dtype=np.int64)
+        private = len(self.vectors)
+        vectors = np.empty((len(rows), self.dimensions), dtype=np.float32)
+        inside = rows < private
+        if inside.any():
+            vectors[inside] = self.vectors[rows[inside]]
+        outside = np.flatnonzero(~inside)
+        for block, positions, offsets in self._group_by_block(rows[outside] - private):
+            vectors[outside[positions]] = block[offsets]
+        return vectors
+    
+    def chunk_vectors(self, indices: np.ndarray) -> np.ndarray:
+        """Vectors of the given corpus chunks (e.g. an MMR candidate pool)"""
+        _, _, location_rows, _ = self.corpus()
+        return self.row_vectors(location_rows[indices])
+    
+    def document_vectors(self, document_id: str) -> np.ndarray:
+        """A stored document's embedding matrix"""
+        doc_data = self.documents[document_id]
+        if "rows" in doc_data:
+            return self.vectors[doc_data["rows"]]
+        return self.row_vectors(doc_data["mapped_rows"] + len(self.vectors))
+
+def _score_block(query_matrix: np.ndarray, block: np.ndarray, offsets: np.ndarray = None) -> np.ndarray:
+    """Similarities against rows of one vector block: only those rows when few are needed, else the whole block"""
+    if offsets is None:
+        return query_matrix @ block.T
+    if len(offsets) * 2 < len(block):
+        return query_matrix @ block[offsets].T
+    return (query_matrix @ block.T)[:, offsets]
+
+def _concatenate_documents(documents, mapped_base: int) -> Tuple[List[str], np.ndarray, np.ndarray, List]:
+    """Concatenate documents into one corpus (see IndexSnapshot.corpus)"""
+    doc_ids = list(documents)
+    starts = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+    counts = np.fromiter((len(documents[doc_id]["chunks"]) for doc_id in doc_ids), dtype=np.int64, count=len(doc_ids))
+    np.cumsum(counts, out=starts[1:])
+    all_postings = [(int(start), documents[doc_id]["postings"]) for doc_id, start in zip(doc_ids, starts)]
+    all_rows = [documents[doc_id]["rows"] if "rows" in documents[doc_id] else documents[doc_id]["mapped_rows"] + mapped_base
+                for doc_id in doc_ids]
+    location_rows = np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int64)
+    return doc_ids, starts, location_rows, all_postings
+
+# Global caches. Embeddings of queries (and other repeated texts) are cached by text hash;
+# chunk vectors are not, the chunk table already holds them
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
 model_cache = None
-embeddings_cache = {}
-documents_store = {}  # Local document storage
+embeddings_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE, name="embedding")
+snapshot = IndexSnapshot(0, {}, Counter())  # Current index version, replaced (never mutated) by writers
+chunk_table = ChunkTable()                  # Interned chunk vectors behind every snapshot
+mapped_table = MappedChunkTable()           # Interned rows of the shared index's memory-mapped vectors
+documents_store = snapshot.documents        # Read-only view of the current snapshot's documents
+last_queried = {}       # doc_id -> time.monotonic() of its last request or search hit
+document_versions = {}  # doc_id -> shared index ready_seq of the version held in memory
+
+# Maximal marginal relevance defaults
+MMR_LAMBDA = 0.5        # 1.0 = pure relevance, 0.0 = pure diversity
+MMR_POOL_FACTOR = 4     # Candidate pool size as a multiple of top_k
+MMR_PAIRWISE_LIMIT = 250_000  # Above this many candidate pairs, compute similarities per pick
+
+# Retrieval modes: dense embeddings, BM25 only (no encoder call), or both fused with RRF
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+HYBRID_POOL = 50        # Candidates taken from each ranking before fusion
+search_latency = {mode: {"queries": 0, "total_ms": 0.0} for mode in SEARCH_MODES}
+_stats_lock = threading.Lock()
+
+# Shared on-disk index: documents ingested by other workers are picked up at search time
+SHARED_INDEX_SYNC_SECONDS = float(os.getenv("SHARED_INDEX_SYNC_SECONDS", "1.0"))
+shared_index_seq = 0    # Last manifest sequence number loaded by this worker
+shared_index_checked = 0.0
+_model_lock = threading.Lock()
+_sync_lock = threading.Lock()
+
+# Memory budget for the documents held by this worker (vectors + chunk text + postings).
+# Past it the least recently queried documents are evicted; they reload from the shared
+# index (or are re-ingested) when a request names them again. 0 = unlimited
+DOCUMENT_STORE_BUDGET_MB = float(os.getenv("DOCUMENT_STORE_BUDGET_MB", "1024"))
+document_store_bytes = 0
+document_evictions = 0
+document_reloads = 0     # Evicted documents loaded again
+evicted_documents = set()
+CHUNK_TABLE_COMPACT_ROWS = 1024  # Compact once more rows are unreferenced than referenced (and at least this many)
+_store_lock = threading.Lock()  # Serializes writers; readers never take it
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize embedding rows so cosine similarity is a dot product"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
 
 def get_model():
     """Get cached model instance"""
     global model_cache
     if model_cache is None:
-        logger.info("Loading optimized Sentence Transformer model...")
-        # Force CPU usage and optimize for memory
-        model_cache = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-        model_cache.max_seq_length = 256  # Reduce memory usage
-        logger.info("✅ Optimized model loaded and cached")
+        with _model_lock:  # Concurrent first requests must not load the model twice
+            if model_cache is None:
+                logger.info("Loading optimized Sentence Transformer model...")
+                from sentence_transformers import SentenceTransformer  # Heavy (torch): import on first use
+                # Force CPU usage and optimize for memory
+                model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
+                model.max_seq_length = 256  # Reduce memory usage
+                model_cache = model
+                logger.info("✅ Optimized model loaded and cached")
     return model_cache
 
-def get_text_hash(text: str) -> str:
-    """Generate hash for text to use as cache key"""
-    return hashlib.md5(text.encode()).hexdigest()
-
-def embed_text_super_fast(texts: List[str]) -> List[List[float]]:
+def embed_text_super_fast(texts: List[str], cache: bool = True) -> List[np.ndarray]:
     """
-    Generate embeddings with aggressive caching
+    Generate embeddings with aggressive caching (one float32 vector per text).
+    cache=False encodes every text and caches none of them
     """
     if not texts:
         return []
@@ -51,8 +388,9 @@ def embed_text_super_fast(texts: List[str]) -> List[List[float]]:
     
     for text in texts:
         text_hash = get_text_hash(text)
-        if text_hash in embeddings_cache:
-            embeddings.append(embeddings_cache[text_hash])
+        cached = embeddings_cache.get(text_hash) if cache else None
+        if cached is not None:
+            embeddings.append(cached)
         else:
             # Add to batch for processing
             texts_to_embed.append((text, text_hash))
@@ -62,23 +400,34 @@ def embed_text_super_fast(texts: List[str]) -> List[List[float]]:
     if texts_to_embed:
         logger.info(f"Generating embeddings for {len(texts_to_embed)} new texts")
         batch_texts = [item[0] for item in texts_to_embed]
-        new_embeddings = model.encode(batch_texts, batch_size=64, show_progress_bar=False)
+        with metrics.stage("encode", texts=len(batch_texts)):
+            new_embeddings = model.encode(batch_texts, batch_size=64, show_progress_bar=False)
         
         # Cache and fill results
         embed_idx = 0
         for i, text in enumerate(texts):
             if embeddings[i] is None:  # Not cached
                 text_hash = texts_to_embed[embed_idx][1]
-                embedding = new_embeddings[embed_idx].tolist()
-                embeddings_cache[text_hash] = embedding
+                # float32 row, not a list of Python floats (~6x smaller per cached text)
+                embedding = np.asarray(new_embeddings[embed_idx], dtype=np.float32)
+                if cache:
+                    embeddings_cache.put(text_hash, embedding)
                 embeddings[i] = embedding
                 embed_idx += 1
     
     return embeddings
 
-def store_embeddings_super_fast(chunks: List[str], document_id: str) -> bool:
+def encode_uncached(texts: List[str]) -> np.ndarray:
+    """Normalized embeddings of one-off texts (e.g. candidate answer sentences), bypassing the cache"""
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    with metrics.stage("encode", texts=len(texts)):
+        return normalize_rows(get_model().encode(texts, batch_size=64, show_progress_bar=False))
+
+def store_embeddings_super_fast(chunks: List[str], document_id: str, url: str = None) -> bool:
     """
-    Store document chunks in local storage with embeddings
+    Store document chunks in local storage with embeddings, and publish them to the
+    shared index so other workers can load them instead of re-embedding
     """
     try:
         logger.info(f"🚀 SUPER FAST storing {len(chunks)} chunks for document {document_id}")
@@ -88,82 +437,619 @@ def store_embeddings_super_fast(chunks: List[str], document_id: str) -> bool:
             logger.info(f"✅ Document {document_id} already in cache")
             return True
         
-        # Generate embeddings
-        embeddings = embed_text_super_fast(chunks)
+        # Extraction failure placeholders must not reach the index (or other workers)
+        error = extraction_error(chunks)
+        if error:
+            raise ValueError(f"Refusing to store a failed extraction: {error}")
         
-        # Store locally
-        documents_store[document_id] = {
-            "chunks": chunks,
-            "embeddings": embeddings,
-            "timestamp": time.time()
-        }
+        # Generate embeddings (one normalized float32 row per chunk), reusing the vectors of
+        # chunk texts other documents already stored
+        hashes = [get_text_hash(chunk) for chunk in chunks]
+        embeddings, _ = _embed_chunks(chunks, hashes)
+        if not _publish_and_load(document_id, chunks, embeddings, hashes, url):
+            _register_document(document_id, chunks, embeddings, hashes)
         
         logger.info(f"✅ SUPER FAST stored {len(chunks)} chunks locally")
         return True
         
     except Exception as e:
         logger.error(f"Error storing embeddings: {e}")
+        release_document_claim(document_id)
         return False
 
-def search_similar_chunks_super_fast(query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+def _embed_chunks(chunks: List[str], hashes: List[str]) -> Tuple[np.ndarray, int]:
     """
-    Search for similar chunks using local cosine similarity
+    Normalized embedding matrix of chunks, encoding only the texts whose vectors are not
+    stored yet (in this worker or in the shared index). Returns it with the number of texts encoded
+    """
+    with _store_lock:
+        stored = chunk_table.lookup(hashes)
+        stored.update(mapped_table.lookup([text_hash for text_hash in hashes if text_hash not in stored]))
+    unknown = [text_hash for text_hash in hashes if text_hash not in stored]
+    if unknown and shared_index.SHARED_INDEX_ENABLED:
+        try:
+            stored.update(shared_index.lookup_vectors(unknown))
+        except Exception as e:
+            logger.error(f"Error reading shared index vectors: {e}")
+    missing = [i for i, text_hash in enumerate(hashes) if text_hash not in stored]
+    if not stored:
+        return normalize_rows(embed_text_super_fast(chunks, cache=False)), len(chunks)
+    metrics.record_cache("interned_chunk", hits=len(chunks) - len(missing), misses=len(missing))
+    embeddings = np.empty((len(chunks), next(iter(stored.values())).shape[0]), dtype=np.float32)
+    for i, text_hash in enumerate(hashes):
+        if text_hash in stored:
+            embeddings[i] = stored[text_hash]
+    if missing:
+        embeddings[missing] = normalize_rows(embed_text_super_fast([chunks[i] for i in missing], cache=False))
+    return embeddings, len(missing)
+
+def _publish_and_load(document_id: str, chunks: List[str], embeddings: np.ndarray, hashes: List[str],
+                      url: str = None) -> bool:
     """
+    Publish a document to the shared index and register it from there, so this worker
+    searches the same memory-mapped rows as every other worker. Returns False (and the
+    caller keeps the vectors in memory) when sharing is disabled or publishing failed.
+    """
+    if not shared_index.SHARED_INDEX_ENABLED:
+        return False
     try:
-        if not documents_store:
-            logger.warning("No documents stored locally")
+        shared_index.publish_document(document_id, chunks, embeddings, url=url, hashes=hashes)
+        return _load_from_shared_index(document_id, reload=True)
+    except Exception as e:
+        logger.error(f"Error publishing {document_id} to shared index: {e}")
+        shared_index.release_claim(document_id)
+        return False
+
+def reingest_document(document_id: str, chunks: List[str], url: str = None) -> Dict:
+    """
+    Replace a document with a new version of its chunks, embedding only the chunks whose
+    text is not in the stored version (matched by content hash) and reusing the stored
+    vectors for the rest. The in-memory index and the shared index switch to the new
+    version atomically. Returns a report of what was reused and embedded.
+    """
+    if not chunks:
+        raise ValueError(f"No chunks to store for document {document_id}")
+    start = time.perf_counter()
+    previous, source = _stored_version(document_id)
+    previous_chunks, previous_embeddings = previous if previous is not None else ([], None)
+    
+    previous_rows = {}
+    for row, chunk in enumerate(previous_chunks):
+        previous_rows.setdefault(get_text_hash(chunk), row)
+    hashes = [get_text_hash(chunk) for chunk in chunks]
+    reused = [i for i, text_hash in enumerate(hashes) if text_hash in previous_rows]
+    changed = [i for i, text_hash in enumerate(hashes) if text_hash not in previous_rows]
+    
+    new_embeddings, encoded = _embed_chunks([chunks[i] for i in changed], [hashes[i] for i in changed]) if changed else (None, 0)
+    dimensions = new_embeddings.shape[1] if new_embeddings is not None else previous_embeddings.shape[1]
+    embeddings = np.empty((len(chunks), dimensions), dtype=np.float32)
+    if reused:
+        embeddings[reused] = previous_embeddings[[previous_rows[hashes[i]] for i in reused]]
+    if changed:
+        embeddings[changed] = new_embeddings
+    
+    if not _publish_and_load(document_id, chunks, embeddings, hashes, url):
+        _register_document(document_id, chunks, embeddings, hashes)
+    
+    current_hashes = set(hashes)
+    removed = [text_hash for text_hash in previous_rows if text_hash not in current_hashes]
+    
+    report = {
+        "document_id": document_id,
+        "previous_version": source,
+        "previous_chunks": len(previous_chunks),
+        "chunks": len(chunks),
+        "reused": len(reused),
+        "embedded": encoded,
+        "interned": len(changed) - encoded,  # Vectors stored by other documents
+        "removed": len(removed),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"♻️ Re-ingested {document_id}: reused {len(reused)}/{len(chunks)} chunk vectors, "
+                f"embedded {report['embedded']}")
+    return report
+
+def _stored_version(document_id: str):
+    """The stored (chunks, embeddings) of a document and where they came from, or (None, None)"""
+    current = snapshot
+    doc_data = current.documents.get(document_id)
+    if doc_data is not None:
+        return (doc_data["chunks"], current.document_vectors(document_id)), "memory"
+    if shared_index.SHARED_INDEX_ENABLED:
+        try:
+            loaded = shared_index.load_document(document_id)
+            if loaded is not None:
+                chunks, paths, rows, _ = loaded
+                return (chunks, shared_index.read_vectors(paths, rows)), "shared_index"
+        except Exception as e:
+            logger.error(f"Error reading shared index for {document_id}: {e}")
+    return None, None
+
+def _release_rows(doc_data: Dict):
+    """Drop a stored document's references to its interned vector rows"""
+    if "rows" in doc_data:
+        chunk_table.release(doc_data["rows"])
+    if "mapped_rows" in doc_data:
+        mapped_table.release(doc_data["mapped_rows"])
+
+def _register_document(document_id: str, chunks: List[str], embeddings: np.ndarray = None, hashes: List[str] = None,
+                       mapped: Tuple[List[str], np.ndarray] = None):
+    """
+    Add a document (chunks + normalized embedding matrix) to the index, as a new snapshot.
+    Its vectors are interned into the chunk table. With mapped=(paths, rows), as loaded from
+    the shared index, its memory-mapped rows are interned instead, so every worker shares
+    the files' pages and each distinct chunk text still has a single row.
+    """
+    global document_reloads
+    # BM25 inverted index and vocabulary terms of the same chunks, built outside the writer lock
+    postings = DocumentPostings(chunks)
+    terms = Counter()
+    for chunk in chunks:
+        terms.update(set(tokenize(chunk)))
+    if hashes is None:
+        hashes = [get_text_hash(chunk) for chunk in chunks]
+    text = ChunkText(chunks)
+    private_bytes = postings.nbytes() + text.nbytes()
+    doc_data = {
+        "chunks": text,  # One UTF-8 buffer, decoded per chunk on access
+        "postings": postings,
+        "terms": terms,
+        "private_bytes": private_bytes,  # Bytes not shared through the chunk tables: chunk text and postings
+        "timestamp": time.time()
+    }
+    
+    with _store_lock:
+        documents = dict(snapshot.documents)
+        vocabulary = snapshot.vocabulary.copy()
+        if mapped is None:
+            doc_data["rows"] = chunk_table.intern(hashes, embeddings)
+            row_bytes = chunk_table.row_bytes
+        else:
+            doc_data["mapped_rows"] = mapped_table.intern(hashes, mapped_table.locate(*mapped))
+            row_bytes = mapped_table.row_bytes
+        doc_data["bytes"] = private_bytes + len(chunks) * row_bytes  # Its size on its own, as if nothing were shared
+        previous = documents.pop(document_id, None)
+        if previous is not None:
+            _subtract_terms(vocabulary, previous["terms"])
+            _release_rows(previous)
+        if document_id in evicted_documents:
+            evicted_documents.discard(document_id)
+            document_reloads += 1
+        documents[document_id] = doc_data
+        vocabulary.update(terms)
+        last_queried[document_id] = time.monotonic()
+        _enforce_budget(documents, vocabulary, keep=document_id)
+        _publish_snapshot(documents, vocabulary)
+
+def _publish_snapshot(documents: Dict[str, Dict], vocabulary: Counter):
+    """Swap in the next index version (holding _store_lock). Searches in flight keep the one they hold"""
+    global snapshot, documents_store, document_store_bytes
+    for table in (chunk_table, mapped_table):
+        if table.needs_compaction():
+            documents = table.compact(documents)
+    vocabulary_version = snapshot.vocabulary_version
+    if not dict.__eq__(vocabulary, snapshot.vocabulary):  # dict comparison runs in C; zero counts are never kept
+        vocabulary_version += 1
+    snapshot = IndexSnapshot(snapshot.version + 1, documents, vocabulary, vocabulary_version,
+                             chunk_table.view(), mapped_table.view(), mapped_table.blocks,
+                             chunk_table.live, mapped_table.live)
+    documents_store = snapshot.documents
+    document_store_bytes = snapshot.bytes
+
+def _subtract_terms(vocabulary: Counter, terms: Counter):
+    vocabulary.subtract(terms)
+    for term in terms:
+        if vocabulary[term] <= 0:
+            del vocabulary[term]
+
+def _enforce_budget(documents: Dict[str, Dict], vocabulary: Counter, keep: str = None):
+    """Evict least recently queried documents from the next snapshot until it fits the budget"""
+    budget = int(DOCUMENT_STORE_BUDGET_MB * 1024 * 1024)
+    if budget <= 0:
+        return
+    private = sum(doc["private_bytes"] for doc in documents.values())
+    vector_bytes = lambda: chunk_table.live * chunk_table.row_bytes + mapped_table.live * mapped_table.row_bytes
+    total = private + vector_bytes()
+    for doc_id in sorted(documents, key=lambda doc_id: last_queried.get(doc_id, 0.0)):
+        if total <= budget:
+            return
+        if doc_id != keep:
+            private -= _evict_document(documents, vocabulary, doc_id)
+            total = private + vector_bytes()  # Only rows no other document shares are freed
+    if total > budget:
+        logger.warning(f"Document {keep} alone exceeds the {DOCUMENT_STORE_BUDGET_MB:g} MB document store budget")
+
+def _evict_document(documents: Dict[str, Dict], vocabulary: Counter, document_id: str) -> int:
+    """Drop a document from the next snapshot. Returns its private bytes"""
+    global document_evictions
+    doc_data = documents.pop(document_id)
+    _subtract_terms(vocabulary, doc_data["terms"])
+    _release_rows(doc_data)
+    last_queried.pop(document_id, None)
+    document_versions.pop(document_id, None)
+    evicted_documents.add(document_id)
+    document_evictions += 1
+    metrics.DOCUMENT_EVICTIONS.inc()
+    logger.info(f"♻️ Evicted document {document_id} ({doc_data['bytes'] / 1e6:.1f} MB) to stay within the memory budget")
+    return doc_data["private_bytes"]
+
+def touch_document(document_id: str) -> bool:
+    """Mark a document as recently queried. Returns False if it is not in memory (never stored, or evicted)"""
+    if document_id not in snapshot.documents:
+        return False
+    last_queried[document_id] = time.monotonic()
+    return True
+
+def touch_documents(document_ids):
+    """Mark the documents behind search hits as recently queried"""
+    now = time.monotonic()
+    documents = snapshot.documents
+    for document_id in document_ids:
+        if document_id in documents:
+            last_queried[document_id] = now
+
+def _load_from_shared_index(document_id: str, reload: bool = False) -> bool:
+    """
+    Register a document published by any worker, searching its memory-mapped vectors in place. With
+    reload=True a document already in memory is replaced if a newer version was published.
+    """
+    loaded = shared_index.load_document(document_id)
+    if loaded is None:
+        return False
+    chunks, paths, rows, sequence = loaded
+    if document_id not in documents_store or (reload and sequence > document_versions.get(document_id, 0)):
+        _register_document(document_id, chunks, mapped=(paths, rows))
+        document_versions[document_id] = sequence
+        logger.info(f"📀 Loaded document {document_id} ({len(chunks)} chunks) from shared index")
+    return True
+
+def attach_shared_document(document_id: str, url: str = None, attempts: int = 3) -> bool:
+    """
+    Make a document available without ingesting it, if possible. Returns True when it is
+    stored (already in memory, or loaded from the shared index - waiting for another
+    worker that is ingesting it). Returns False when this worker should ingest it; it then
+    holds the ingestion claim until store_embeddings publishes or release_document_claim.
+    """
+    if document_id in documents_store:
+        return True
+    if not shared_index.SHARED_INDEX_ENABLED:
+        return False
+    
+    try:
+        for _ in range(attempts):
+            state = shared_index.claim_document(document_id, url)
+            if state == "claimed":
+                return False
+            if state == "busy":
+                logger.info(f"⏳ Another worker is ingesting {document_id}, waiting for it")
+                if not shared_index.wait_until_ready(document_id, shared_index.INGEST_LEASE_SECONDS):
+                    continue  # Claim released or lease expired - try to take it over
+            if _load_from_shared_index(document_id):
+                return True
+    except Exception as e:
+        logger.error(f"Error reading shared index for {document_id}: {e}")
+    return False
+
+def claim_document_for_reingest(document_id: str, url: str = None) -> bool:
+    """
+    Take the shared index claim on a document before re-ingesting it, waiting while
+    another worker ingests or re-ingests it. The stored version stays ready for other
+    workers until the new one is published. Returns False if the claim could not be taken
+    within INGEST_LEASE_SECONDS. Release it with release_document_claim.
+    """
+    if not shared_index.SHARED_INDEX_ENABLED:
+        return True
+    give_up_at = time.monotonic() + shared_index.INGEST_LEASE_SECONDS
+    while shared_index.claim_document(document_id, url, reingest=True) != "claimed":
+        if time.monotonic() >= give_up_at:
+            return False
+        time.sleep(shared_index.POLL_INTERVAL)
+    return True
+
+def release_document_claim(document_id: str):
+    """Give up this worker's ingestion claim after a failed ingestion"""
+    if shared_index.SHARED_INDEX_ENABLED:
+        try:
+            shared_index.release_claim(document_id)
+        except Exception as e:
+            logger.error(f"Error releasing shared index claim for {document_id}: {e}")
+
+def sync_shared_index(force: bool = False) -> int:
+    """
+    Load documents other workers have published since the last check (at most every
+    SHARED_INDEX_SYNC_SECONDS). Returns the number of documents loaded.
+    """
+    global shared_index_seq, shared_index_checked
+    if not shared_index.SHARED_INDEX_ENABLED:
+        return 0
+    now = time.monotonic()
+    if not force and now - shared_index_checked < SHARED_INDEX_SYNC_SECONDS:
+        return 0
+    
+    loaded = 0
+    with _sync_lock:
+        shared_index_checked = now
+        try:
+            for entry in shared_index.ready_documents_since(shared_index_seq):
+                # New documents, and new versions of documents held here (re-ingested by
+                # another worker). Evicted documents reload on demand, when a request names them again
+                doc_id = entry["doc_id"]
+                stale = doc_id in documents_store and entry["ready_seq"] > document_versions.get(doc_id, 0)
+                if (doc_id not in documents_store and doc_id not in evicted_documents) or stale:
+                    if _load_from_shared_index(doc_id, reload=stale):
+                        loaded += 1
+                shared_index_seq = max(shared_index_seq, entry["ready_seq"])
+        except Exception as e:
+            logger.error(f"Error syncing shared index: {e}")
+    return loaded
+
+def get_document_chunk_count(document_id: str) -> int:
+    """Number of stored chunks for a document (0 if not stored)"""
+    doc_data = documents_store.get(document_id)
+    return len(doc_data["chunks"]) if doc_data else 0
+
+def mmr_select(candidate_matrix: np.ndarray, candidate_scores: np.ndarray, k: int, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """
+    Greedy maximal marginal relevance: pick k candidates that are relevant to the query but
+    not similar to each other. Pairwise similarities come from one matrix product over the
+    normalized candidate rows. Returns candidate indices in selection order.
+    """
+    n = len(candidate_scores)
+    if n == 0 or k <= 0:
+        return []
+    
+    # Very large pools: one (n x d) @ (d,) product per pick instead of an n x n matrix
+    if n * n <= MMR_PAIRWISE_LIMIT:
+        pairwise = candidate_matrix @ candidate_matrix.T
+        similarity_to = lambda i: pairwise[i]
+    else:
+        similarity_to = lambda i: candidate_matrix @ candidate_matrix[i]
+    
+    selected = [int(np.argmax(candidate_scores))]
+    max_similarity = np.array(similarity_to(selected[0]), dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    
+    for _ in range(1, min(k, n)):
+        mmr_scores = lambda_mult * candidate_scores - (1.0 - lambda_mult) * max_similarity
+        mmr_scores[~available] = -np.inf
+        chosen = int(np.argmax(mmr_scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, similarity_to(chosen), out=max_similarity)
+    
+    return selected
+
+def _top_indices(similarities: np.ndarray, count: int) -> np.ndarray:
+    """Indices of the highest scores, best first, without sorting the whole row"""
+    count = min(count, len(similarities))
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    if count < len(similarities):
+        candidates = np.argpartition(-similarities, count - 1)[:count]
+    else:
+        candidates = np.arange(len(similarities))
+    return candidates[np.argsort(-similarities[candidates], kind="stable")]
+
+def _top_hits(scores, current: IndexSnapshot, top_k: int, mmr: bool, mmr_lambda: float,
+              positive_only: bool = False) -> List[Dict]:
+    """Turn one row of relevance scores (one per corpus chunk) into the top_k hit dicts"""
+    if mmr:
+        pool = _top_indices(scores, max(top_k * MMR_POOL_FACTOR, top_k))
+        if positive_only:
+            pool = pool[scores[pool] > 0]
+        else:
+            pool = pool[np.isfinite(scores[pool])]
+        relevance = scores[pool]
+        if positive_only and len(pool):
+            relevance = relevance / relevance.max()  # BM25/RRF scores on the cosine scale
+        chosen = mmr_select(current.chunk_vectors(pool), relevance, top_k, mmr_lambda)
+        top_indices = pool[chosen]
+    else:
+        top_indices = _top_indices(scores, top_k)
+        if positive_only:
+            top_indices = top_indices[scores[top_indices] > 0]
+        else:
+            top_indices = top_indices[np.isfinite(scores[top_indices])]  # Rows outside document_ids
+    
+    # Chunk strings are only built here, for the final hits
+    results = []
+    for idx, (doc_id, position) in zip(top_indices, current.locations(top_indices)):
+        results.append({
+            "text": current.documents[doc_id]["chunks"][position],
+            "score": float(scores[idx]),
+            "doc_id": doc_id,
+            "position": position,
+        })
+    return results
+
+def _chunk_similarities(query_matrix: np.ndarray, current: IndexSnapshot, excluded: np.ndarray = None) -> np.ndarray:
+    """
+    (queries x corpus chunks) cosine similarities, scoring each distinct vector row once
+    (memory-mapped ones in place) and expanding the scores to every chunk holding it. With a
+    scope only the rows it references are scored.
+    """
+    _, _, location_rows, _ = current.corpus()
+    if excluded is None:
+        return current.score_rows(query_matrix)[:, location_rows]
+    similarities = np.full((len(query_matrix), len(location_rows)), -np.inf, dtype=np.float32)
+    scoped = np.flatnonzero(~excluded)
+    if len(scoped):
+        rows, expand = np.unique(location_rows[scoped], return_inverse=True)
+        similarities[:, scoped] = current.score_rows(query_matrix, rows)[:, expand]
+    return similarities
+
+def search_chunks_detailed(query: str, top_k: int = 10, mmr: bool = False, mmr_lambda: float = MMR_LAMBDA,
+                           mode: str = "dense", document_ids=None) -> List[Dict]:
+    """
+    Search for similar chunks, returning each hit with its text, score, document ID and
+    chunk position. With mmr=True the hits are picked for diversity from a larger candidate
+    pool (maximal marginal relevance). mode selects dense, lexical (BM25) or hybrid retrieval.
+    document_ids, when given, restricts the search to those documents.
+    """
+    results = search_chunks_batch([query], top_k, mmr=mmr, mmr_lambda=mmr_lambda, mode=mode, document_ids=document_ids)
+    return results[0] if results else []
+
+def search_chunks_batch(queries: List[str], top_k: int = 10, mmr: bool = False, mmr_lambda: float = MMR_LAMBDA,
+                        mode: str = "dense", document_ids=None, query_matrix: np.ndarray = None) -> List[List[Dict]]:
+    """
+    Search for several queries at once: one encoder call for all queries and one
+    similarity matrix against the corpus. Returns one hit list per query.
+    
+    mode="lexical" ranks by BM25 alone and never touches the encoder; mode="hybrid" fuses
+    the dense and BM25 rankings with reciprocal rank fusion. document_ids (a set), when
+    given, restricts every query to the chunks of those documents. query_matrix holds the
+    queries' normalized embeddings when the caller already encoded them.
+    """
+    with tracing.span("search", queries=len(queries), mode=mode, top_k=top_k):
+        return _search_chunks_batch(queries, top_k, mmr, mmr_lambda, mode, document_ids, query_matrix)
+
+def _search_chunks_batch(queries: List[str], top_k: int, mmr: bool, mmr_lambda: float, mode: str,
+                         document_ids=None, query_matrix: np.ndarray = None) -> List[List[Dict]]:
+    """Batched search implementation (see search_chunks_batch)"""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+    
+    try:
+        if not queries:
             return []
         
-        # Generate query embedding
-        query_embedding = embed_text_super_fast([query])[0]
-        query_vector = np.array(query_embedding).reshape(1, -1)
+        sync_shared_index()
+        current = snapshot  # Searched as of this version, whatever ingestion does meanwhile
+        if not current.documents:
+            logger.warning("No documents stored locally")
+            return [[] for _ in queries]
         
-        # Search all stored documents
-        all_chunks = []
-        all_embeddings = []
+        start = time.perf_counter()
         
-        for doc_id, doc_data in documents_store.items():
-            all_chunks.extend(doc_data["chunks"])
-            all_embeddings.extend(doc_data["embeddings"])
+        # Search all stored documents
+        _, starts, _, all_postings = current.corpus()
+        total = int(starts[-1])
         
-        if not all_embeddings:
-            return []
+        if not total:
+            return [[] for _ in queries]
         
-        # Compute similarities
-        embeddings_matrix = np.array(all_embeddings)
-        similarities = cosine_similarity(query_vector, embeddings_matrix)[0]
+        # Chunks outside document_ids can never rank: -inf similarity, zero BM25 score
+        excluded = ~current.document_mask(document_ids) if document_ids is not None else None
         
-        # Get top_k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        # Cosine similarities for every query (one encoder batch) against each distinct chunk
+        # text once, expanded to every (doc_id, position) holding it
+        if mode != "lexical":
+            if query_matrix is None:
+                query_matrix = normalize_rows(embed_text_super_fast(queries))
+            similarities = _chunk_similarities(query_matrix, current, excluded)
         
         results = []
-        for idx in top_indices:
-            chunk = all_chunks[idx]
-            score = float(similarities[idx])
-            results.append((chunk, score))
+        for i, query in enumerate(queries):
+            if mode == "dense":
+                scores = similarities[i]
+            elif mode == "lexical":
+                scores = bm25_scores(query, all_postings, total)
+                if excluded is not None:
+                    scores[excluded] = 0.0
+            else:
+                lexical = bm25_scores(query, all_postings, total)
+                if excluded is not None:
+                    lexical[excluded] = 0.0
+                pool = max(top_k * MMR_POOL_FACTOR, HYBRID_POOL)
+                lexical_ranking = _top_indices(lexical, pool)
+                dense_ranking = _top_indices(similarities[i], pool)
+                scores = reciprocal_rank_fusion(
+                    [dense_ranking[np.isfinite(similarities[i][dense_ranking])], lexical_ranking[lexical[lexical_ranking] > 0]],
+                    total,
+                )
+            results.append(_top_hits(
+                scores, current, top_k, mmr, mmr_lambda,
+                positive_only=(mode != "dense"),
+            ))
+        
+        touch_documents({hit["doc_id"] for hits in results for hit in hits})
         
-        logger.info(f"✅ Found {len(results)} similar chunks with LOCAL search")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.STAGE_SECONDS.observe(elapsed_ms / 1000, stage="search")
+        with _stats_lock:
+            search_latency[mode]["queries"] += len(queries)
+            search_latency[mode]["total_ms"] += elapsed_ms
+        logger.info(f"✅ Found similar chunks for {len(queries)} queries with LOCAL {mode} search in {elapsed_ms:.1f} ms")
         return results
         
     except Exception as e:
         logger.error(f"Error searching similar chunks: {e}")
-        return []
+        return [[] for _ in queries]
+
+def search_similar_chunks_super_fast(query: str, top_k: int = 10, mmr: bool = False, mode: str = "dense") -> List[Tuple[str, float]]:
+    """
+    Search for similar chunks using local cosine similarity
+    """
+    return [(hit["text"], hit["score"]) for hit in search_chunks_detailed(query, top_k, mmr=mmr, mode=mode)]
+
+def get_vocabulary() -> Tuple[Counter, int]:
+    """Get the corpus vocabulary (term -> chunk frequency) and its version, which only changes with the vocabulary"""
+    current = snapshot
+    return current.vocabulary, current.vocabulary_version
 
 def get_cache_stats():
     """Get cache statistics"""
-    total_chunks = sum(len(doc["chunks"]) for doc in documents_store.values())
+    current = snapshot
+    total_chunks = sum(len(doc["chunks"]) for doc in current.documents.values())
     return {
         "cached_embeddings": len(embeddings_cache),
-        "stored_documents": len(documents_store),
+        "embedding_cache": embeddings_cache.stats(),
+        "stored_documents": len(current.documents),
+        "index_version": current.version,
         "total_chunks": total_chunks,
-        "model_loaded": model_cache is not None
+        "model_loaded": model_cache is not None,
+        "shared_index_seq": shared_index_seq if shared_index.SHARED_INDEX_ENABLED else None,
+        "document_store": get_document_store_stats(),
+        "search_latency_ms": {
+            mode: round(stats["total_ms"] / stats["queries"], 3) if stats["queries"] else None
+            for mode, stats in search_latency.items()
+        }
+    }
+
+def get_document_store_stats() -> Dict:
+    """Memory held by stored documents against the budget, per document, and evictions"""
+    current = snapshot
+    by_recency = sorted(current.documents, key=lambda doc_id: last_queried.get(doc_id, 0.0))
+    return {
+        "bytes": current.bytes,
+        "budget_bytes": int(DOCUMENT_STORE_BUDGET_MB * 1024 * 1024) or None,
+        "evictions": document_evictions,
+        "reloads": document_reloads,
+        "evicted_documents": len(evicted_documents),
+        "bytes_per_document": {doc_id: current.documents[doc_id]["bytes"] for doc_id in by_recency},  # Least recently queried first
+        "deduplication": get_dedup_stats(current),
+    }
+
+def get_dedup_stats(current: IndexSnapshot = None) -> Dict:
+    """
+    How many stored chunks share vector rows (in this worker's memory or memory-mapped from
+    the shared index), and the vector memory that saves
+    """
+    current = current or snapshot
+    row_bytes = current.dimensions * np.dtype(np.float32).itemsize
+    return {
+        "chunks": current.chunk_count,
+        "memory_mapped_chunks": current.mapped_chunks,
+        "unique_vectors": current.unique_rows,
+        "memory_mapped_vectors": current.mapped_unique_rows,
+        "unreferenced_rows": len(current.vectors) + len(current.mapped) - current.unique_rows,  # Freed at the next compaction
+        "dedup_ratio": round(current.chunk_count / current.unique_rows, 3) if current.unique_rows else None,
+        "vector_bytes": current.vector_bytes,
+        "bytes_saved": (current.chunk_count - current.unique_rows) * row_bytes,
     }
 
 def clear_all_cache():
-    """Clear all caches"""
-    global embeddings_cache, documents_store
-    embeddings_cache = {}
-    documents_store = {}
+    """Clear all in-memory caches (documents stay in the shared index and reload on demand)"""
+    global chunk_table, mapped_table
+    with _store_lock:
+        embeddings_cache.clear()
+        chunk_table = ChunkTable()
+        mapped_table = MappedChunkTable()
+        last_queried.clear()
+        document_versions.clear()
+        evicted_documents.clear()
+        _publish_snapshot({}, Counter())
     return {"message": "All caches cleared"}
 
 # Aliases for backward compatibility